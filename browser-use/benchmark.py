@@ -0,0 +1,319 @@
+# 离线端到端压测：启动本地的 LLM 桩服务 (stub_llm_server.py) 和 Flask 后端 (server.py)，
+# 在合成的 PDF 语料上依次运行各个流水线实现，输出吞吐量 (篇/分钟)、各阶段 p50/p99、峰值内存 (进程树合计及单进程最大值) 和峰值浏览器数量。
+# 每个运行器在独立的子进程中执行，互不影响模块状态和内存统计；所有文件都写在临时工作目录里。
+#
+# 用法：python benchmark.py --papers 20 --runners sequential,gather,sharded --latency lognormal:-0.5,0.6
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNNERS = ['sequential', 'gather', 'sharded']
+REPORT_DIR = 'saved'
+
+_WORDS = ('adaptive sparse graph neural transformer retrieval robust federated causal diffusion contrastive '
+          'multimodal efficient scalable latent benchmark inference attention policy optimization').split()
+
+
+# --- 合成语料 ---
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_minimal_pdf(path: str, lines: list):
+    """不依赖第三方库写一个单页 PDF，每行一个文本对象，PyPDF2 可以提取出文本。"""
+    stream = 'BT /F1 10 Tf 12 TL 50 780 Td\n' + ''.join(f'({_pdf_escape(line)}) Tj T*\n' for line in lines) + 'ET'
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        '/Resources << /Font << /F1 5 0 R >> >> >>',
+        f'<< /Length {len(stream.encode("latin-1"))} >>\nstream\n{stream}\nendstream',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_corpus(directory: str, count: int, seed: int = 0) -> list:
+    """生成 count 篇合成论文，每篇都包含 "Title: ..." 这样的行，桩服务据此返回提取结果。"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        sentence = lambda n: ' '.join(rng.choice(_WORDS) for _ in range(n)).capitalize() + '.'
+        lines = [
+            f'Title: {sentence(6)[:-1]} {i}',
+            f'Authors: Author {rng.randint(1, 99)}, Author {rng.randint(100, 199)}',
+            f'Affiliation: Synthetic University {rng.randint(1, 9)}',
+            f'Date: 202{rng.randint(0, 5)}-0{rng.randint(1, 9)}',
+            f'Abstract: {sentence(20)}',
+            f'Introduction: {sentence(25)}',
+            f'Funding: Grant SYN-{rng.randint(100000, 999999)}',
+            f'Conclusion: {sentence(15)}',
+        ]
+        lines += [sentence(12) for _ in range(rng.randint(10, 40))]  # 正文，使提示词长度有差异
+        path = os.path.join(directory, f'synthetic_{i:04d}.pdf')
+        write_minimal_pdf(path, lines)
+        paths.append(path)
+    return paths
+
+
+# --- 统计工具 ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Service on port {port} did not start within {timeout}s')
+
+
+def count_browser_processes() -> int:
+    """统计当前打开的浏览器 (chromium 主进程，不含 renderer/gpu 等 --type= 子进程)。"""
+    count = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+        except OSError:
+            continue
+        if 'chrom' in cmdline.lower() and '--type=' not in cmdline:
+            count += 1
+    return count
+
+
+def process_tree_rss(root_pid: int) -> int:
+    """root_pid 及其所有后代进程 (工作进程、浏览器等) 当前的常驻内存之和，单位字节 (Linux /proc)。"""
+    children = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])  # 进程名可能含空格和括号，从最后一个 ')' 之后解析
+        children.setdefault(ppid, []).append(int(pid))
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f'/proc/{pid}/statm', 'rb') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+class _BrowserSampler(threading.Thread):
+    """
+    后台定期采样浏览器进程数和被测进程树的总常驻内存，记录峰值。
+    wait4 的 ru_maxrss 只是单个进程的峰值，分片模式下多个工作进程和浏览器的合计内存要靠这里的采样。
+    """
+
+    def __init__(self, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self.peak_tree_rss = 0
+        self.root_pid = None  # 被测子进程启动后设置
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if not os.path.isdir('/proc'):  # 非 Linux 平台无法统计
+            return
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, count_browser_processes())
+            if self.root_pid is not None:
+                self.peak_tree_rss = max(self.peak_tree_rss, process_tree_rss(self.root_pid))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# --- 子进程：运行单个流水线实现，阶段耗时来自 tracing 模块的 span ---
+def _run_one(runner: str, output_path: str, workers: int, concurrency: int):
+    """在当前 (子) 进程中运行一个流水线实现，把阶段耗时写入 output_path。"""
+    from tracing import tracer
+
+    if runner == 'sequential':
+        from papers2web_form import process_paper_files as run
+    elif runner == 'gather':
+        from papers2web_form_asyncio_gather import process_all_paper_files_concurrently as run
+    elif runner == 'sharded':
+        # 阶段耗时发生在工作进程中 (见各进程的 Chrome trace)，这里只统计整体吞吐
+        import sharded_runner
+
+        async def run():
+            sharded_runner.run_sharded(num_workers=workers, per_worker_concurrency=concurrency,
+                                       queue_path=os.path.join('saved', 'bench_queue.db'))
+    else:
+        raise ValueError(f"Unknown runner '{runner}'")
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'elapsed': elapsed, 'stages': tracer.stage_summary()}, f)
+
+
+# --- 主进程：启动服务、生成语料、依次运行并汇总 ---
+def _count_papers(db_path: str) -> int:
+    if not os.path.exists(db_path):
+        return 0
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM papers').fetchone()[0]
+
+
+def run_benchmark(papers: int = 20, runners=RUNNERS, latency: str = 'lognormal:-0.5,0.6',
+                  tokens_per_second: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                  workers: int = 2, concurrency: int = 2, keep_workdir: bool = False) -> dict:
+    workdir = tempfile.mkdtemp(prefix='paper_bench_')
+    corpus_dir = os.path.join(workdir, 'corpus')
+    generate_corpus(corpus_dir, papers, seed)
+    print(f"在 '{corpus_dir}' 中生成了 {papers} 篇合成论文。")
+
+    llm_port, flask_port = _free_port(), _free_port()
+    env = {
+        **os.environ,
+        'PYTHONPATH': BENCH_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''),
+        'DEEPSEEK_API_KEY': 'stub',
+        'DEEPSEEK_BASE_URL': f'http://127.0.0.1:{llm_port}/v1',
+        'FLASK_SERVER_URL': f'http://127.0.0.1:{flask_port}',
+        'PAPER_STORAGE_DIR': corpus_dir,
+        'VISION_LLM_BASE_URL': f'http://127.0.0.1:{llm_port}/v1',
+        'VISION_LLM_API_KEY': 'stub',
+        'PIPELINE_TRACE_DIR': os.path.abspath(os.path.join(REPORT_DIR, 'traces')),  # 每个运行器一份 Chrome trace
+        'PAPER_PAUSE_SECONDS': '0',  # 顺序版本文件之间的限速暂停不计入处理开销
+    }
+    stub_cmd = [sys.executable, os.path.join(BENCH_DIR, 'stub_llm_server.py'), '--port', str(llm_port),
+                '--latency', latency, '--tokens-per-second', str(tokens_per_second),
+                '--error-rate', str(error_rate), '--seed', str(seed)]
+    # 不使用 debug 模式，避免 reloader 再起一个进程；papers.db 写在工作目录里
+    flask_cmd = [sys.executable, '-c',
+                 f"import server; server.init_db(); server.app.run(host='127.0.0.1', port={flask_port})"]
+    services = [
+        subprocess.Popen(stub_cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL),
+        subprocess.Popen(flask_cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    report = {
+        'config': {'papers': papers, 'latency': latency, 'tokens_per_second': tokens_per_second,
+                   'error_rate': error_rate, 'seed': seed, 'workers': workers, 'concurrency': concurrency},
+        'runners': {},
+    }
+    try:
+        _wait_for_port(llm_port)
+        _wait_for_port(flask_port)
+        db_path = os.path.join(workdir, 'papers.db')
+        for runner in runners:
+            print(f"\n=== 运行 {runner} ===")
+            rows_before = _count_papers(db_path)
+            output_path = os.path.join(workdir, f'{runner}_timings.json')
+            sampler = _BrowserSampler()
+            sampler.start()
+            child = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--_run-one', runner, '--_output', output_path,
+                 '--workers', str(workers), '--concurrency', str(concurrency)],
+                cwd=workdir, env=env,
+            )
+            sampler.root_pid = child.pid
+            # wait4 的 ru_maxrss 是该子进程及其已回收后代中单个进程的最大峰值 (不是合计)，单位 KB (Linux)
+            _, status, usage = os.wait4(child.pid, 0)
+            child.returncode = os.waitstatus_to_exitcode(status)
+            sampler.stop()
+
+            entry = {'exit_code': child.returncode, 'max_process_rss_mb': round(usage.ru_maxrss / 1024, 1),
+                     'peak_tree_rss_mb': round(sampler.peak_tree_rss / 1024 / 1024, 1),
+                     'peak_browsers': sampler.peak, 'submitted': _count_papers(db_path) - rows_before}
+            if os.path.exists(output_path):
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    timings = json.load(f)
+                entry['elapsed'] = round(timings['elapsed'], 2)
+                entry['papers_per_minute'] = round(papers / timings['elapsed'] * 60, 2) if timings['elapsed'] else 0.0
+                entry['stages'] = timings['stages']
+            report['runners'][runner] = entry
+            print(f"{runner}: {json.dumps(entry, ensure_ascii=False)}")
+    finally:
+        for service in services:
+            service.terminate()
+        for service in services:
+            service.wait()
+        if not keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_path = os.path.join(REPORT_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n压测报告已保存到 {report_path}")
+    _print_table(report)
+    return report
+
+
+def _print_table(report: dict):
+    # tree MB：进程树合计常驻内存的采样峰值；proc MB：单个进程的最大峰值 RSS
+    print(f"\n{'runner':<12}{'papers/min':>12}{'submitted':>11}{'tree MB':>9}{'proc MB':>9}{'browsers':>10}"
+          f"  stages (p50/p99 s)")
+    for runner, entry in report['runners'].items():
+        stages = ', '.join(f"{name} {s['p50']}/{s['p99']}" for name, s in entry.get('stages', {}).items())
+        print(f"{runner:<12}{entry.get('papers_per_minute', 0):>12}{entry['submitted']:>11}"
+              f"{entry['peak_tree_rss_mb']:>9}{entry['max_process_rss_mb']:>9}{entry['peak_browsers']:>10}"
+              f"  {stages or '-'}")
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the paper submission pipelines')
+    parser.add_argument('--papers', type=int, default=20, help='number of synthetic PDFs')
+    parser.add_argument('--runners', default=','.join(RUNNERS), help=f'comma separated subset of {RUNNERS}')
+    parser.add_argument('--latency', default='lognormal:-0.5,0.6', help='stub LLM latency distribution')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=2, help='processes for the sharded runner')
+    parser.add_argument('--concurrency', type=int, default=2, help='agents per sharded worker')
+    parser.add_argument('--keep-workdir', action='store_true', help='keep the temporary corpus and databases')
+    parser.add_argument('--_run-one', dest='run_one', help=argparse.SUPPRESS)
+    parser.add_argument('--_output', dest='output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        _run_one(args.run_one, args.output, args.workers, args.concurrency)
+    else:
+        run_benchmark(args.papers, [r.strip() for r in args.runners.split(',') if r.strip()], args.latency,
+                      args.tokens_per_second, args.error_rate, args.seed, args.workers, args.concurrency,
+                      args.keep_workdir)
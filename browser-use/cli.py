@@ -0,0 +1,230 @@
+# 统一的命令行入口。顶层只导入标准库，browser_use、langchain_openai、PDF 库等重量级依赖
+# 由各子命令在真正需要时才导入，所以 --help、参数错误或全部命中缓存的提取都能立即返回。
+#
+#   python cli.py extract [PDF ...]        提取论文信息 (结果缓存在 saved/extracted.json，未变化的 PDF 不再调用 LLM)
+#   python cli.py submit                   把已提取的信息通过浏览器智能体提交到表单
+#   python cli.py run --mode gather        运行完整流水线 (sequential / gather / sharded / watch)
+#   python cli.py serve                    启动 Flask 后端
+#   python cli.py bench --papers 20        离线压测
+#   python cli.py --profile-startup ...    输出各模块的导入耗时
+import time
+
+_CLI_START = time.perf_counter()
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+
+EXTRACT_CACHE = os.path.join('saved', 'extracted.json')
+# 与 papers2web_form_asyncio_gather.STORAGE_DIR 相同；在这里直接读取环境变量，全部命中缓存时不必导入提取模块
+STORAGE_DIR = os.getenv('PAPER_STORAGE_DIR', './storage/en')
+
+_import_timings = []  # (模块名, 耗时秒, 新加载的模块数)
+
+
+def lazy_import(name: str):
+    """导入模块并记录耗时，供 --profile-startup 报告使用。"""
+    if name in sys.modules:
+        return sys.modules[name]
+    before = len(sys.modules)
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    _import_timings.append((name, time.perf_counter() - start, len(sys.modules) - before))
+    return module
+
+
+def _print_startup_report(parse_ready: float):
+    print("\n--- 启动耗时 ---")
+    print(f"{'命令行解析完成':<32}{parse_ready * 1000:>10.1f} ms")
+    for name, elapsed, modules in _import_timings:
+        print(f"{'import ' + name:<32}{elapsed * 1000:>10.1f} ms  (+{modules} modules)")
+    print(f"{'合计':<32}{(time.perf_counter() - _CLI_START) * 1000:>10.1f} ms  (已加载 {len(sys.modules)} modules)")
+
+
+def _file_signature(path: str):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_cache(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_cache(path: str, cache: dict):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# --- 子命令 ---
+def cmd_extract(args):
+    if args.pdfs:
+        paths = args.pdfs
+    elif os.path.isdir(STORAGE_DIR):
+        paths = [os.path.join(STORAGE_DIR, f) for f in sorted(os.listdir(STORAGE_DIR)) if f.endswith('.pdf')]
+    else:
+        paths = []
+    cache = _load_cache(args.cache)
+    todo = []
+    for path in paths:
+        entry = cache.get(os.path.abspath(path))
+        if args.force or not entry or entry['signature'] != _file_signature(path) or entry['info'].get('extraction_error'):
+            todo.append(path)
+    print(f"共 {len(paths)} 个 PDF，其中 {len(paths) - len(todo)} 个命中缓存，{len(todo)} 个需要调用 LLM。")
+    if not todo:
+        return 0
+    # 只有存在未命中缓存的 PDF 时才导入提取模块 (会间接导入 langchain_core 等重量级依赖)
+    gather = lazy_import('papers2web_form_asyncio_gather')
+
+    async def extract_all():
+        llm_model = gather.create_llm()
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def extract_one(path):
+            async with semaphore:
+                return path, await gather.extract_info_from_pdf(path, llm_model)
+        return await asyncio.gather(*[extract_one(path) for path in todo])
+
+    failed = 0
+    for path, info in asyncio.run(extract_all()):
+        cache[os.path.abspath(path)] = {'signature': _file_signature(path), 'info': info}
+        failed += bool(info.get('extraction_error'))
+    _save_cache(args.cache, cache)
+    print(f"提取结果已保存到 {args.cache}，失败 {failed} 个。")
+    return 1 if failed else 0
+
+
+def cmd_submit(args):
+    cache = _load_cache(args.cache)
+    pending = [(key, entry) for key, entry in cache.items()
+               if not entry['info'].get('extraction_error') and (args.force or not entry.get('submitted'))]
+    print(f"待提交 {len(pending)} 篇论文。")
+    if not pending:
+        return 0
+    gather = lazy_import('papers2web_form_asyncio_gather')
+    vision_policy = lazy_import('vision_policy')
+    browser_use = lazy_import('browser_use')
+    form_url = args.form_url or gather.TARGET_WEB_FORM_URL
+
+    async def submit_all():
+        llm_model = gather.create_llm()
+        browser = browser_use.Browser(config=browser_use.BrowserConfig(headless=True))
+        try:
+            for key, entry in pending:
+                task = gather.generate_web_form_task(entry['info'], form_url)
+                history, _ = await vision_policy.run_agent_with_escalation(
+                    task, gather.unwrap_llm(llm_model), vision_llm=vision_policy.get_vision_llm(), browser=browser)
+                entry['submitted'] = '提交成功' in str(history.final_result())
+                print(f"{os.path.basename(key)}: {'提交成功' if entry['submitted'] else '提交失败'}")
+        finally:
+            await browser.close()
+
+    try:
+        asyncio.run(submit_all())
+    finally:
+        _save_cache(args.cache, cache)  # 中途失败也保留已提交的标记
+    return 0 if all(entry.get('submitted') for _, entry in pending) else 1
+
+
+def cmd_run(args):
+    if args.mode == 'sequential':
+        asyncio.run(lazy_import('papers2web_form').process_paper_files())
+    elif args.mode == 'gather':
+        asyncio.run(lazy_import('papers2web_form_asyncio_gather').process_all_paper_files_concurrently())
+    elif args.mode == 'sharded':
+        lazy_import('sharded_runner').run_sharded(num_workers=args.workers, per_worker_concurrency=args.concurrency)
+    elif args.mode == 'watch':
+        watch_folder = lazy_import('watch_folder')
+        try:
+            asyncio.run(watch_folder.watch_and_process(max_concurrent=args.concurrency))
+        except KeyboardInterrupt:
+            print("监听服务已停止。")
+    return 0
+
+
+def cmd_serve(args):
+    server = lazy_import('server')
+    server.init_db()
+    server.app.run(host=args.host, port=args.port, debug=args.debug)
+    return 0
+
+
+def cmd_bench(args):
+    benchmark = lazy_import('benchmark')
+    benchmark.run_benchmark(args.papers, [r.strip() for r in args.runners.split(',') if r.strip()], args.latency,
+                            args.tokens_per_second, args.error_rate, args.seed, args.workers, args.concurrency)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='cli.py', description='Paper extraction and web form submission pipeline')
+    parser.add_argument('--profile-startup', action='store_true', help='report import times of heavy modules')
+    parser.add_argument('--profile', metavar='STAGES',
+                        help='profile stages (pdf_parse,json_parse,agent_run,db_insert or all), see profiling.py')
+    parser.add_argument('--profile-mode', choices=['sampling', 'deterministic'], default=None)
+    parser.add_argument('--profile-format', choices=['collapsed', 'speedscope'], default=None)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('extract', help='extract paper info from PDFs with the LLM')
+    p.add_argument('pdfs', nargs='*', help='PDF files (default: all PDFs in PAPER_STORAGE_DIR)')
+    p.add_argument('--cache', default=EXTRACT_CACHE, help='extraction cache / output file')
+    p.add_argument('--concurrency', type=int, default=4)
+    p.add_argument('--force', action='store_true', help='ignore cached results')
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser('submit', help='submit extracted paper info through the browser agent')
+    p.add_argument('--cache', default=EXTRACT_CACHE, help='file written by the extract command')
+    p.add_argument('--form-url', default=None, help='default: FLASK_SERVER_URL/')
+    p.add_argument('--force', action='store_true', help='resubmit papers that were already submitted')
+    p.set_defaults(func=cmd_submit)
+
+    p = sub.add_parser('run', help='run the full pipeline')
+    p.add_argument('--mode', choices=['sequential', 'gather', 'sharded', 'watch'], default='gather')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes for --mode sharded')
+    p.add_argument('--concurrency', type=int, default=2, help='agents per process (sharded / watch)')
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser('serve', help='start the Flask form server')
+    p.add_argument('--host', default='0.0.0.0')
+    p.add_argument('--port', type=int, default=8848)
+    p.add_argument('--debug', action='store_true')
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('bench', help='offline benchmark with the stub LLM server')
+    p.add_argument('--papers', type=int, default=20)
+    p.add_argument('--runners', default='sequential,gather,sharded')
+    p.add_argument('--latency', default='lognormal:-0.5,0.6')
+    p.add_argument('--tokens-per-second', type=float, default=0.0)
+    p.add_argument('--error-rate', type=float, default=0.0)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--workers', type=int, default=2)
+    p.add_argument('--concurrency', type=int, default=2)
+    p.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    parse_ready = time.perf_counter() - _CLI_START
+    # 剖析配置通过环境变量传给 profiling 模块 (以及 sharded 模式下的子进程)
+    for env_name, value in (('PIPELINE_PROFILE', args.profile), ('PIPELINE_PROFILE_MODE', args.profile_mode),
+                            ('PIPELINE_PROFILE_FORMAT', args.profile_format)):
+        if value:
+            os.environ[env_name] = value
+    try:
+        return args.func(args)
+    finally:
+        if args.profile_startup:
+            _print_startup_report(parse_ready)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
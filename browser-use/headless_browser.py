@@ -2,11 +2,14 @@ import asyncio
 import os
 import json
 import logging
-from datetime import datetime
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from pydantic import SecretStr
 from browser_use import Agent, BrowserConfig, Browser
+from task_graph import run_task_graph, format_dependency_context
+from result_store import get_default_store
+from prompt_templates import CacheUsageCallback, cache_stats
+from log_setup import setup_logging
 
 # Basic configuration
 # https://docs.browser-use.com/customize/browser-settings
@@ -19,14 +22,7 @@ config = BrowserConfig(
 browser = Browser(config=config)
 
 # 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('agent_log.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()  # 异步写入轮转的 JSON lines 日志文件 (见 log_setup.py)
 logger = logging.getLogger(__name__)
 
 
@@ -53,37 +49,31 @@ def serialize_result(result):
 
 
 def save_results(data, filename_prefix='result'):
-    """保存结果到JSON文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    # 创建saved文件夹（如果不存在）
-    save_dir = 'saved'
-    os.makedirs(save_dir, exist_ok=True)
-    # 使用os.path.join构建文件路径
-    filename = os.path.join(save_dir, f'{filename_prefix}_{timestamp}.json')
+    """将结果追加到 JSONL 结果存储（后台写入），返回记录 ID"""
     try:
-        # 序列化结果，确保只包含可JSON化的数据
-        serialized_data = serialize_result(data)
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(serialized_data, f, ensure_ascii=False, indent=2)
-        logger.info(f'Results saved to {filename}')
+        record_id = get_default_store().append(filename_prefix, data)
+        logger.info(f'Result {record_id} queued for {filename_prefix}')
+        return record_id
     except Exception as e:
         logger.error(f'Failed to save results: {str(e)}')
         raise
 
 
-async def run_agent(task, filename_prefix='result'):
-    """运行浏览器代理任务"""
+async def run_agent(task, filename_prefix='result', browser_context=None):
+    """运行浏览器代理任务，传入 browser_context 时在该独立上下文中运行"""
     try:
         api_key = load_api_key()
 
         # 初始化Agent，启用headless模式
         agent = Agent(
             browser=browser,
+            browser_context=browser_context,
             task=task,
             llm=ChatOpenAI(
-                base_url='https://api.deepseek.com/v1',
+                base_url=os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1'),
                 model='deepseek-chat',
                 api_key=SecretStr(api_key),
+                callbacks=[CacheUsageCallback(filename_prefix)],  # 记录上下文缓存命中的 token 数
             ),
             use_vision=False,
         )
@@ -136,16 +126,48 @@ TASKS = {
 }
 
 
-async def main():
-    """主函数，运行所有示例任务"""
-    for task_name, task_description in TASKS.items():
-        logger.info(f'Running {task_name} task...')
-        result = await run_agent(task_description, task_name)
+# 任务依赖：任务名 -> 前置任务名列表。示例任务互相独立，因此为空
+TASK_DEPENDENCIES = {}
+MAX_PARALLEL_TASKS = 4  # 同时运行的任务数上限
+TASK_TIMEOUT = 300  # 单个任务的超时秒数
+
+
+async def run_task_in_context(task_name, task_description, dep_results):
+    """在独立的浏览器上下文中运行单个任务，前置任务的结果附加到任务描述中"""
+    context = await browser.new_context()
+    try:
+        task = task_description + format_dependency_context(dep_results)
+        return await run_agent(task, task_name, browser_context=context)
+    finally:
+        await context.close()
+
+
+def print_result(task_name, outcome):
+    """任务完成后立即打印结果"""
+    print(f'Result for {task_name} ({outcome["status"]}, {outcome["duration"]:.1f}s):')
+    if outcome['status'] == 'ok':
         # 序列化结果以确保打印时无错误
-        serialized_result = serialize_result(result)
-        print(f'Result for {task_name}:')
-        print(json.dumps(serialized_result, ensure_ascii=False, indent=2))
-        print('-' * 50)
+        print(json.dumps(serialize_result(outcome['result']), ensure_ascii=False, indent=2))
+    else:
+        print(outcome['error'])
+    print('-' * 50)
+
+
+async def main():
+    """主函数，按依赖关系并发运行所有示例任务"""
+    logger.info(f'Running {len(TASKS)} tasks with up to {MAX_PARALLEL_TASKS} in parallel...')
+    try:
+        await run_task_graph(
+            TASKS,
+            run_task_in_context,
+            dependencies=TASK_DEPENDENCIES,
+            max_parallel=MAX_PARALLEL_TASKS,
+            task_timeout=TASK_TIMEOUT,
+            on_result=print_result,
+        )
+        logger.info(f'Prompt cache stats: {cache_stats.summary()}')
+    finally:
+        await browser.close()
 
 
 if __name__ == '__main__':
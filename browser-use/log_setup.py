@@ -0,0 +1,145 @@
+# 共享的日志配置：调用方线程 (事件循环) 只把日志记录放进内存队列，
+# 由 QueueListener 的后台线程写入按大小轮转的 JSON lines 文件和控制台，磁盘 IO 不再阻塞事件循环。
+# 大的负载 (LLM 原始输出、元素字典等) 通过 extra={'payload': ...} 传入，按策略截断和采样：
+#   LOG_FILE=agent_log.jsonl          日志文件路径
+#   LOG_LEVEL=INFO                    日志级别
+#   LOG_MAX_BYTES=10485760            单个日志文件大小上限，超过后轮转
+#   LOG_BACKUP_COUNT=5                保留的轮转文件数量
+#   LOG_MAX_FIELD_CHARS=500           消息和负载的最大字符数，超出部分截断
+#   LOG_PAYLOAD_SAMPLE_RATE=0.1       INFO 及以下级别的负载只保留该比例，其余只记录长度；WARNING 及以上总是保留
+#   LOG_QUEUE_SIZE=10000              队列上限，写入跟不上时丢弃新记录而不是阻塞调用方
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = os.getenv('LOG_FILE', 'agent_log.jsonl')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_MAX_FIELD_CHARS = int(os.getenv('LOG_MAX_FIELD_CHARS', '500'))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.1'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# LogRecord 的标准属性，其余属性视为调用方通过 extra 传入的结构化字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def truncate(text: str, max_chars: int = LOG_MAX_FIELD_CHARS) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f'{text[:max_chars]}...(+{len(text) - max_chars} chars)'
+
+
+class PayloadPolicy:
+    """在调用方线程中截断消息、对大负载采样，让进入队列的记录保持小而固定的大小。"""
+
+    def __init__(self, max_chars: int = LOG_MAX_FIELD_CHARS, sample_rate: float = LOG_PAYLOAD_SAMPLE_RATE):
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+
+    def apply(self, record: logging.LogRecord):
+        record.msg = truncate(record.getMessage(), self.max_chars)
+        record.args = None
+        if not hasattr(record, 'payload'):
+            return
+        payload = record.payload
+        text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+        if record.levelno < logging.WARNING and random.random() >= self.sample_rate:
+            record.payload = {'sampled_out': True, 'chars': len(text)}
+        else:
+            record.payload = truncate(text, self.max_chars)
+
+
+class _PolicyQueueHandler(QueueHandler):
+    """队列满时丢弃记录并计数，而不是阻塞或在调用方线程打印异常。"""
+
+    def __init__(self, log_queue, policy: PayloadPolicy):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record):
+        self.policy.apply(record)
+        record.exc_text = logging.Formatter().formatException(record.exc_info) if record.exc_info else None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON：时间、级别、logger、消息，以及 extra 传入的字段。"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(log_file: str = LOG_FILE, level: str = LOG_LEVEL, console: bool = True,
+                  policy: PayloadPolicy = None) -> logging.Logger:
+    """配置根 logger (只生效一次，重复调用直接返回)；进程退出时自动刷新并停止后台线程。"""
+    global _listener, _queue_handler
+    with _setup_lock:
+        root = logging.getLogger()
+        if _listener is not None:
+            return root
+
+        handlers = []
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                               encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        if console:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+            handlers.append(stream_handler)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = _PolicyQueueHandler(log_queue, policy or PayloadPolicy())
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+        atexit.register(shutdown_logging)
+        return root
+
+
+def shutdown_logging():
+    """处理完队列中剩余的记录并停止后台线程。"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger()
+        root.removeHandler(_queue_handler)
+        if _queue_handler.dropped:
+            print(f"日志队列已满，共丢弃 {_queue_handler.dropped} 条日志。")
@@ -1,35 +1,49 @@
 import asyncio, json, os, re
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic import SecretStr
+from resilient_llm import ResilientLLM, unwrap_llm
+from profiling import profile_stage, profiled
+from tracing import finish_run, record_agent_history, record_llm_usage, start_metrics_server, traced, tracer
+from prompt_templates import (
+    PAPER_FIELDS, PAPER_INFO_EXTRACTION, WEB_FORM_TASK, build_web_form_task, cache_stats
+)
 from browser_use import Agent
 from PyPDF2 import PdfReader  # 用于PDF文本提取
 
 # --- 配置 ---
 load_dotenv()
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')  # DeepSeek API Key
-if not DEEPSEEK_API_KEY:
-    raise ValueError('DEEPSEEK_API_KEY 未在 .env 文件中设置！')
-STORAGE_DIR = './storage/en'  # PDF 存储目录
-if not os.path.exists(STORAGE_DIR):
-    os.makedirs(STORAGE_DIR)
-    print(f"创建了存储目录: {STORAGE_DIR}")
-FLASK_SERVER_URL = "http://localhost:8848"  # Flask 后端服务地址
+# OpenAI 兼容接口地址，可以指向本地的 stub_llm_server.py 做离线压测
+DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1')
+STORAGE_DIR = os.getenv('PAPER_STORAGE_DIR', './storage/en')  # PDF 存储目录
+FLASK_SERVER_URL = os.getenv('FLASK_SERVER_URL', "http://localhost:8848")  # Flask 后端服务地址
 TARGET_WEB_FORM_URL = f"{FLASK_SERVER_URL}/"  # 表单页面URL
 SUBMIT_API_URL = f"{FLASK_SERVER_URL}/submit"  # 提交API URL
+PAPER_PAUSE_SECONDS = float(os.getenv('PAPER_PAUSE_SECONDS', '3'))  # 文件之间的暂停，避免请求过于频繁
+
+
+def check_config():
+    """运行前检查配置 (不在导入时执行)：API Key 必须设置，存储目录不存在时创建。"""
+    if not DEEPSEEK_API_KEY:
+        raise ValueError('DEEPSEEK_API_KEY 未在 .env 文件中设置！')
+    if not os.path.exists(STORAGE_DIR):
+        os.makedirs(STORAGE_DIR)
+        print(f"创建了存储目录: {STORAGE_DIR}")
 
 
 # --- PDF 信息提取函数 ---
-async def extract_info_from_pdf(pdf_path: str, llm_model: ChatOpenAI) -> dict:
+@traced('extract_info_from_pdf', outcome=lambda info: 'error' if info.get('extraction_error') else 'ok')
+async def extract_info_from_pdf(pdf_path: str, llm_model: ResilientLLM) -> dict:
     """
     利用 LLM 从 PDF 文本中提取结构化信息（标题、作者、摘要、日期等）。
     """
     try:
-        reader = PdfReader(pdf_path)
-        full_text = ""
-        for page in reader.pages:
-            full_text += page.extract_text() or ""
+        with profile_stage('pdf_parse'):
+            reader = PdfReader(pdf_path)
+            full_text = ""
+            for page in reader.pages:
+                full_text += page.extract_text() or ""
 
         if not full_text.strip():
             print(f"警告: PDF '{pdf_path}' 未能提取到有效文本。")
@@ -42,7 +56,8 @@ async def extract_info_from_pdf(pdf_path: str, llm_model: ChatOpenAI) -> dict:
                 'introduction': '无文本',
                 'funding': '无文本',
                 'conclusion': '无文本',
-                'affiliation': '无文本'
+                'affiliation': '无文本',
+                'extraction_error': '未能提取到有效文本'
             }
 
         # 限制输入文本长度，避免超出LLM的上下文窗口
@@ -50,49 +65,21 @@ async def extract_info_from_pdf(pdf_path: str, llm_model: ChatOpenAI) -> dict:
         max_text_length = 15000
         truncated_text = full_text[:max_text_length]
 
-        # 构建 Prompt
-        prompt = [
-            SystemMessage(
-                content="你是一个高级的信息提取助手。请根据提供的论文文本，准确提取以下信息，并以 JSON 格式返回。如果某个字段无法提取，请使用 'N/A'。"),
-            HumanMessage(content=f"""
-                    请从以下论文文本中提取以下关键信息：
-                    - **标题 (title)**: 论文的完整标题。
-                    - **作者 (authors)**: 所有作者的姓名，用逗号分隔。
-                    - **机构 (affiliation)**: 作者所在的机构或单位。
-                    - **日期 (date)**: 论文的发表日期或版本日期。
-                    - **摘要 (abstract)**: 论文的摘要部分。
-                    - **引言 (introduction)**: 论文的引言部分。
-                    - **资助 (funding)**: 论文中提到的资金来源或致谢部分。
-                    - **结论 (conclusion)**: 论文的结论部分。
-
-                    请严格按照以下 JSON 格式返回结果：
-                    ```json
-                    {{
-                        "title": "...",
-                        "authors": "...",
-                        "affiliation": "...",
-                        "date": "...",
-                        "abstract": "...",
-                        "introduction": "...",
-                        "funding": "...",
-                        "conclusion": "..."
-                    }}
-                    ```
-
-                    论文文本：
-                    {truncated_text}
-                    """)
-        ]
+        # 构建 Prompt：固定指令在前，论文文本在最后，保证前缀可以命中提供商的上下文缓存
+        prompt = PAPER_INFO_EXTRACTION.build_messages(truncated_text)
 
         # 调用 LLM 进行推理
         response = await llm_model.ainvoke(prompt)
+        cache_stats.record_response(PAPER_INFO_EXTRACTION.name, response)
+        record_llm_usage(response)
         extracted_json_str = response.content
 
         # 解析 JSON 字符串
-        json_match = re.search(r'```json\n([\s\S]+?)\n```', extracted_json_str)
-        if json_match:
-            extracted_json_str = json_match.group(1)
-        extracted_data = json.loads(extracted_json_str)
+        with profile_stage('json_parse'):
+            json_match = re.search(r'```json\n([\s\S]+?)\n```', extracted_json_str)
+            if json_match:
+                extracted_json_str = json_match.group(1)
+            extracted_data = json.loads(extracted_json_str)
 
         # 将提取的数据与原始路径合并
         extracted_data['pdf_path'] = pdf_path
@@ -110,11 +97,13 @@ async def extract_info_from_pdf(pdf_path: str, llm_model: ChatOpenAI) -> dict:
             'introduction': 'LLM提取错误',
             'funding': 'LLM提取错误',
             'conclusion': 'LLM提取错误',
-            'affiliation': 'LLM提取错误'
+            'affiliation': 'LLM提取错误',
+            'extraction_error': str(e)  # 带有该字段的结果不会被提交到表单
         }
 
 
 # --- 智能体任务生成函数 ---
+@traced('generate_web_form_task')
 def generate_web_form_task(paper_info: dict, form_url: str) -> str:
     """
     生成智能体填充网页表单的任务字符串。
@@ -126,44 +115,27 @@ def generate_web_form_task(paper_info: dict, form_url: str) -> str:
     def escape_for_task(text):
         if not text:
             return ""
-        # 简单转义双引号，避免与任务字符串的引号冲突
-        return text.replace('"', '\\"').replace('\n', ' ').replace('\r', '')  # 移除换行符，因为 HTML textarea 可能不直接支持
-
-    title = escape_for_task(paper_info['title'])
-    authors = escape_for_task(paper_info['authors'])
-    affiliation = escape_for_task(paper_info['affiliation'])
-    date = escape_for_task(paper_info['date'])
-    abstract = escape_for_task(paper_info['abstract'])
-    introduction = escape_for_task(paper_info['introduction'])
-    funding = escape_for_task(paper_info['funding'])
-    conclusion = escape_for_task(paper_info['conclusion'])
-
-    # IMPORTANT: 替换这些选择器以匹配你的 form.html 中的实际 input/textarea 元素的 name 属性！
-    # 例如：<input type="text" name="title"> 对应的指令就是 'name "title"'
-    task = f"""
-        1. Go to {form_url}
-        2. Fill the input field with name "title" with the value "{title}"
-        3. Fill the input field with name "authors" with the value "{authors}"
-        4. Fill the input field with name "affiliation" with the value "{affiliation}"
-        5. Fill the input field with name "date" with the value "{date}"
-        6. Fill the textarea with name "abstract" with the value "{abstract}"
-        7. Fill the textarea with name "introduction" with the value "{introduction}"
-        8. Fill the textarea with name "funding" with the value "{funding}"
-        9. Fill the textarea with name "conclusion" with the value "{conclusion}"
-        10. Click the submit button with name "submit" or type "submit".
-        11. After submission, wait for a message indicating success or failure. If a message containing "数据已保存" or "ID:" appears, return "提交成功". Otherwise, return "提交失败".
-        12. Return the URL of the page after submission (which should still be {form_url} if your Flask app redirects, or the API response URL if it changes).
-    """
-    return task.strip()
+        # 引号等特殊字符由 build_web_form_task 按 JSON 字符串转义，这里只移除换行符
+        # (HTML input/textarea 可能不直接支持多行或需要特定处理)
+        return text.replace('\n', ' ').replace('\r', '')
+
+    escaped_info = {field: escape_for_task(paper_info.get(field, '')) for field in PAPER_FIELDS}
+
+    # IMPORTANT: 模板中的选择器需要与 form.html 中 input/textarea 元素的 name 属性一致！
+    # 固定的操作步骤在前，URL 和字段值放在任务末尾的 DATA 段，便于命中上下文缓存
+    return build_web_form_task(WEB_FORM_TASK, escaped_info, form_url)
 
 
 # --- 主自动化逻辑 ---
 async def process_paper_files():
-    llm_model = ChatOpenAI(
-        base_url='https://api.deepseek.com/v1',
+    check_config()
+    start_metrics_server()  # 配置了 PIPELINE_METRICS_PORT 时提供 /metrics
+    # 带超时、重试、对冲请求和熔断器的 LLM 客户端
+    llm_model = ResilientLLM(ChatOpenAI(
+        base_url=DEEPSEEK_BASE_URL,
         model='deepseek-reasoner',  # 或 deepseek-chat
         api_key=SecretStr(DEEPSEEK_API_KEY),
-    )
+    ))
 
     pdf_files = [f for f in os.listdir(STORAGE_DIR) if f.endswith('.pdf')]
     if not pdf_files:
@@ -176,6 +148,9 @@ async def process_paper_files():
 
         # 1. 使用 LLM 从 PDF 中提取信息
         paper_info = await extract_info_from_pdf(pdf_path, llm_model)
+        if paper_info.get('extraction_error'):
+            print(f"跳过 {pdf_file_name}：信息提取失败，不提交表单 ({paper_info['extraction_error']})。")
+            continue
 
         # 2. 生成智能体任务，填充网页表单
         agent_task = generate_web_form_task(paper_info, TARGET_WEB_FORM_URL)
@@ -185,18 +160,22 @@ async def process_paper_files():
         try:
             agent = Agent(
                 task=agent_task,
-                llm=llm_model,
+                llm=unwrap_llm(llm_model),
                 # 启用视觉功能，帮助智能体更好地定位网页元素
                 # DeepSeek models do not support use_vision=True yet.
                 use_vision=False,
                 # verbose=True # 可以打开这个选项来查看智能体的详细执行过程
             )
             print("启动浏览器智能体以提交表单...")
-            agent_result = await agent.run()
+            with tracer.span('agent.run', mode='dom') as span:
+                agent_result = await profiled('agent_run', agent.run())
+                record_agent_history(span, agent_result)
+                submitted = "提交成功" in str(agent_result.final_result())
+                span.set('ok' if submitted else 'failed')
             print(f"智能体执行完毕。结果: {agent_result}")
 
             # 根据智能体返回的结果判断提交状态
-            if "提交成功" in agent_result:
+            if submitted:
                 print(f"论文 '{paper_info['title']}' 提交到 Flask 后端成功！")
             else:
                 print(f"论文 '{paper_info['title']}' 提交失败。智能体返回结果: {agent_result}")
@@ -204,7 +183,11 @@ async def process_paper_files():
         except Exception as e:
             print(f"智能体在处理 {pdf_file_name} 时发生错误: {e}")
 
-        await asyncio.sleep(3)  # 在处理下一个文件前暂停几秒，避免请求过于频繁
+        await asyncio.sleep(PAPER_PAUSE_SECONDS)  # 在处理下一个文件前暂停几秒，避免请求过于频繁
+
+    print(f"LLM 调用统计: {json.dumps(llm_model.stats(), ensure_ascii=False)}")
+    print(f"提示词缓存命中统计: {json.dumps(cache_stats.summary(), ensure_ascii=False)}")
+    finish_run('papers2web_form')
 
 
 # --- 主程序入口 ---
@@ -0,0 +1,298 @@
+# 按需开启的分阶段性能剖析：不改代码，通过环境变量 (或 CLI) 选择要剖析的阶段和剖析方式，
+# 结果按阶段写入 saved/profiles/，格式为火焰图工具通用的 collapsed stacks 或 speedscope JSON。
+#   PIPELINE_PROFILE=pdf_parse,agent_run   要剖析的阶段 (all 表示全部)，为空时不剖析，开销为零
+#   PIPELINE_PROFILE_MODE=sampling         sampling: 定时采样调用栈；deterministic: sys.setprofile 记录每次调用
+#   PIPELINE_PROFILE_RATE=200              采样频率 (Hz)
+#   PIPELINE_PROFILE_FORMAT=collapsed      collapsed (flamegraph.pl / speedscope 均可打开) 或 speedscope
+# 协程阶段 (如 agent_run) 通过逐步驱动协程的包装器，只在该协程实际执行的时间片内采样或记录，
+# 同一事件循环上并发的其他任务不会被算进来。
+import atexit
+import contextlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+STAGES = ('pdf_parse', 'json_parse', 'agent_run', 'db_insert')
+PROFILE_DIR = os.path.join('saved', 'profiles')
+
+_config = {
+    'stages': set(),
+    'mode': 'sampling',
+    'rate': 200.0,
+    'format': 'collapsed',
+    'output_dir': PROFILE_DIR,
+}
+_lock = threading.Lock()
+_results = {}  # 阶段 -> Counter(collapsed stack -> 样本数或微秒)
+_active = {}  # 线程 id -> Counter(阶段 -> 嵌套深度)
+_sampler = None
+_atexit_registered = False
+_THIS_FILE = os.path.abspath(__file__)
+
+
+def configure(stages=None, mode: str = None, rate: float = None, fmt: str = None, output_dir: str = None):
+    """设置剖析参数；stages 可以是逗号分隔的字符串或集合，'all' 表示全部阶段。"""
+    global _atexit_registered
+    if stages is not None:
+        if isinstance(stages, str):
+            stages = [s.strip() for s in stages.split(',') if s.strip()]
+        stages = set(STAGES) if 'all' in stages else set(stages)
+        unknown = stages - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown profiling stages: {sorted(unknown)} (expected {STAGES})")
+        _config['stages'] = stages
+    if mode is not None:
+        if mode not in ('sampling', 'deterministic'):
+            raise ValueError(f"Unknown profiling mode '{mode}'")
+        _config['mode'] = mode
+    if rate is not None:
+        rate = float(rate)
+        if not math.isfinite(rate) or rate <= 0:
+            raise ValueError(f"Profiling sample rate must be a positive number of samples per second, got {rate}")
+        _config['rate'] = rate
+    if fmt is not None:
+        if fmt not in ('collapsed', 'speedscope'):
+            raise ValueError(f"Unknown profile format '{fmt}'")
+        _config['format'] = fmt
+    if output_dir is not None:
+        _config['output_dir'] = output_dir
+    if _config['stages'] and not _atexit_registered:
+        atexit.register(write_profiles)
+        _atexit_registered = True
+
+
+def enabled(stage: str) -> bool:
+    return stage in _config['stages']
+
+
+# --- 调用栈格式化 ---
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        if os.path.abspath(frame.f_code.co_filename) != _THIS_FILE:
+            names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+# --- 采样模式 ---
+class _Sampler(threading.Thread):
+    """定时读取 sys._current_frames()，只记录正处于被剖析阶段中的线程。"""
+
+    def __init__(self):
+        super().__init__(name='stage-profiler', daemon=True)
+
+    def run(self):
+        while True:
+            time.sleep(1.0 / _config['rate'])
+            with _lock:
+                active = {tid: [stage for stage, depth in stages.items() if depth > 0]
+                          for tid, stages in _active.items()}
+            if not any(active.values()):
+                continue
+            frames = sys._current_frames()
+            with _lock:
+                for tid, stages in active.items():
+                    frame = frames.get(tid)
+                    if frame is None or not stages:
+                        continue
+                    stack = _collapse(frame)
+                    for stage in stages:
+                        _results.setdefault(stage, Counter())[stack] += 1
+
+
+def _ensure_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = _Sampler()
+            _sampler.start()
+
+
+# --- 确定性模式 ---
+_thread_results = []  # 各线程的确定性剖析结果，输出时合并
+
+
+class _ThreadProfile(threading.local):
+    def __init__(self):
+        self.stack = []  # 当前调用路径 (帧名称)
+        self.last = 0.0
+        self.stages = Counter()
+        self.results = {}  # 阶段 -> Counter；回调里不加锁，避免与被剖析代码争用 _lock
+        with _lock:
+            _thread_results.append(self.results)
+
+
+_thread_profile = _ThreadProfile()
+
+
+def _profile_callback(frame, event, arg):
+    state = _thread_profile
+    now = time.perf_counter()
+    elapsed_us = int((now - state.last) * 1e6)
+    if elapsed_us and state.stack:
+        path = ';'.join(state.stack)
+        for stage, depth in state.stages.items():
+            if depth > 0:
+                state.results.setdefault(stage, Counter())[path] += elapsed_us
+    if os.path.abspath(frame.f_code.co_filename) != _THIS_FILE:  # 剖析器自身的调用不计入
+        if event == 'call':
+            state.stack.append(_frame_name(frame))
+        elif event == 'c_call':
+            state.stack.append(f"{getattr(arg, '__qualname__', getattr(arg, '__name__', 'builtin'))} (builtin)")
+        elif len(state.stack) > 1:  # 进入阶段之前就已开始的帧返回时，不弹出阶段根节点
+            state.stack.pop()
+    state.last = time.perf_counter()
+
+
+# --- 进入 / 退出阶段 ---
+def _enter(stage: str):
+    tid = threading.get_ident()
+    with _lock:
+        _active.setdefault(tid, Counter())[stage] += 1
+    if _config['mode'] == 'deterministic':
+        state = _thread_profile
+        if not any(depth > 0 for depth in state.stages.values()):
+            state.stack = [stage]
+            state.last = time.perf_counter()
+            sys.setprofile(_profile_callback)
+        state.stages[stage] += 1
+    else:
+        _ensure_sampler()
+
+
+def _exit(stage: str):
+    tid = threading.get_ident()
+    with _lock:
+        _active[tid][stage] -= 1
+    if _config['mode'] == 'deterministic':
+        state = _thread_profile
+        state.stages[stage] -= 1
+        if not any(depth > 0 for depth in state.stages.values()):
+            sys.setprofile(None)
+
+
+@contextlib.contextmanager
+def profile_stage(stage: str):
+    """同步代码块或函数 (作为装饰器) 的剖析；阶段未启用时直接执行。"""
+    if not enabled(stage):
+        yield
+        return
+    _enter(stage)
+    try:
+        yield
+    finally:
+        _exit(stage)
+
+
+class _SteppedCoroutine:
+    """逐步驱动被包装的协程：每个时间片前后进入 / 退出阶段，挂起期间不计入。"""
+
+    def __init__(self, stage: str, coro):
+        self.stage = stage
+        self.coro = coro
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def send(self, value):
+        _enter(self.stage)
+        try:
+            return self.coro.send(value)
+        finally:
+            _exit(self.stage)
+
+    def throw(self, *args):
+        _enter(self.stage)
+        try:
+            return self.coro.throw(*args)
+        finally:
+            _exit(self.stage)
+
+    def close(self):
+        return self.coro.close()
+
+
+def profiled(stage: str, coro):
+    """剖析一个协程：await profiled('agent_run', agent.run())。阶段未启用时原样返回协程。"""
+    if not enabled(stage):
+        return coro
+    return _SteppedCoroutine(stage, coro)
+
+
+# --- 输出 ---
+def _write_speedscope(path: str, stage: str, stacks: Counter):
+    frames, frame_index, samples, weights = [], {}, [], []
+    for stack, weight in stacks.items():
+        indices = []
+        for name in stack.split(';'):
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({'name': name})
+            indices.append(frame_index[name])
+        samples.append(indices)
+        weights.append(weight)
+    deterministic = _config['mode'] == 'deterministic'
+    document = {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': stage, 'unit': 'microseconds' if deterministic else 'none',
+            'startValue': 0, 'endValue': sum(weights), 'samples': samples, 'weights': weights,
+        }],
+        'name': f'{stage} ({_config["mode"]})',
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False)
+
+
+def write_profiles() -> list:
+    """把已收集的各阶段剖析结果写入输出目录并清空，返回写出的文件路径。"""
+    with _lock:
+        for thread_results in _thread_results:
+            for stage, stacks in list(thread_results.items()):
+                _results.setdefault(stage, Counter()).update(stacks)
+                thread_results.pop(stage, None)
+        results = {stage: stacks for stage, stacks in _results.items() if stacks}
+        _results.clear()
+    if not results:
+        return []
+    os.makedirs(_config['output_dir'], exist_ok=True)
+    timestamp = time.strftime('%Y%m%d_%H%M%S')
+    paths = []
+    for stage, stacks in results.items():
+        base = os.path.join(_config['output_dir'], f"{stage}_{_config['mode']}_{timestamp}_{os.getpid()}")
+        if _config['format'] == 'speedscope':
+            path = base + '.speedscope.json'
+            _write_speedscope(path, stage, stacks)
+        else:
+            path = base + '.collapsed'
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, weight in stacks.most_common():
+                    f.write(f'{stack} {weight}\n')
+        paths.append(path)
+        print(f"阶段 '{stage}' 的剖析结果已保存到 {path}")
+    return paths
+
+
+configure(
+    stages=os.getenv('PIPELINE_PROFILE', ''),
+    mode=os.getenv('PIPELINE_PROFILE_MODE', 'sampling'),
+    rate=float(os.getenv('PIPELINE_PROFILE_RATE', '200')),
+    fmt=os.getenv('PIPELINE_PROFILE_FORMAT', 'collapsed'),
+)
@@ -0,0 +1,221 @@
+# 提示词模板注册表：所有固定的指令和输出格式放在逐字节不变的前缀中，每篇论文的内容严格放在最后，
+# 以便 DeepSeek 等提供商命中上下文缓存 (按前缀匹配，命中部分计费更低、响应更快)。
+# 同时从响应的 usage 中记录缓存命中的 token 数，用于核对节省效果。
+import json
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage, HumanMessage
+
+PAPER_FIELDS = ['title', 'authors', 'affiliation', 'date', 'abstract', 'introduction', 'funding', 'conclusion']
+
+
+class PromptTemplate:
+    """
+    system: 固定的系统消息；instructions: 固定的用户指令前缀；
+    document 只会被追加在 instructions 之后，不允许插入到中间。
+    """
+
+    def __init__(self, name: str, instructions: str, system: str = None):
+        self.name = name
+        self.system = system
+        self.instructions = instructions
+
+    def build_text(self, document: str) -> str:
+        """单字符串形式的提示词（用于 llm.invoke(str) 或智能体任务）。"""
+        return self.instructions + document
+
+    def build_messages(self, document: str) -> list:
+        """消息列表形式的提示词：[系统消息, 固定指令 + 文档]。"""
+        messages = [SystemMessage(content=self.system)] if self.system else []
+        messages.append(HumanMessage(content=self.build_text(document)))
+        return messages
+
+
+_registry = {}
+
+
+def register_prompt(template: PromptTemplate) -> PromptTemplate:
+    if template.name in _registry:
+        raise ValueError(f"Prompt template '{template.name}' is already registered")
+    _registry[template.name] = template
+    return template
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return _registry[name]
+
+
+# --- 缓存命中统计 ---
+class CacheUsageStats:
+    """按模板名累计提示词 token 数和缓存命中 token 数。线程安全。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record_usage(self, name: str, usage: dict):
+        if not usage:
+            return
+        # DeepSeek: prompt_cache_hit_tokens / prompt_cache_miss_tokens；
+        # OpenAI: prompt_tokens_details.cached_tokens；LangChain usage_metadata: input_token_details.cache_read
+        prompt_tokens = usage.get('prompt_tokens', usage.get('input_tokens', 0)) or 0
+        hit = usage.get('prompt_cache_hit_tokens')
+        if hit is None:
+            hit = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+        if hit is None:
+            hit = (usage.get('input_token_details') or {}).get('cache_read', 0)
+        with self._lock:
+            entry = self._stats.setdefault(name, {'calls': 0, 'prompt_tokens': 0, 'cache_hit_tokens': 0})
+            entry['calls'] += 1
+            entry['prompt_tokens'] += prompt_tokens
+            entry['cache_hit_tokens'] += hit or 0
+
+    def record_response(self, name: str, response):
+        """从 LangChain AIMessage 中取出 usage 并记录。"""
+        metadata = getattr(response, 'response_metadata', None) or {}
+        usage = metadata.get('token_usage') or getattr(response, 'usage_metadata', None)
+        self.record_usage(name, usage)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                name: {**entry, 'cache_hit_ratio': round(entry['cache_hit_tokens'] / entry['prompt_tokens'], 3)
+                       if entry['prompt_tokens'] else 0.0}
+                for name, entry in self._stats.items()
+            }
+
+
+cache_stats = CacheUsageStats()
+
+
+class CacheUsageCallback(BaseCallbackHandler):
+    """挂在 ChatOpenAI(callbacks=[...]) 上，记录 browser_use 智能体内部 LLM 调用的缓存命中情况。"""
+
+    def __init__(self, name: str, stats: CacheUsageStats = cache_stats):
+        self.name = name
+        self.stats = stats
+
+    def on_llm_end(self, response, **kwargs):
+        self.stats.record_usage(self.name, (response.llm_output or {}).get('token_usage'))
+
+
+# --- 模板定义 ---
+# 注意：以下字符串就是发送给模型的字节序列，修改任何字符都会使已有的缓存失效。
+PAPER_INFO_EXTRACTION = register_prompt(PromptTemplate(
+    name='paper_info_extraction',
+    system="你是一个高级的信息提取助手。请根据提供的论文文本，准确提取以下信息，并以 JSON 格式返回。如果某个字段无法提取，请使用 'N/A'。",
+    instructions="""请从文末的论文文本中提取以下关键信息：
+- **标题 (title)**: 论文的完整标题。
+- **作者 (authors)**: 所有作者的姓名，用逗号分隔。
+- **机构 (affiliation)**: 作者所在的机构或单位。
+- **日期 (date)**: 论文的发表日期或版本日期。
+- **摘要 (abstract)**: 论文的摘要部分。
+- **引言 (introduction)**: 论文的引言部分。
+- **资助 (funding)**: 论文中提到的资金来源或致谢部分。
+- **结论 (conclusion)**: 论文的结论部分。
+
+请严格按照以下 JSON 格式返回结果：
+```json
+{
+    "title": "...",
+    "authors": "...",
+    "affiliation": "...",
+    "date": "...",
+    "abstract": "...",
+    "introduction": "...",
+    "funding": "...",
+    "conclusion": "..."
+}
+```
+
+论文文本：
+""",
+))
+
+PAPER_ELEMENTS_EXTRACTION = register_prompt(PromptTemplate(
+    name='paper_elements_extraction',
+    instructions="""你是一个专业的学术论文分析助手。请从文末的论文文本中提取以下关键元素，并确保输出为有效的 JSON 格式：
+- 标题：论文的完整标题，通常位于文档开头或第一页顶部。
+- 作者：所有作者的姓名（用逗号分隔），通常在标题下方。
+- 单位：作者的机构隶属（如大学、研究所），通常在作者下方或脚注中。
+- 日期：出版、提交或会议日期（如“2023年5月”或“2023-05”），可能出现在标题下方或元数据中。
+- 摘要：以“摘要”或“Abstract”开头的段落，通常在标题和正文之间。
+- 引言：引言部分的第一段，通常以“引言”或“Introduction”开头；如果没有明确标签，提取正文第一段。
+- 资助：资助信息，通常包含“基金”“资助”“支持”“acknowledgment”或“grant”等关键词，可能在致谢、脚注或文章末尾。
+- 结论：以“结论”“总结”或“Conclusion”开头的最后部分；如果没有明确标签，提取最后一段或最后几段的总结性内容。
+
+**要求**：
+1. 输出必须是有效的 JSON 格式，键名为 title, authors, affiliation, date, abstract, introduction, funding, conclusion。
+2. 如果某个元素缺失，返回空字符串 ""。
+3. 如果文本过长，仅处理提供的内容。
+4. 确保提取的文本干净，无多余的换行符或乱码。
+5. 如果元素内容超过500字符，截断并保留前500字符。
+6. 对于资助，确保提取完整的资助信息，包括基金名称和编号（如“National Science Foundation NSF-123456”）。
+7. 如果无法提取任何元素，返回空的 JSON 对象 {}。
+8. 用 ```json 标记 JSON 输出，例如：
+   ```json
+   {}
+   ```
+
+**示例**：
+输入文本：
+“Title: Advances in Deep Learning
+Authors: John Doe, Jane Smith
+Affiliation: MIT
+Date: May 2023
+Abstract: This paper explores...
+Introduction: In recent years...
+Acknowledgment: Supported by NSF-123456
+Conclusion: We find that...”
+
+输出：
+```json
+{
+  "title": "Advances in Deep Learning",
+  "authors": "John Doe, Jane Smith",
+  "affiliation": "MIT",
+  "date": "May 2023",
+  "abstract": "This paper explores...",
+  "introduction": "In recent years...",
+  "funding": "Supported by NSF-123456",
+  "conclusion": "We find that..."
+}
+```
+
+**输入文本**：
+""",
+))
+
+
+def _web_form_instructions(selector_attr: str) -> str:
+    return f"""Fill in and submit the paper form. All concrete values are listed in the DATA section at the end of this task.
+1. Go to the page given as FORM_URL in the DATA section.
+2. Fill the input field with {selector_attr} "title" with the TITLE value.
+3. Fill the input field with {selector_attr} "authors" with the AUTHORS value.
+4. Fill the input field with {selector_attr} "affiliation" with the AFFILIATION value.
+5. Fill the input field with {selector_attr} "date" with the DATE value.
+6. Fill the textarea with {selector_attr} "abstract" with the ABSTRACT value.
+7. Fill the textarea with {selector_attr} "introduction" with the INTRODUCTION value.
+8. Fill the textarea with {selector_attr} "funding" with the FUNDING value.
+9. Fill the textarea with {selector_attr} "conclusion" with the CONCLUSION value.
+10. Click the submit button (name "submit" or type "submit").
+11. After submission, wait for a message indicating success or failure. If a message containing "数据已保存" or "ID:" appears, return "提交成功" together with the page URL. Otherwise, return "提交失败" together with the page URL.
+Each DATA value is a JSON string literal: type its decoded text exactly, without the enclosing quotes (for example \\" stands for a double quote).
+
+DATA:
+"""
+
+
+WEB_FORM_TASK = register_prompt(PromptTemplate(name='web_form_task', instructions=_web_form_instructions('name')))
+WEB_FORM_TASK_BY_ID = register_prompt(PromptTemplate(name='web_form_task_by_id', instructions=_web_form_instructions('id')))
+
+
+def build_web_form_task(template: PromptTemplate, paper_info: dict, form_url: str) -> str:
+    """
+    把表单 URL 和字段值作为 DATA 段追加到固定指令之后。每个字段值编码为 JSON 字符串，
+    值中的双引号、反斜杠和换行都会被转义，不会破坏 DATA 段的结构；调用方传入原始文本即可。
+    """
+    lines = [f'FORM_URL: {form_url}']
+    lines += [f'{field.upper()}: {json.dumps(str(paper_info.get(field) or ""), ensure_ascii=False)}'
+              for field in PAPER_FIELDS]
+    return template.build_text('\n'.join(lines))
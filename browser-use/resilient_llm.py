@@ -0,0 +1,231 @@
+# 带超时、抖动重试、对冲请求 (hedged request) 和熔断器的 LLM 客户端包装，用于降低单次慢响应造成的尾延迟。
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开且调用方不愿等待时抛出。"""
+
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后打开，cooldown 秒内所有调用暂停等待；
+    冷却结束后进入半开状态，只放行一个试探请求，成功则关闭，失败则重新打开。
+    只依赖时间戳和 asyncio.sleep，可以被多个事件循环 / 线程共享。
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.open_count = 0
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    async def before_call(self, max_wait: float = None) -> bool:
+        """
+        熔断器打开时暂停调用方，直到可以发出请求；等待超过 max_wait 时抛出 CircuitOpenError。
+        返回本次调用是否为半开状态下的试探请求，调用结束后原样传给 record_success / record_failure。
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.state == 'closed':
+                    return False
+                remaining = self.opened_at + self.cooldown - time.monotonic()
+                if remaining <= 0 and not self._trial_in_flight:
+                    self.state = 'half_open'
+                    self._trial_in_flight = True
+                    return True
+            delay = max(remaining, 0.5)
+            if max_wait is not None and waited + delay > max_wait:
+                raise CircuitOpenError(f'LLM circuit breaker is {self.state}')
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def _open(self, reason: str):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.open_count += 1
+        print(f"{reason}，熔断器打开，暂停调用 {self.cooldown:.0f}s。")
+
+    def record_success(self, probe: bool = False):
+        """
+        只有试探请求的成功才会关闭打开 / 半开的熔断器；
+        熔断器打开之前就已发出、之后才返回的请求成功并不说明服务已经恢复。
+        """
+        with self._lock:
+            if probe:
+                self._trial_in_flight = False
+                self.state = 'closed'
+                self._consecutive_failures = 0
+            elif self.state == 'closed':
+                self._consecutive_failures = 0
+
+    def record_failure(self, probe: bool = False):
+        with self._lock:
+            if probe:
+                self._trial_in_flight = False
+                self._open('LLM 服务试探请求失败')
+            elif self.state == 'closed':
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= self.failure_threshold:
+                    self._open(f'LLM 服务连续失败 {self._consecutive_failures} 次')
+
+    def release_probe(self, probe: bool):
+        """试探请求被取消 (既未成功也未失败) 时归还试探名额，让下一个调用方继续试探。"""
+        if probe:
+            with self._lock:
+                self._trial_in_flight = False
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def unwrap_llm(llm):
+    """browser_use 的 Agent 需要原始的 LangChain 模型对象。"""
+    return getattr(llm, 'llm', llm)
+
+
+class ResilientLLM:
+    """
+    包装 LangChain 聊天模型 (如 ChatOpenAI)，提供与其相同的 ainvoke / invoke 接口：
+    - 每次调用有 timeout 截止时间；
+    - 失败后按指数退避 + 随机抖动重试；
+    - 请求在 p95 延迟内未返回时发出一个重复的对冲请求，取先返回的结果；
+    - 熔断器在服务异常时暂停整个流水线。
+    """
+
+    def __init__(self, llm, timeout: float = 120.0, max_retries: int = 3, backoff_base: float = 1.0,
+                 backoff_max: float = 20.0, hedge: bool = True, hedge_quantile: float = 0.95,
+                 min_hedge_delay: float = 2.0, default_hedge_delay: float = 30.0, min_samples: int = 20,
+                 breaker: CircuitBreaker = None, window: int = 500):
+        self.llm = llm
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=window)  # 每次调用对调用方的实际延迟
+        self._unhedged_latencies = deque(maxlen=window)  # 如果不对冲，首个请求的延迟
+        self._counters = {'calls': 0, 'retries': 0, 'timeouts': 0, 'hedges_sent': 0, 'hedge_wins': 0, 'failures': 0}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # 其他属性 (model_name 等) 透传给被包装的模型。copy / pickle 创建的实例在恢复 __dict__ 之前
+        # 就会查找属性，此时 self.llm 本身也不存在，直接报错以免无限递归
+        if name == 'llm':
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def hedge_delay(self) -> float:
+        """对冲延迟取近期延迟的 p95；样本不足时使用保守的默认值。"""
+        if len(self._latencies) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, _percentile(self._latencies, self.hedge_quantile))
+
+    async def _attempt(self, messages, **kwargs):
+        return await asyncio.wait_for(self.llm.ainvoke(messages, **kwargs), timeout=self.timeout)
+
+    async def _hedged_call(self, messages, **kwargs):
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._attempt(messages, **kwargs))
+        pending = {primary}
+        delay = self.hedge_delay()
+        if self.hedge:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self._counters['hedges_sent'] += 1
+                pending.add(asyncio.ensure_future(self._attempt(messages, **kwargs)))
+
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        elapsed = time.monotonic() - start
+                        self._latencies.append(elapsed)
+                        if task is primary:
+                            self._unhedged_latencies.append(elapsed)
+                        else:
+                            self._counters['hedge_wins'] += 1
+                            # 首个请求和其他未完成的请求一样被取消 (不为统计多付一次调用的 token)，
+                            # 不对冲时的延迟只知道下界：至少是已经等待的时间
+                            self._unhedged_latencies.append(max(elapsed, delay))
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, messages, **kwargs):
+        self._counters['calls'] += 1
+        for attempt in range(self.max_retries + 1):
+            probe = await self.breaker.before_call()
+            try:
+                result = await self._hedged_call(messages, **kwargs)
+                self.breaker.record_success(probe)
+                return result
+            except asyncio.CancelledError:
+                self.breaker.release_probe(probe)
+                raise
+            except Exception as e:
+                self.breaker.record_failure(probe)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._counters['timeouts'] += 1
+                if attempt == self.max_retries:
+                    self._counters['failures'] += 1
+                    raise
+                self._counters['retries'] += 1
+                # 全抖动 (full jitter) 指数退避，避免多个请求同时重试
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                print(f"LLM 调用失败 ({type(e).__name__}: {e})，{delay:.1f}s 后第 {attempt + 1} 次重试...")
+                await asyncio.sleep(delay)
+
+    def _background_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='resilient-llm-loop', daemon=True).start()
+            return self._loop
+
+    def invoke(self, messages, **kwargs):
+        """同步接口：在后台事件循环中执行 ainvoke，调用方即使处在另一个事件循环内也可以使用。"""
+        future = asyncio.run_coroutine_threadsafe(self.ainvoke(messages, **kwargs), self._background_loop())
+        return future.result()
+
+    def stats(self) -> dict:
+        """
+        调用统计；p99_saved 为对冲带来的 p99 改善（不对冲时的 p99 减去实际 p99）。
+        对冲胜出时首个请求被取消，其延迟按已等待的时间截断记录，因此 p99_without_hedging 和 p99_saved 是下界。
+        """
+        p99 = _percentile(self._latencies, 0.99)
+        unhedged_p99 = _percentile(self._unhedged_latencies, 0.99)
+        return {
+            **self._counters,
+            'breaker_state': self.breaker.state,
+            'breaker_opens': self.breaker.open_count,
+            'hedge_delay': round(self.hedge_delay(), 3),
+            'p50': round(_percentile(self._latencies, 0.5), 3),
+            'p99': round(p99, 3),
+            'p99_without_hedging': round(unhedged_p99, 3),
+            'p99_saved': round(max(unhedged_p99 - p99, 0.0), 3),
+        }
@@ -0,0 +1,267 @@
+# 追加写入的结果存储：后台线程把紧凑的 JSON 记录追加到按大小轮转的 JSONL 文件（可选 zstd 压缩），
+# 并在 SQLite 中维护按任务名和时间戳的小索引。取代"每次运行写一个缩进 JSON 文件"的做法。
+import atexit
+import contextlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd 压缩为可选功能
+    zstandard = None
+
+# --- 配置 ---
+RESULTS_DIR = os.path.join('saved', 'results')
+DEFAULT_PROJECTION = os.getenv('RESULT_PROJECTION', 'summary')  # full / summary / final
+DEFAULT_COMPRESSION = os.getenv('RESULT_COMPRESSION', '')  # 设置为 zstd 启用压缩
+MAX_FILE_BYTES = 64 * 1024 * 1024  # 单个 JSONL 文件达到该大小后轮转
+
+
+def _json_default(obj):
+    """json.dumps 遇到无法序列化的对象时调用：优先使用 pydantic 的 model_dump，否则转为字符串。"""
+    model_dump = getattr(obj, 'model_dump', None)
+    if callable(model_dump):
+        try:
+            return model_dump()
+        except Exception:
+            pass
+    return str(obj)
+
+
+def _call(obj, name, default=None):
+    """安全地调用 AgentHistoryList 上的统计方法，不同 browser_use 版本提供的方法不完全相同。"""
+    method = getattr(obj, name, None)
+    if not callable(method):
+        return default
+    try:
+        return method()
+    except Exception:
+        return default
+
+
+def _is_agent_history(obj) -> bool:
+    return callable(getattr(obj, 'final_result', None))
+
+
+def project_final(data):
+    """只保留最终结果。"""
+    if _is_agent_history(data):
+        return _call(data, 'final_result')
+    if isinstance(data, dict):
+        return {k: project_final(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [project_final(item) for item in data]
+    return data
+
+
+def project_summary(data):
+    """最终结果 + 摘要统计，不保存每一步的完整历史。"""
+    if _is_agent_history(data):
+        errors = _call(data, 'errors', []) or []
+        return {
+            'final_result': _call(data, 'final_result'),
+            'is_done': _call(data, 'is_done'),
+            'is_successful': _call(data, 'is_successful'),
+            'steps': _call(data, 'number_of_steps'),
+            'duration_seconds': _call(data, 'total_duration_seconds'),
+            'input_tokens': _call(data, 'total_input_tokens'),
+            'errors': [e for e in errors if e],
+            'urls': _call(data, 'urls'),
+        }
+    if isinstance(data, dict):
+        return {k: project_summary(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [project_summary(item) for item in data]
+    return data
+
+
+PROJECTIONS = {
+    'full': lambda data: data,
+    'summary': project_summary,
+    'final': project_final,
+}
+
+
+class ResultStore:
+    """
+    append() 只把记录放入内存队列即返回，序列化和磁盘写入都在后台线程完成。
+    索引表 records(record_id, task_name, ts, file, line_no) 用于按任务名 / 时间范围查找记录。
+    """
+
+    def __init__(self, directory: str = RESULTS_DIR, projection=DEFAULT_PROJECTION,
+                 compression: str = DEFAULT_COMPRESSION, max_file_bytes: int = MAX_FILE_BYTES,
+                 max_queue_size: int = 10000):
+        if compression not in ('', 'zstd'):
+            raise ValueError(f"Unsupported compression '{compression}'")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("RESULT_COMPRESSION=zstd requires the 'zstandard' package")
+        self.directory = directory
+        self.projection = PROJECTIONS[projection] if isinstance(projection, str) else projection
+        self.compression = compression
+        self.max_file_bytes = max_file_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.db')
+        with contextlib.closing(sqlite3.connect(self.index_path)) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS records (
+                    record_id TEXT PRIMARY KEY,
+                    task_name TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    file TEXT NOT NULL,
+                    line_no INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_records_task_ts ON records (task_name, ts)')
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._current_file = None
+        self._current_lines = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name='result-store-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def append(self, task_name: str, data) -> str:
+        """提交一条结果，返回记录 ID。投影在调用线程中完成，避免后台线程持有完整的历史对象。"""
+        if self._closed:
+            raise RuntimeError('ResultStore is closed')
+        record_id = uuid.uuid4().hex
+        record = {'id': record_id, 'task': task_name, 'ts': time.time(), 'data': self.projection(data)}
+        self._queue.put(record)
+        return record_id
+
+    def flush(self):
+        """阻塞直到队列中已提交的记录全部写入磁盘。"""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    # --- 后台写入 ---
+    def _new_file_path(self) -> str:
+        suffix = '.jsonl.zst' if self.compression == 'zstd' else '.jsonl'
+        name = f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{suffix}"
+        return os.path.join(self.directory, name)
+
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.index_path)
+        compressor = zstandard.ZstdCompressor() if self.compression == 'zstd' else None
+        try:
+            while True:
+                batch = [self._queue.get()]
+                # 一次取走队列中已有的全部记录，合并成一次写入
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                records = [r for r in batch if r is not None]
+                try:
+                    if records:
+                        self._write_batch(conn, compressor, records)
+                except Exception as e:
+                    print(f"ResultStore: failed to write {len(records)} record(s): {e}")
+                    conn.rollback()
+                    # 失败的批次可能已有部分内容写入文件 (甚至半条记录 / 半个 zstd 帧)，
+                    # 之后的记录改写到新文件，保证索引中的行号与文件内容一致
+                    self._current_file = None
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, compressor, records: list):
+        if self._current_file is None or (
+                os.path.exists(self._current_file) and os.path.getsize(self._current_file) >= self.max_file_bytes):
+            self._current_file = self._new_file_path()
+            self._current_lines = 0
+
+        lines = [json.dumps(r, ensure_ascii=False, separators=(',', ':'), default=_json_default) for r in records]
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        if compressor is not None:
+            payload = compressor.compress(payload)  # 每批一个独立的 zstd 帧，连续追加的帧可以整体解压
+        with open(self._current_file, 'ab') as f:
+            f.write(payload)
+
+        file_name = os.path.basename(self._current_file)
+        conn.executemany(
+            'INSERT INTO records (record_id, task_name, ts, file, line_no) VALUES (?, ?, ?, ?, ?)',
+            [(r['id'], r['task'], r['ts'], file_name, self._current_lines + i) for i, r in enumerate(records)]
+        )
+        conn.commit()
+        self._current_lines += len(records)
+
+    # --- 查询 ---
+    def query(self, task_name: str = None, since: float = None, until: float = None, limit: int = None) -> list:
+        """按任务名和时间范围查询索引，返回 (record_id, task_name, ts, file, line_no) 列表，按时间倒序。"""
+        clauses, params = [], []
+        if task_name is not None:
+            clauses.append('task_name = ?')
+            params.append(task_name)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('ts < ?')
+            params.append(until)
+        sql = 'SELECT record_id, task_name, ts, file, line_no FROM records'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ts DESC'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with contextlib.closing(sqlite3.connect(self.index_path)) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _read_lines(self, file_name: str) -> list:
+        path = os.path.join(self.directory, file_name)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if file_name.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError(f"Reading '{file_name}' requires the 'zstandard' package")
+            with zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True) as reader:
+                raw = reader.read()
+        # 只按 '\n' 切分：str.splitlines() 还会在 U+2028、U+2029、\x85、\x0b、\x0c 处断行，
+        # 而 ensure_ascii=False 的 JSON 会原样写出这些字符，导致之后的行号全部错位
+        lines = raw.decode('utf-8').split('\n')
+        if lines and lines[-1] == '':
+            lines.pop()
+        return lines
+
+    def load(self, task_name: str = None, since: float = None, until: float = None, limit: int = None) -> list:
+        """按索引读取完整记录。"""
+        entries = self.query(task_name, since, until, limit)
+        cache, records = {}, []
+        for _, _, _, file_name, line_no in entries:
+            if file_name not in cache:
+                cache[file_name] = self._read_lines(file_name)
+            records.append(json.loads(cache[file_name][line_no]))
+        return records
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> ResultStore:
+    """进程内共享的默认结果存储，首次使用时创建。"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultStore()
+        return _default_store
@@ -1,7 +1,9 @@
 # https://grok.com/chat/7c6c7c4c-9e17-43a1-916e-cc5aee4c9cfd
 import sqlite3
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from datetime import datetime
+from profiling import profile_stage
+from tracing import traced, tracer
 
 app = Flask(__name__)
 
@@ -26,6 +28,8 @@ def init_db():
         conn.commit()
 
 # 插入数据
+@traced('insert_paper')
+@profile_stage('db_insert')
 def insert_paper(data):
     with sqlite3.connect('papers.db') as conn:
         cursor = conn.cursor()
@@ -61,6 +65,11 @@ def submit_form():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Prometheus 格式的指标 (insert_paper 的耗时和结果)
+@app.route('/metrics')
+def metrics():
+    return Response(tracer.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     init_db()
     app.run(host='0.0.0.0', port=8848, debug=True)
\ No newline at end of file
@@ -0,0 +1,123 @@
+# 多进程分片运行器：按文件名哈希把 PDF 分到 N 个工作进程，
+# 每个进程有独立的事件循环、LLM 客户端和浏览器，通过本地 SQLite 工作队列 (带租约) 协调，结果由主进程统一汇总。
+import asyncio, json, multiprocessing, os, time
+from work_queue import WorkQueue
+
+# --- 配置 ---
+QUEUE_DB_PATH = os.path.join('saved', 'work_queue.db')
+NUM_WORKERS = os.cpu_count() or 1  # 工作进程数
+PER_WORKER_CONCURRENCY = 2  # 每个进程内同时运行的智能体数量
+LEASE_SECONDS = 600  # 租约时长，进程崩溃后超过该时间任务会被其他进程接管
+
+
+async def _renew_lease(queue: WorkQueue, pdf_path: str, worker_id: str):
+    """处理期间定期续租，防止长任务被其他进程误接管。"""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not queue.renew(pdf_path, worker_id):
+            print(f"[{worker_id}] 警告: '{os.path.basename(pdf_path)}' 的租约已失效。")
+            return
+
+
+async def _worker_slot(queue: WorkQueue, worker_id: str, shard: int, llm_model, browser):
+    """单个并发槽：先处理本分片，本分片空了再帮其他分片处理剩余任务。"""
+    from papers2web_form_asyncio_gather import TARGET_WEB_FORM_URL, process_single_pdf
+
+    while True:
+        pdf_path = queue.claim(worker_id, shard) or queue.claim(worker_id)
+        if pdf_path is None:
+            return
+        renew_task = asyncio.create_task(_renew_lease(queue, pdf_path, worker_id))
+        try:
+            result = await process_single_pdf(pdf_path, llm_model, TARGET_WEB_FORM_URL, browser=browser)
+            queue.complete(pdf_path, worker_id, result, success=result.get('success', False))
+        except Exception as e:
+            print(f"[{worker_id}] 处理 '{os.path.basename(pdf_path)}' 时发生错误: {e}")
+            queue.complete(pdf_path, worker_id, {'pdf_path': pdf_path, 'error': str(e)}, success=False)
+        finally:
+            renew_task.cancel()
+
+
+async def _worker_loop(worker_id: str, shard: int, queue_path: str, concurrency: int):
+    # 在子进程内导入重量级依赖，每个进程各自持有 LLM 客户端和浏览器
+    from browser_use import Browser, BrowserConfig
+    from papers2web_form_asyncio_gather import create_llm
+    from tracing import finish_run
+    from profiling import write_profiles
+
+    queue = WorkQueue(queue_path, lease_seconds=LEASE_SECONDS)
+    llm_model = create_llm('deepseek-chat')
+    browser = Browser(config=BrowserConfig(headless=True))
+    try:
+        await asyncio.gather(*[
+            _worker_slot(queue, f"{worker_id}-{i}", shard, llm_model, browser) for i in range(concurrency)
+        ])
+    finally:
+        await browser.close()
+        print(f"[{worker_id}] LLM 调用统计: {json.dumps(llm_model.stats(), ensure_ascii=False)}")
+        finish_run(worker_id)
+        write_profiles()  # multiprocessing 子进程退出时不执行 atexit，需要显式写出
+
+
+def _worker_main(worker_index: int, num_workers: int, queue_path: str, concurrency: int):
+    """子进程入口：分片号即进程序号。"""
+    worker_id = f"worker-{worker_index}"
+    asyncio.run(_worker_loop(worker_id, worker_index % num_workers, queue_path, concurrency))
+
+
+def run_sharded(directory: str = None, num_workers: int = NUM_WORKERS,
+                per_worker_concurrency: int = PER_WORKER_CONCURRENCY, queue_path: str = QUEUE_DB_PATH) -> list:
+    """
+    将目录中的 PDF 写入工作队列，启动 num_workers 个进程处理，返回汇总结果。
+    队列文件会保留，重新运行时已完成的 PDF 不会重复处理，未完成的会继续。
+    """
+    from papers2web_form_asyncio_gather import STORAGE_DIR, check_config
+
+    check_config()  # 在启动工作进程之前发现配置错误
+    if directory is None:
+        directory = STORAGE_DIR
+
+    pdf_files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.pdf')]
+    if not pdf_files:
+        print(f"在 '{directory}' 中没有找到 PDF 文件。请将你的 PDF 文件放在该目录中。")
+        return []
+
+    queue = WorkQueue(queue_path, lease_seconds=LEASE_SECONDS)
+    added = queue.enqueue(pdf_files, num_workers)
+    print(f"工作队列新增 {added} 个 PDF，当前状态: {queue.counts()}")
+
+    start = time.perf_counter()
+    # spawn：子进程不继承父进程的事件循环、浏览器等状态
+    ctx = multiprocessing.get_context('spawn')
+    processes = [
+        ctx.Process(target=_worker_main, args=(i, num_workers, queue_path, per_worker_concurrency), daemon=False)
+        for i in range(num_workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    results = queue.results()
+    succeeded = sum(1 for r in results if r['status'] == 'done')
+    failed = sum(1 for r in results if r['status'] == 'failed')
+    # 所有工作进程都已退出，仍为 pending / leased 的任务不会再有人处理
+    stuck = [r for r in results if r['status'] not in ('done', 'failed')]
+    print(f"\n所有工作进程已退出，耗时 {elapsed:.1f}s。队列状态: {queue.counts()}")
+    escalated = sum(1 for r in results if (r['result'] or {}).get('escalation_reason'))
+    print(f"成功 {succeeded} 个，失败 {failed} 个，未完成 {len(stuck)} 个，其中 {escalated} 个触发了视觉升级。")
+    for r in results:
+        if r['status'] == 'failed':
+            print(f"  失败: {os.path.basename(r['pdf_path'])} (尝试 {r['attempts']} 次): {json.dumps(r['result'], ensure_ascii=False)}")
+        elif r['status'] != 'done':
+            print(f"  未完成: {os.path.basename(r['pdf_path'])} (状态 {r['status']}，尝试 {r['attempts']} 次)，"
+                  f"下次运行时会继续处理。")
+    return results
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    print("请确保你的 Flask 服务器已经运行 (python server.py)。")
+    print(f"使用 {NUM_WORKERS} 个工作进程，每个进程并发 {PER_WORKER_CONCURRENCY} 个智能体...")
+    run_sharded()
@@ -0,0 +1,236 @@
+# 本地 OpenAI 兼容的 LLM 桩服务，用于离线压测：不消耗 DeepSeek 额度，也不依赖网络。
+# 支持可配置的延迟分布、输出速率 (tokens/s) 和错误注入。
+#   - 普通对话请求 (论文信息提取)：返回从文本中"提取"的 JSON；
+#   - 带 tools / response_format 的请求 (browser_use 智能体)：按脚本返回 打开表单 -> 填写提交 -> done 的动作。
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+
+
+def parse_latency(spec: str):
+    """
+    延迟分布：fixed:0.5 / uniform:0.2,1.5 / lognormal:mu,sigma (秒，mu 和 sigma 为对数空间参数) / exp:mean。
+    返回一个无参函数，每次调用采样一次延迟。
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',')] if args else []
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(values[0], values[1])
+    if kind == 'exp':
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+def _message_text(message: dict) -> str:
+    content = message.get('content') or ''
+    if isinstance(content, list):  # 多模态消息：只取文本部分
+        return '\n'.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content
+
+
+def _extraction_answer(text: str) -> str:
+    """论文信息提取：从合成 PDF 的 "Key: value" 行中取值，模拟 LLM 的 JSON 输出。"""
+    fields = {}
+    for key in ['title', 'authors', 'affiliation', 'date', 'abstract', 'introduction', 'funding', 'conclusion']:
+        # 取最后一次出现：提示词里的示例在前，论文文本在最后
+        matches = re.findall(rf'^{key.capitalize()}:[ \t]*(.+)$', text, flags=re.MULTILINE)
+        fields[key] = matches[-1].strip()[:500] if matches else 'N/A'
+    return '```json\n' + json.dumps(fields, ensure_ascii=False, indent=2) + '\n```'
+
+
+def _find_element_indices(state_text: str) -> dict:
+    """从 browser_use 提供的可交互元素列表中找出表单字段和提交按钮的索引，例如 [3]<input name="title" ...>。"""
+    indices = {}
+    for match in re.finditer(r'\[(\d+)\]<(input|textarea|button)([^>]*)>', state_text):
+        index, tag, attrs = int(match.group(1)), match.group(2), match.group(3)
+        name = re.search(r'''(?:name|id)=['"]?(\w+)''', attrs)
+        if tag == 'button':
+            indices.setdefault('submit', index)
+        elif name:
+            indices.setdefault(name.group(1), index)
+    return indices
+
+
+def _agent_actions(messages: list) -> list:
+    """根据最新的页面状态返回脚本化的智能体动作：打开表单 -> 填写并提交 -> 返回结果。"""
+    task_text = '\n'.join(_message_text(m) for m in messages if m.get('role') in ('user', 'system'))
+    state_text = _message_text(messages[-1]) if messages else ''
+    steps_taken = sum(1 for m in messages if m.get('role') == 'assistant')
+
+    if '数据已保存' in state_text:
+        return [{'done': {'text': '提交成功', 'success': True}}]
+    indices = _find_element_indices(state_text)
+    if 'title' in indices and 'submit' in indices and '提交失败' not in state_text:
+        data = dict(re.findall(r'^([A-Z]+): "(.*)"$', task_text, flags=re.MULTILINE))
+        actions = [
+            {'input_text': {'index': indices[field.lower()], 'text': value}}
+            for field, value in data.items() if field.lower() in indices
+        ]
+        return actions + [{'click_element': {'index': indices['submit']}}]
+    url = re.search(r'FORM_URL:\s*(\S+)', task_text)
+    if url and steps_taken < 4:
+        return [{'go_to_url': {'url': url.group(1)}}]
+    return [{'done': {'text': '提交失败', 'success': False}}]
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """二分查找最长公共前缀长度（切片比较在 C 层完成，比逐字符循环快得多）。"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class StubState:
+    """服务端共享的配置和计数。"""
+
+    def __init__(self, latency, tokens_per_second: float, error_rate: float, cache_block_tokens: int = 64):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.cache_block_tokens = cache_block_tokens
+        self.lock = threading.Lock()
+        self.prefixes = []  # 最近的提示词，用于模拟前缀缓存命中
+        self.counters = {'requests': 0, 'errors_injected': 0}
+
+    def cache_hit_tokens(self, prompt: str) -> int:
+        """模拟前缀缓存：与最近请求的最长公共前缀，按 cache_block_tokens 向下取整。"""
+        best = 0
+        with self.lock:
+            for previous in self.prefixes:
+                best = max(best, _common_prefix_length(previous, prompt))
+            self.prefixes = (self.prefixes + [prompt])[-32:]
+        block = self.cache_block_tokens
+        return (best // CHARS_PER_TOKEN) // block * block
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: StubState = None
+
+    def log_message(self, format, *args):  # 压测时不刷屏
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'deepseek-chat', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        state = self.state
+        with state.lock:
+            state.counters['requests'] += 1
+
+        delay = state.latency()
+        if random.random() < state.error_rate:
+            with state.lock:
+                state.counters['errors_injected'] += 1
+            time.sleep(delay)
+            status = random.choice([429, 500, 503])
+            self._send_json(status, {'error': {'message': f'injected error {status}', 'type': 'server_error'}})
+            return
+
+        messages = request.get('messages', [])
+        prompt = '\n'.join(_message_text(m) for m in messages)
+        message = {'role': 'assistant', 'content': None}
+        tools = request.get('tools') or []
+        if tools:
+            arguments = {'current_state': {'evaluation_previous_goal': 'Unknown', 'memory': '', 'next_goal': ''},
+                         'action': _agent_actions(messages)}
+            message['tool_calls'] = [{
+                'id': f'call_{uuid.uuid4().hex[:12]}', 'type': 'function',
+                'function': {'name': tools[0]['function']['name'], 'arguments': json.dumps(arguments, ensure_ascii=False)},
+            }]
+            completion_text = message['tool_calls'][0]['function']['arguments']
+        elif request.get('response_format'):
+            message['content'] = json.dumps({
+                'current_state': {'evaluation_previous_goal': 'Unknown', 'memory': '', 'next_goal': ''},
+                'action': _agent_actions(messages),
+            }, ensure_ascii=False)
+            completion_text = message['content']
+        else:
+            message['content'] = _extraction_answer(prompt)
+            completion_text = message['content']
+
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + 1
+        completion_tokens = len(completion_text) // CHARS_PER_TOKEN + 1
+        if state.tokens_per_second > 0:
+            delay += completion_tokens / state.tokens_per_second
+        time.sleep(delay)
+
+        hit_tokens = min(state.cache_hit_tokens(prompt), prompt_tokens)
+        self._send_json(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'deepseek-chat'),
+            'choices': [{'index': 0, 'message': message,
+                         'finish_reason': 'tool_calls' if tools else 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_cache_hit_tokens': hit_tokens,
+                'prompt_cache_miss_tokens': prompt_tokens - hit_tokens,
+            },
+        })
+
+
+def create_server(host: str = '127.0.0.1', port: int = 0, latency: str = 'lognormal:-0.5,0.6',
+                  tokens_per_second: float = 0.0, error_rate: float = 0.0, seed: int = None) -> ThreadingHTTPServer:
+    """创建 (但不启动) 桩服务；port=0 时由系统分配端口，见 server.server_address。"""
+    if seed is not None:
+        random.seed(seed)
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'state': StubState(parse_latency(latency), tokens_per_second, error_rate)
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OpenAI-compatible stub LLM server for offline benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18000)
+    parser.add_argument('--latency', default='lognormal:-0.5,0.6',
+                        help='fixed:S | uniform:A,B | lognormal:MU,SIGMA | exp:MEAN (seconds)')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='0 disables output-rate delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 429/5xx')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.latency, args.tokens_per_second, args.error_rate, args.seed)
+    print(f"Stub LLM server listening on http://{args.host}:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
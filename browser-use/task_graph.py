@@ -0,0 +1,103 @@
+# 任务图执行器：按依赖关系并发执行多个浏览器任务，互不依赖的任务同时运行，结果按完成顺序收集。
+import asyncio
+import time
+
+
+def validate_task_graph(tasks: dict, dependencies: dict) -> None:
+    """检查依赖是否指向已知任务、是否存在环；有问题时抛出 ValueError。"""
+    for name, deps in dependencies.items():
+        if name not in tasks:
+            raise ValueError(f"Dependencies declared for unknown task '{name}'")
+        for dep in deps:
+            if dep not in tasks:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dep}'")
+
+    # Kahn 拓扑排序，剩余节点即构成环
+    indegree = {name: len(dependencies.get(name, ())) for name in tasks}
+    dependents = {name: [] for name in tasks}
+    for name, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(name)
+    ready = [name for name, degree in indegree.items() if degree == 0]
+    visited = 0
+    while ready:
+        name = ready.pop()
+        visited += 1
+        for child in dependents[name]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    if visited != len(tasks):
+        cyclic = sorted(name for name, degree in indegree.items() if degree > 0)
+        raise ValueError(f"Task dependencies contain a cycle: {cyclic}")
+
+
+def format_dependency_context(dep_results: dict) -> str:
+    """把前置任务的最终结果整理成一段文字，附加到依赖它们的任务描述后面。"""
+    if not dep_results:
+        return ''
+    lines = ['\nResults from prerequisite tasks:']
+    for name, result in dep_results.items():
+        final_result = getattr(result, 'final_result', None)
+        lines.append(f"- {name}: {final_result() if callable(final_result) else result}")
+    return '\n'.join(lines)
+
+
+async def run_task_graph(tasks: dict, run_task, dependencies: dict = None, max_parallel: int = 4,
+                         task_timeout: float = None, on_result=None) -> dict:
+    """
+    并发执行任务图。
+
+    Args:
+        tasks (dict): 任务名 -> 任务描述。
+        run_task: 协程函数 run_task(task_name, task_description, dep_results)，dep_results 为前置任务名 -> 结果。
+        dependencies (dict): 任务名 -> 前置任务名列表，未声明的任务没有依赖。
+        max_parallel (int): 同时运行的任务数上限。
+        task_timeout (float): 单个任务的超时秒数，None 表示不限时。
+        on_result: 可选回调 on_result(task_name, outcome)，每个任务结束（含失败、超时、跳过）时立即调用。
+
+    Returns:
+        dict: 任务名 -> {'status': 'ok'|'failed'|'timeout'|'skipped', 'result', 'error', 'duration'}。
+    """
+    dependencies = {name: list(deps) for name, deps in (dependencies or {}).items()}
+    validate_task_graph(tasks, dependencies)
+
+    semaphore = asyncio.Semaphore(max_parallel)
+    outcomes = {}
+    remaining = {name: set(dependencies.get(name, ())) for name in tasks}
+
+    async def run_one(name):
+        dep_results = {dep: outcomes[dep]['result'] for dep in dependencies.get(name, ())}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(run_task(name, tasks[name], dep_results), timeout=task_timeout)
+                return {'status': 'ok', 'result': result, 'error': None, 'duration': time.perf_counter() - start}
+            except asyncio.TimeoutError:
+                return {'status': 'timeout', 'result': None, 'error': f'timed out after {task_timeout}s',
+                        'duration': time.perf_counter() - start}
+            except Exception as e:
+                return {'status': 'failed', 'result': None, 'error': str(e), 'duration': time.perf_counter() - start}
+
+    def finish(name, outcome):
+        outcomes[name] = outcome
+        if on_result is not None:
+            on_result(name, outcome)
+
+    running = {}  # asyncio.Task -> 任务名
+    while remaining or running:
+        # 启动所有依赖已满足的任务；依赖失败的任务直接标记为跳过
+        for name in [n for n, deps in remaining.items() if not deps - outcomes.keys()]:
+            deps = remaining.pop(name)
+            failed_deps = [dep for dep in deps if outcomes[dep]['status'] != 'ok']
+            if failed_deps:
+                finish(name, {'status': 'skipped', 'result': None, 'duration': 0.0,
+                              'error': f'prerequisite task(s) did not succeed: {failed_deps}'})
+            else:
+                running[asyncio.create_task(run_one(name))] = name
+        if not running:
+            continue  # 刚被跳过的任务可能解锁了后续任务的判定
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            finish(running.pop(task), task.result())
+    return outcomes
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# browser-use 下的脚本以同目录模块的方式互相导入 (例如 from work_queue import WorkQueue)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
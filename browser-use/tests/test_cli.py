@@ -0,0 +1,27 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import cli
+
+
+def test_cached_extract_does_not_import_extractor(tmp_path, monkeypatch):
+    pdf = tmp_path / 'a.pdf'
+    pdf.write_bytes(b'%PDF-1.4')
+    cache_path = tmp_path / 'extracted.json'
+    cache_path.write_text(json.dumps({
+        os.path.abspath(pdf): {'signature': cli._file_signature(str(pdf)), 'info': {'title': 'cached'}},
+    }), encoding='utf-8')
+    monkeypatch.setattr(cli, 'STORAGE_DIR', str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'papers2web_form_asyncio_gather', raising=False)
+
+    args = SimpleNamespace(pdfs=[], cache=str(cache_path), force=False, concurrency=1)
+    assert cli.cmd_extract(args) == 0
+    assert 'papers2web_form_asyncio_gather' not in sys.modules
+
+
+def test_extract_with_missing_storage_dir_is_a_no_op(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, 'STORAGE_DIR', str(tmp_path / 'missing'))
+    args = SimpleNamespace(pdfs=[], cache=str(tmp_path / 'extracted.json'), force=False, concurrency=1)
+    assert cli.cmd_extract(args) == 0
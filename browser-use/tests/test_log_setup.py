@@ -0,0 +1,96 @@
+import json
+import logging
+import queue
+
+import pytest
+
+import log_setup
+from log_setup import JsonFormatter, PayloadPolicy, _PolicyQueueHandler, truncate
+
+
+def make_record(msg='hello', level=logging.INFO, args=None, **extra):
+    record = logging.LogRecord('agent', level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    level = root.level
+    yield root
+    log_setup.shutdown_logging()
+    root.setLevel(level)
+
+
+def test_truncate_reports_removed_chars():
+    assert truncate('abc', 5) == 'abc'
+    assert truncate('abcdefgh', 3) == 'abc...(+5 chars)'
+
+
+def test_policy_truncates_message_after_formatting():
+    record = make_record('value=%s', args=('x' * 20,))
+    PayloadPolicy(max_chars=10).apply(record)
+    assert record.msg == 'value=xxxx...(+16 chars)' and record.args is None
+    assert not hasattr(record, 'payload')
+
+
+def test_policy_samples_low_level_payloads():
+    dropped = make_record(payload={'raw': 'y' * 50})
+    PayloadPolicy(max_chars=20, sample_rate=0.0).apply(dropped)
+    assert dropped.payload == {'sampled_out': True, 'chars': len(json.dumps({'raw': 'y' * 50}))}
+
+    kept = make_record(payload='z' * 30)
+    PayloadPolicy(max_chars=20, sample_rate=1.0).apply(kept)
+    assert kept.payload == 'z' * 20 + '...(+10 chars)'
+
+    # WARNING 及以上总是保留负载 (仍然截断)
+    warning = make_record(level=logging.WARNING, payload={'raw': '中' * 5})
+    PayloadPolicy(max_chars=100, sample_rate=0.0).apply(warning)
+    assert warning.payload == '{"raw": "中中中中中"}'
+
+
+def test_json_formatter_includes_extra_fields_and_exception():
+    record = make_record('done', step=3, payload={'a': 1}, _private='hidden')
+    record.exc_text = 'Traceback: boom'
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['level'] == 'INFO' and entry['logger'] == 'agent' and entry['message'] == 'done'
+    assert entry['step'] == 3 and entry['payload'] == {'a': 1}
+    assert entry['exception'] == 'Traceback: boom'
+    assert '_private' not in entry and 'args' not in entry and entry['ts'].endswith('+00:00')
+
+
+def test_queue_handler_drops_records_when_full():
+    handler = _PolicyQueueHandler(queue.Queue(maxsize=1), PayloadPolicy())
+    handler.handle(make_record('first'))
+    handler.handle(make_record('second'))
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == 'first'
+
+
+def test_setup_writes_json_lines_and_shutdown_flushes(tmp_path, root_logger):
+    log_file = tmp_path / 'logs' / 'agent.jsonl'
+    root = log_setup.setup_logging(str(log_file), level='INFO', console=False,
+                                   policy=PayloadPolicy(max_chars=50, sample_rate=1.0))
+    handlers = list(root.handlers)
+    assert log_setup.setup_logging(str(tmp_path / 'other.jsonl'), console=False) is root
+    assert root.handlers == handlers  # 重复调用不再添加处理器
+
+    logger = logging.getLogger('agent.test')
+    logger.info('filled %s', 'title', extra={'payload': {'field': 'title'}, 'step': 1})
+    logger.debug('below level')
+    try:
+        raise RuntimeError('boom')
+    except RuntimeError:
+        logger.exception('failed')
+    log_setup.shutdown_logging()
+
+    entries = [json.loads(line) for line in log_file.read_text(encoding='utf-8').splitlines()]
+    assert [entry['message'] for entry in entries] == ['filled title', 'failed']
+    assert entries[0]['payload'] == '{"field": "title"}' and entries[0]['step'] == 1
+    assert 'RuntimeError: boom' in entries[1]['exception']
+    assert log_setup._queue_handler not in root.handlers
+    assert not (tmp_path / 'other.jsonl').exists()
+
+    log_setup.shutdown_logging()  # 重复关闭无副作用
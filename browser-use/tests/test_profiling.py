@@ -0,0 +1,16 @@
+import pytest
+
+import profiling
+
+
+@pytest.mark.parametrize('rate', [0, -5, float('nan'), float('inf')])
+def test_invalid_sample_rate_is_rejected(rate):
+    before = profiling._config['rate']
+    with pytest.raises(ValueError, match='sample rate'):
+        profiling.configure(rate=rate)
+    assert profiling._config['rate'] == before
+
+
+def test_unknown_stage_is_rejected():
+    with pytest.raises(ValueError, match='Unknown profiling stages'):
+        profiling.configure(stages='not_a_stage')
@@ -0,0 +1,104 @@
+import asyncio
+import copy
+
+import pytest
+
+from resilient_llm import CircuitBreaker, CircuitOpenError, ResilientLLM
+
+
+class EchoLLM:
+    model_name = 'echo'
+
+    def __init__(self, failures=0):
+        self.failures = failures
+
+    async def ainvoke(self, messages, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('down')
+        return f'echo: {messages}'
+
+
+def test_getattr_delegates_and_survives_copy():
+    llm = ResilientLLM(EchoLLM(), hedge=False)
+    assert llm.model_name == 'echo'
+    clone = copy.copy(llm)
+    assert clone.model_name == 'echo'
+    with pytest.raises(AttributeError):
+        ResilientLLM.__new__(ResilientLLM).model_name
+
+
+def test_breaker_opens_after_threshold_and_ignores_stale_success():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    breaker.record_success()  # 打开前已发出的请求迟到的成功
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.before_call(max_wait=0))
+
+
+def test_only_probe_result_closes_or_reopens_half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert asyncio.run(breaker.before_call()) is True
+    assert breaker.state == 'half_open'
+    breaker.record_failure()  # 非试探请求的失败不重新打开
+    breaker.record_success()  # 非试探请求的成功不关闭
+    assert breaker.state == 'half_open'
+    breaker.record_success(probe=True)
+    assert breaker.state == 'closed'
+    assert asyncio.run(breaker.before_call()) is False
+
+
+def test_cancelled_probe_releases_trial():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    probe = asyncio.run(breaker.before_call())
+    breaker.release_probe(probe)
+    assert asyncio.run(breaker.before_call(max_wait=0)) is True
+
+
+def test_ainvoke_retries_then_succeeds():
+    llm = ResilientLLM(EchoLLM(failures=2), hedge=False, backoff_base=0.001, max_retries=3,
+                       breaker=CircuitBreaker(failure_threshold=10))
+    assert asyncio.run(llm.ainvoke('hi')) == 'echo: hi'
+    stats = llm.stats()
+    assert stats['retries'] == 2 and stats['failures'] == 0 and stats['breaker_state'] == 'closed'
+
+
+class SlowFirstLLM:
+    """第一次调用很慢，之后立即返回；记录被取消的调用。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return 'slow'
+        return 'fast'
+
+
+def test_hedge_win_cancels_primary_and_records_censored_latency():
+    inner = SlowFirstLLM()
+    llm = ResilientLLM(inner, default_hedge_delay=0.05, min_hedge_delay=0.05, timeout=30)
+
+    async def main():
+        result = await llm.ainvoke('hi')
+        await asyncio.sleep(0)  # 让被取消的请求处理 CancelledError
+        return result
+
+    assert asyncio.run(main()) == 'fast'
+    assert inner.calls == 2 and inner.cancelled == 1
+    stats = llm.stats()
+    assert stats['hedges_sent'] == 1 and stats['hedge_wins'] == 1
+    assert 0.05 <= stats['p99_without_hedging'] < 1
@@ -0,0 +1,75 @@
+import json
+import os
+
+from result_store import ResultStore, project_final, project_summary
+
+
+class FakeHistory:
+    def final_result(self):
+        return 'done'
+
+    def is_done(self):
+        return True
+
+    def errors(self):
+        return [None, 'timeout']
+
+
+def make_store(tmp_path, **kwargs):
+    store = ResultStore(str(tmp_path / 'results'), projection='full', **kwargs)
+    return store
+
+
+def test_append_and_load_in_index_order(tmp_path):
+    store = make_store(tmp_path)
+    store.append('task_a', {'n': 1})
+    store.append('task_b', {'n': 2})
+    store.append('task_a', {'n': 3})
+    store.flush()
+    assert sorted(r['data']['n'] for r in store.load('task_a')) == [1, 3]
+    assert [r['data']['n'] for r in store.load(limit=1)] == [3]
+    store.close()
+
+
+def test_line_separator_characters_do_not_shift_records(tmp_path):
+    store = make_store(tmp_path)
+    tricky = 'a b c\x85d\x0be\x0cf'
+    store.append('task', {'text': tricky})
+    store.append('task', {'text': 'after'})
+    store.flush()
+    texts = sorted(r['data']['text'] for r in store.load('task'))
+    assert texts == sorted([tricky, 'after'])
+    store.close()
+
+
+def test_failed_batch_does_not_misalign_later_records(tmp_path):
+    store = make_store(tmp_path)
+    duplicate = {'id': 'dup', 'task': 'task', 'ts': 1.0, 'data': 'first'}
+    store._queue.put(duplicate)
+    store.flush()
+    # 同一 record_id 再次写入：JSONL 行已追加，但索引插入失败
+    store._queue.put(dict(duplicate, data='second'))
+    store.flush()
+    store.append('task', 'third')
+    store.flush()
+    assert sorted(r['data'] for r in store.load('task')) == ['first', 'third']
+    assert len([f for f in os.listdir(store.directory) if f.endswith('.jsonl')]) == 2
+    store.close()
+
+
+def test_file_rotation(tmp_path):
+    store = make_store(tmp_path, max_file_bytes=1)
+    for i in range(3):
+        store.append('task', i)
+        store.flush()
+    assert len([f for f in os.listdir(store.directory) if f.endswith('.jsonl')]) == 3
+    assert sorted(r['data'] for r in store.load('task')) == [0, 1, 2]
+    store.close()
+
+
+def test_projections():
+    data = {'run': FakeHistory(), 'items': [FakeHistory()]}
+    assert project_final(data) == {'run': 'done', 'items': ['done']}
+    summary = project_summary(data)['run']
+    assert summary['final_result'] == 'done' and summary['errors'] == ['timeout']
+    assert json.dumps(summary)
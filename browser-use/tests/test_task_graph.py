@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from task_graph import format_dependency_context, run_task_graph, validate_task_graph
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_validate_rejects_unknown_tasks_and_cycles():
+    tasks = {'a': '', 'b': '', 'c': ''}
+    with pytest.raises(ValueError, match='unknown task'):
+        validate_task_graph(tasks, {'a': ['x']})
+    with pytest.raises(ValueError, match='unknown task'):
+        validate_task_graph(tasks, {'x': ['a']})
+    with pytest.raises(ValueError, match="cycle: \\['a', 'b'\\]"):
+        validate_task_graph(tasks, {'a': ['b'], 'b': ['a']})
+    validate_task_graph(tasks, {'c': ['a', 'b']})
+
+
+def test_dependencies_run_first_and_receive_results():
+    order = []
+
+    async def run_task(name, description, dep_results):
+        order.append(name)
+        await asyncio.sleep(0.01)
+        return f'{name}<{",".join(sorted(dep_results.values()))}>'
+
+    outcomes = run(run_task_graph({'a': '', 'b': '', 'c': ''}, run_task, {'c': ['a', 'b']}))
+    assert order.index('c') == 2
+    assert outcomes['c']['result'] == 'c<a<>,b<>>'
+    assert all(outcome['status'] == 'ok' for outcome in outcomes.values())
+
+
+def test_independent_tasks_run_concurrently_up_to_max_parallel():
+    active, peak = 0, 0
+
+    async def run_task(name, description, dep_results):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    run(run_task_graph({str(i): '' for i in range(6)}, run_task, max_parallel=3))
+    assert peak == 3
+
+
+def test_failure_and_timeout_skip_dependents_transitively():
+    async def run_task(name, description, dep_results):
+        if name == 'bad':
+            raise RuntimeError('boom')
+        if name == 'slow':
+            await asyncio.sleep(1)
+        return name
+
+    finished = []
+    tasks = {'bad': '', 'slow': '', 'after_bad': '', 'after_after': '', 'after_slow': '', 'free': ''}
+    dependencies = {'after_bad': ['bad'], 'after_after': ['after_bad'], 'after_slow': ['slow']}
+    outcomes = run(run_task_graph(tasks, run_task, dependencies, task_timeout=0.05,
+                                  on_result=lambda name, outcome: finished.append(name)))
+    assert outcomes['bad']['status'] == 'failed' and outcomes['bad']['error'] == 'boom'
+    assert outcomes['slow']['status'] == 'timeout'
+    assert outcomes['after_bad']['status'] == 'skipped'
+    assert outcomes['after_after']['status'] == 'skipped'
+    assert outcomes['after_slow']['status'] == 'skipped'
+    assert outcomes['free']['status'] == 'ok'
+    assert sorted(finished) == sorted(tasks)
+
+
+def test_format_dependency_context():
+    class History:
+        def final_result(self):
+            return 'found it'
+
+    assert format_dependency_context({}) == ''
+    text = format_dependency_context({'search': History(), 'plain': 42})
+    assert '- search: found it' in text and '- plain: 42' in text
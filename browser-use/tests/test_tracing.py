@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from tracing import Span, Tracer, traced
+
+
+def finish(tracer, name, duration, outcome='ok', **attributes):
+    span = Span(tracer, name, attributes)
+    span.duration = duration
+    span.outcome = outcome
+    tracer._finish(span)
+
+
+def metric_lines(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+@pytest.fixture
+def fresh_tracer(monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr(tracing, 'tracer', tracer)
+    return tracer
+
+
+def test_histogram_buckets_are_cumulative_with_inf():
+    tracer = Tracer()
+    for duration in (0.03, 0.07, 0.07, 4.0, 1000.0):
+        finish(tracer, 'extract', duration)
+    text = tracer.render_prometheus()
+    buckets = metric_lines(text, 'pipeline_stage_duration_seconds_bucket')
+    assert len(buckets) == len(tracing.DURATION_BUCKETS) + 1
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert 'pipeline_stage_duration_seconds_bucket{stage="extract",le="0.05"} 1' in buckets
+    assert 'pipeline_stage_duration_seconds_bucket{stage="extract",le="0.1"} 3' in buckets
+    assert 'pipeline_stage_duration_seconds_bucket{stage="extract",le="5"} 4' in buckets
+    assert buckets[-1] == 'pipeline_stage_duration_seconds_bucket{stage="extract",le="+Inf"} 5'
+    assert 'pipeline_stage_duration_seconds_count{stage="extract"} 5' in text
+    assert 'pipeline_stage_duration_seconds_sum{stage="extract"} 1004.170000' in text
+
+
+def test_outcomes_tokens_and_steps_are_exported():
+    tracer = Tracer()
+    finish(tracer, 'agent.run', 1.0, steps=4, prompt_tokens=100, completion_tokens=20)
+    finish(tracer, 'agent.run', 2.0, outcome='error', steps=60)
+    text = tracer.render_prometheus()
+    assert 'pipeline_stage_total{stage="agent.run",outcome="ok"} 1' in text
+    assert 'pipeline_stage_total{stage="agent.run",outcome="error"} 1' in text
+    assert 'pipeline_llm_tokens_total{stage="agent.run",kind="prompt"} 100' in text
+    assert 'pipeline_llm_tokens_total{stage="agent.run",kind="completion"} 20' in text
+    assert 'pipeline_agent_steps_bucket{stage="agent.run",le="5"} 1' in text
+    assert 'pipeline_agent_steps_bucket{stage="agent.run",le="+Inf"} 2' in text
+    assert text.endswith('\n')
+
+
+def test_label_values_are_escaped():
+    tracer = Tracer()
+    finish(tracer, 'say "hi"\\now\n', 0.01)
+    text = tracer.render_prometheus()
+    assert 'pipeline_stage_total{stage="say \\"hi\\"\\\\now\\n",outcome="ok"} 1' in text
+    # 每个样本仍然只占一行
+    assert all(line.startswith(('#', 'pipeline_')) for line in text.splitlines())
+
+
+def test_traced_sync_function_records_outcome_and_errors(fresh_tracer):
+    @traced('sync_stage', outcome=lambda result: 'ok' if result else 'empty')
+    def work(value):
+        return value
+
+    @traced('sync_fail')
+    def fail():
+        raise ValueError('bad input')
+
+    assert work(1) == 1 and work(0) == 0
+    with pytest.raises(ValueError):
+        fail()
+    assert work.__name__ == 'work'
+    outcomes = fresh_tracer._outcomes
+    assert outcomes[('sync_stage', 'ok')] == 1 and outcomes[('sync_stage', 'empty')] == 1
+    assert outcomes[('sync_fail', 'error')] == 1
+    event = [e for e in fresh_tracer._events if e['name'] == 'sync_fail'][0]
+    assert event['args']['error'] == 'ValueError: bad input'
+
+
+def test_traced_async_function_records_outcome_errors_and_cancellation(fresh_tracer):
+    @traced('async_stage', outcome=lambda result: result['status'])
+    async def work(status):
+        await asyncio.sleep(0)
+        return {'status': status}
+
+    @traced('async_fail')
+    async def fail():
+        raise RuntimeError('boom')
+
+    @traced('async_slow')
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        assert await work('ok') == {'status': 'ok'}
+        await work('not_done')
+        with pytest.raises(RuntimeError):
+            await fail()
+        task = asyncio.create_task(slow())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    outcomes = fresh_tracer._outcomes
+    assert outcomes[('async_stage', 'ok')] == 1 and outcomes[('async_stage', 'not_done')] == 1
+    assert outcomes[('async_fail', 'error')] == 1
+    assert outcomes[('async_slow', 'cancelled')] == 1
+
+
+def test_annotate_only_affects_current_span(fresh_tracer):
+    tracing.annotate(ignored=True)  # 不在 span 内时忽略
+    with fresh_tracer.span('outer') as span:
+        tracing.annotate(prompt_tokens=5)
+    assert span.attributes == {'prompt_tokens': 5}
+
+
+def test_stage_summary_percentiles():
+    tracer = Tracer()
+    for i in range(101):
+        finish(tracer, 'submit', i / 100)
+    finish(tracer, 'extract', 0.5)
+    summary = tracer.stage_summary()
+    assert summary['submit'] == {'count': 101, 'p50': 0.5, 'p99': 0.99}
+    assert summary['extract'] == {'count': 1, 'p50': 0.5, 'p99': 0.5}
+    assert Tracer().stage_summary() == {}
+
+
+def test_chrome_trace_is_written(tmp_path):
+    tracer = Tracer()
+    finish(tracer, 'extract', 0.002, title=object())
+    path = tracer.write_chrome_trace(str(tmp_path / 'traces' / 'run.json'))
+    with open(path, encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    assert events[0]['name'] == 'extract' and events[0]['ph'] == 'X' and events[0]['dur'] == 2000
+
+
+def test_malformed_metrics_port_does_not_start_server(monkeypatch):
+    monkeypatch.setenv('PIPELINE_METRICS_PORT', 'not-a-port')
+    assert tracing._metrics_port_from_env() == 0
+    assert tracing.start_metrics_server() is None
+    monkeypatch.setenv('PIPELINE_METRICS_PORT', ' 9108 ')
+    assert tracing._metrics_port_from_env() == 9108
+    monkeypatch.delenv('PIPELINE_METRICS_PORT')
+    assert tracing._metrics_port_from_env() == 0
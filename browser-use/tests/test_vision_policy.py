@@ -0,0 +1,111 @@
+import importlib
+from types import SimpleNamespace
+
+import vision_policy
+from vision_policy import _StallDetector, diagnose_history, may_have_submitted
+
+
+class FakeHistory:
+    def __init__(self, errors=(), done=True, final='提交成功', actions=None):
+        self._errors = list(errors)
+        self._done = done
+        self._final = final
+        self._actions = actions
+
+    def errors(self):
+        return self._errors
+
+    def is_done(self):
+        return self._done
+
+    def final_result(self):
+        return self._final
+
+    def model_actions(self):
+        if self._actions is None:
+            raise AttributeError('no actions recorded')
+        return self._actions
+
+
+class FakeAction:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def model_dump(self, exclude_unset=False):
+        return self.fields
+
+
+class FakeAgent:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+def element(tag, **attributes):
+    return SimpleNamespace(tag_name=tag, attributes=attributes)
+
+
+def test_diagnose_history_reasons_in_priority_order():
+    assert diagnose_history(FakeHistory(), '提交成功') is None
+    assert diagnose_history(FakeHistory(), '提交成功', stalled=True) == 'stalled'
+    assert diagnose_history(FakeHistory(errors=[None, 'e1', 'e2', 'e3']), '提交成功') == 'repeated_failures'
+    # 中间穿插成功步骤时只计算末尾连续的失败
+    assert diagnose_history(FakeHistory(errors=['e1', 'e2', None, 'e3']), '提交成功') is None
+    assert diagnose_history(FakeHistory(done=False), '提交成功') == 'not_done'
+    assert diagnose_history(FakeHistory(final='已填写'), '提交成功') == 'missing_success_marker'
+    assert diagnose_history(FakeHistory(final=None), '') is None
+
+
+def test_may_have_submitted_detects_submit_actions():
+    assert not may_have_submitted(FakeHistory(actions=[]))
+    assert not may_have_submitted(FakeHistory(actions=[
+        {'input_text': {'index': 1, 'text': 'x'}, 'interacted_element': element('input', type='text')},
+        {'click_element_by_index': {'index': 2}, 'interacted_element': element('a')},
+    ]))
+    assert may_have_submitted(FakeHistory(actions=[
+        {'click_element_by_index': {'index': 3}, 'interacted_element': element('button')}]))
+    assert may_have_submitted(FakeHistory(actions=[
+        {'click_element': {'index': 3}, 'interacted_element': element('input', type='submit')}]))
+    assert may_have_submitted(FakeHistory(actions=[
+        {'send_keys': {'keys': 'Enter'}, 'interacted_element': None}]))
+
+
+def test_may_have_submitted_is_conservative():
+    # 无法读取动作记录，或点击的元素未知时，按已提交处理
+    assert may_have_submitted(FakeHistory(actions=None))
+    assert may_have_submitted(FakeHistory(actions=[{'click_element_by_index': {'index': 3},
+                                                    'interacted_element': None}]))
+
+
+def test_stall_detector_stops_after_repeated_identical_actions():
+    detector = _StallDetector(stall_steps=3)
+    detector.agent = FakeAgent()
+    scroll = SimpleNamespace(action=[FakeAction(scroll_down={'amount': 100})])
+    click = SimpleNamespace(action=[FakeAction(click_element_by_index={'index': 4})])
+    for output in (scroll, scroll, click, scroll, scroll):
+        detector(None, output, 0)
+    assert not detector.stalled and not detector.agent.stopped
+    detector(None, scroll, 0)
+    assert detector.stalled and detector.agent.stopped
+
+
+def test_stall_detector_without_agent_or_actions():
+    detector = _StallDetector(stall_steps=2)
+    detector(None, SimpleNamespace(action=None), 0)
+    detector(None, None, 0)
+    assert not detector.stalled  # 还没有关联智能体时不停止
+
+
+def test_max_steps_defaults_to_browser_use_default(monkeypatch):
+    try:
+        monkeypatch.delenv('AGENT_MAX_STEPS', raising=False)
+        assert importlib.reload(vision_policy).MAX_STEPS == 100
+        monkeypatch.setenv('AGENT_MAX_STEPS', '40')
+        assert importlib.reload(vision_policy).MAX_STEPS == 40
+        monkeypatch.setenv('AGENT_MAX_STEPS', 'forty')
+        assert importlib.reload(vision_policy).MAX_STEPS == 100
+    finally:
+        monkeypatch.undo()
+        importlib.reload(vision_policy)
@@ -0,0 +1,189 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import watch_folder
+from watch_folder import PdfFolderWatcher, file_signature
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watch_folder, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def make_watcher(tmp_path, debounce=2.0):
+    return PdfFolderWatcher(str(tmp_path), state_file=str(tmp_path / 'state' / 'watch.json'),
+                            debounce_seconds=debounce)
+
+
+def write_pdf(tmp_path, name='a.pdf', data=b'%PDF-1.4'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def drain(watcher):
+    items = []
+    while not watcher.queue.empty():
+        items.append(watcher.queue.get_nowait())
+    return items
+
+
+def test_file_is_enqueued_only_after_signature_is_stable(tmp_path, clock):
+    watcher = make_watcher(tmp_path)
+    path = write_pdf(tmp_path)
+    watcher.notify(path)
+    watcher._check_pending()  # 记录第一次签名
+    clock.now += 1.0
+    watcher._check_pending()
+    assert drain(watcher) == []
+
+    # 写入仍在继续：签名变化后重新计时
+    write_pdf(tmp_path, data=b'%PDF-1.4 more')
+    clock.now += 1.5
+    watcher._check_pending()
+    clock.now += 1.5
+    watcher._check_pending()
+    assert drain(watcher) == []
+
+    clock.now += 0.5
+    watcher._check_pending()
+    assert drain(watcher) == [(path, file_signature(path))]
+    assert path in watcher._in_flight
+
+
+def test_scan_skips_processed_files_and_state_survives_restart(tmp_path, clock):
+    watcher = make_watcher(tmp_path, debounce=0)
+    path = write_pdf(tmp_path)
+    (tmp_path / 'notes.txt').write_text('x')
+    watcher.scan()
+    assert list(watcher._pending) == [path]
+    watcher._check_pending()
+    watcher._check_pending()
+    (_, signature), = drain(watcher)
+    watcher.mark_done(path, signature, success=True)
+
+    restarted = make_watcher(tmp_path, debounce=0)
+    assert restarted.processed == {'a.pdf': signature}
+    restarted.scan()
+    assert restarted._pending == {}
+
+
+def test_corrupt_state_file_starts_fresh(tmp_path):
+    state = tmp_path / 'state' / 'watch.json'
+    state.parent.mkdir()
+    state.write_text('{not json', encoding='utf-8')
+    assert make_watcher(tmp_path).processed == {}
+
+
+def test_change_during_processing_is_picked_up_again(tmp_path, clock):
+    watcher = make_watcher(tmp_path, debounce=0)
+    path = write_pdf(tmp_path)
+    watcher.notify(path)
+    watcher._check_pending()
+    watcher._check_pending()
+    (_, signature), = drain(watcher)
+
+    # 处理期间文件被重写：通知被记下，而不是丢弃
+    write_pdf(tmp_path, data=b'%PDF-1.4 rewritten')
+    watcher.notify(path)
+    assert watcher._pending == {}
+    watcher.mark_done(path, signature, success=True)
+    assert path in watcher._pending
+
+    watcher._check_pending()
+    watcher._check_pending()
+    assert drain(watcher) == [(path, file_signature(path))]
+
+
+def test_signature_change_without_event_is_detected(tmp_path, clock):
+    watcher = make_watcher(tmp_path, debounce=0)
+    path = write_pdf(tmp_path)
+    signature = file_signature(path)
+    watcher._in_flight.add(path)
+    write_pdf(tmp_path, data=b'%PDF-1.4 rewritten')
+    watcher.mark_done(path, signature, success=True)
+    assert path in watcher._pending
+
+
+def test_failed_files_are_retried_with_backoff(tmp_path, clock):
+    watcher = make_watcher(tmp_path, debounce=0)
+    path = write_pdf(tmp_path)
+    signature = file_signature(path)
+    watcher._in_flight.add(path)
+    watcher.mark_done(path, signature, success=False)
+    assert watcher.processed == {}
+
+    # 退避期间扫描到的同一版本文件不会入队
+    watcher.scan()
+    watcher._check_pending()
+    watcher._check_pending()
+    assert drain(watcher) == []
+
+    clock.now += watch_folder.RETRY_BASE_SECONDS
+    watcher._check_pending()
+    watcher._check_pending()
+    assert drain(watcher) == [(path, signature)]
+
+    # 第二次失败后等待时间翻倍
+    watcher.mark_done(path, signature, success=False)
+    assert watcher._failed[path] == (signature, 2, clock.now + 2 * watch_folder.RETRY_BASE_SECONDS)
+    watcher.mark_done(path, signature, success=True)
+    assert path not in watcher._failed and watcher.processed == {'a.pdf': signature}
+
+
+def test_exhausted_retries_wait_for_a_new_version(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(watch_folder, 'MAX_ATTEMPTS', 1)
+    watcher = make_watcher(tmp_path, debounce=0)
+    path = write_pdf(tmp_path)
+    signature = file_signature(path)
+    watcher._in_flight.add(path)
+    watcher.mark_done(path, signature, success=False)
+    clock.now += 10 ** 6
+    watcher.scan()
+    watcher._check_pending()
+    watcher._check_pending()
+    assert drain(watcher) == []
+
+    write_pdf(tmp_path, data=b'%PDF-1.4 fixed')
+    watcher.notify(path)
+    watcher._check_pending()
+    watcher._check_pending()
+    assert drain(watcher) == [(path, file_signature(path))]
+
+
+def test_worker_records_only_successful_results(tmp_path, clock):
+    watcher = make_watcher(tmp_path, debounce=0)
+    ok, bad, boom = (write_pdf(tmp_path, name) for name in ('ok.pdf', 'bad.pdf', 'boom.pdf'))
+
+    async def process(pdf_path):
+        if pdf_path == boom:
+            raise RuntimeError('backend down')
+        return {'pdf_path': pdf_path, 'success': pdf_path == ok}
+
+    async def main():
+        for path in (ok, bad, boom):
+            watcher._in_flight.add(path)
+            watcher.queue.put_nowait((path, file_signature(path)))
+        worker = asyncio.create_task(watch_folder._paper_worker(watcher, process))
+        await watcher.queue.join()
+        worker.cancel()
+
+    asyncio.run(main())
+    assert list(watcher.processed) == ['ok.pdf']
+    assert set(watcher._failed) == {bad, boom}
+    assert watcher._in_flight == set()
+    with open(watcher.state_file, encoding='utf-8') as f:
+        assert list(json.load(f)) == ['ok.pdf']
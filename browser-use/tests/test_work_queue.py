@@ -0,0 +1,67 @@
+import time
+
+from work_queue import WorkQueue, shard_for
+
+
+def make_queue(tmp_path, **kwargs):
+    return WorkQueue(str(tmp_path / 'queue.db'), **kwargs)
+
+
+def test_shard_is_stable_and_uses_basename():
+    assert shard_for('/a/paper.pdf', 4) == shard_for('/b/paper.pdf', 4)
+    assert 0 <= shard_for('paper.pdf', 4) < 4
+
+
+def test_enqueue_ignores_existing_paths(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue(['a.pdf', 'b.pdf'], 2) == 2
+    assert queue.enqueue(['a.pdf', 'c.pdf'], 2) == 1
+    assert queue.counts() == {'pending': 3}
+
+
+def test_claim_complete_and_retry(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue(['a.pdf'], 1)
+    assert queue.claim('w1') == 'a.pdf'
+    assert queue.claim('w2') is None  # 租约有效期内不会被重复领取
+    queue.complete('a.pdf', 'w1', {'error': 'boom'}, success=False)
+    assert queue.counts() == {'pending': 1}
+    assert queue.claim('w2') == 'a.pdf'
+    queue.complete('a.pdf', 'w2', {'error': 'boom'}, success=False)
+    assert queue.counts() == {'failed': 1}
+    assert queue.claim('w3') is None
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.01, max_attempts=3)
+    queue.enqueue(['a.pdf'], 1)
+    assert queue.claim('w1') == 'a.pdf'
+    time.sleep(0.05)
+    assert queue.claim('w2') == 'a.pdf'
+    assert not queue.renew('a.pdf', 'w1')
+    assert queue.renew('a.pdf', 'w2')
+    queue.complete('a.pdf', 'w1', {'stale': True})  # 原持有者的迟到结果被忽略
+    queue.complete('a.pdf', 'w2', {'ok': True})
+    assert queue.results()[0]['result'] == {'ok': True}
+
+
+def test_lease_expired_on_last_attempt_is_failed(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.01, max_attempts=1)
+    queue.enqueue(['a.pdf', 'b.pdf'], 1)
+    assert queue.claim('w1') == 'a.pdf'  # 工作进程在唯一一次尝试中崩溃
+    time.sleep(0.05)
+    assert queue.claim('w2') == 'b.pdf'
+    assert queue.claim('w3') is None
+    [failed] = [r for r in queue.results() if r['pdf_path'] == 'a.pdf']
+    assert failed['status'] == 'failed'
+    assert 'lease expired' in failed['result']['error']
+
+
+def test_results_report_unfinished_jobs(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=3)
+    queue.enqueue(['a.pdf', 'b.pdf', 'c.pdf'], 1)
+    path = queue.claim('w1')
+    queue.complete(path, 'w1', {'ok': True})
+    queue.claim('w1')  # 仍持有有效租约
+    statuses = sorted(r['status'] for r in queue.results())
+    assert statuses == ['done', 'leased', 'pending']
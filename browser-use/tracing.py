@@ -0,0 +1,289 @@
+# 流水线各阶段的轻量级追踪和指标：记录每个阶段的耗时、结果、token 用量和智能体步数，
+# 以 Prometheus 文本格式暴露 (/metrics)，并可为每次运行导出 Chrome trace JSON (chrome://tracing 或 Perfetto 打开)。
+# 只依赖标准库；span 同时适用于同步代码和协程，当前 span 通过 contextvars 在并发任务之间隔离。
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 配置 ---
+TRACE_DIR = os.getenv('PIPELINE_TRACE_DIR', '')  # 非空时每次运行结束把 Chrome trace 写到该目录
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STEP_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    escaped = (key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for key, value in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+class Span:
+    """一次阶段执行。outcome 默认为 ok，抛出异常时为 error，也可以由调用方通过 set() 指定。"""
+
+    def __init__(self, tracer, name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.outcome = 'ok'
+        self.start = 0.0
+        self.duration = 0.0
+        self._token = None
+
+    def set(self, outcome: str = None, **attributes):
+        if outcome is not None:
+            self.outcome = outcome
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.outcome = 'cancelled' if issubclass(exc_type, asyncio.CancelledError) else 'error'
+            self.attributes.setdefault('error', f'{exc_type.__name__}: {exc}')
+        self.tracer._finish(self)
+        return False
+
+
+class Tracer:
+    """收集 span 并聚合为指标。线程安全，可以被多个事件循环共享。"""
+
+    def __init__(self, max_events: int = 100000, window: int = 10000):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._events = deque(maxlen=max_events)  # Chrome trace 事件
+        self._durations = {}  # 阶段 -> 最近 window 次耗时，用于分位数
+        self._histograms = {}  # 阶段 -> 耗时直方图
+        self._step_histograms = {}  # 阶段 -> 智能体步数直方图
+        self._outcomes = {}  # (阶段, 结果) -> 次数
+        self._tokens = {}  # (阶段, 类型) -> token 数
+        self._window = window
+
+    def span(self, name: str, **attributes) -> Span:
+        return Span(self, name, attributes)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self._durations.setdefault(span.name, deque(maxlen=self._window)).append(span.duration)
+            self._histograms.setdefault(span.name, _Histogram(DURATION_BUCKETS)).observe(span.duration)
+            key = (span.name, span.outcome)
+            self._outcomes[key] = self._outcomes.get(key, 0) + 1
+            steps = span.attributes.get('steps')
+            if isinstance(steps, int):
+                self._step_histograms.setdefault(span.name, _Histogram(STEP_BUCKETS)).observe(steps)
+            for kind in ('prompt_tokens', 'completion_tokens', 'cache_hit_tokens'):
+                if span.attributes.get(kind):
+                    token_key = (span.name, kind)
+                    self._tokens[token_key] = self._tokens.get(token_key, 0) + span.attributes[kind]
+            try:
+                task = asyncio.current_task()
+            except RuntimeError:
+                task = None
+            self._events.append({
+                'name': span.name, 'ph': 'X', 'pid': os.getpid(),
+                # 同一线程中的并发协程放在不同的轨道上，便于在时间线上区分
+                'tid': task.get_name() if task is not None else threading.current_thread().name,
+                'ts': round((span.start - self._origin) * 1e6), 'dur': round(span.duration * 1e6),
+                'args': {'outcome': span.outcome, **{k: v if isinstance(v, (int, float, bool)) else str(v)
+                                                     for k, v in span.attributes.items()}},
+            })
+
+    # --- 导出 ---
+    def stage_summary(self) -> dict:
+        """各阶段的次数和 p50/p99 (秒)。"""
+        with self._lock:
+            return {
+                name: {'count': len(values), 'p50': round(_percentile(values, 0.5), 3),
+                       'p99': round(_percentile(values, 0.99), 3)}
+                for name, values in self._durations.items()
+            }
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines += ['# HELP pipeline_stage_duration_seconds Duration of pipeline stages.',
+                      '# TYPE pipeline_stage_duration_seconds histogram']
+            for name, hist in self._histograms.items():
+                cumulative = 0
+                for bound, count in zip(list(hist.buckets) + ['+Inf'], hist.counts):
+                    cumulative += count
+                    lines.append(f'pipeline_stage_duration_seconds_bucket{_labels(stage=name, le=bound)} {cumulative}')
+                lines.append(f'pipeline_stage_duration_seconds_sum{_labels(stage=name)} {hist.sum:.6f}')
+                lines.append(f'pipeline_stage_duration_seconds_count{_labels(stage=name)} {hist.count}')
+
+            lines += ['# HELP pipeline_stage_total Completed pipeline stages by outcome.',
+                      '# TYPE pipeline_stage_total counter']
+            for (name, outcome), count in self._outcomes.items():
+                lines.append(f'pipeline_stage_total{_labels(stage=name, outcome=outcome)} {count}')
+
+            lines += ['# HELP pipeline_llm_tokens_total LLM tokens used by pipeline stages.',
+                      '# TYPE pipeline_llm_tokens_total counter']
+            for (name, kind), count in self._tokens.items():
+                lines.append(f'pipeline_llm_tokens_total{_labels(stage=name, kind=kind.replace("_tokens", ""))} {count}')
+
+            lines += ['# HELP pipeline_agent_steps Browser agent steps per run.',
+                      '# TYPE pipeline_agent_steps histogram']
+            for name, hist in self._step_histograms.items():
+                cumulative = 0
+                for bound, count in zip(list(hist.buckets) + ['+Inf'], hist.counts):
+                    cumulative += count
+                    lines.append(f'pipeline_agent_steps_bucket{_labels(stage=name, le=bound)} {cumulative}')
+                lines.append(f'pipeline_agent_steps_sum{_labels(stage=name)} {hist.sum:.0f}')
+                lines.append(f'pipeline_agent_steps_count{_labels(stage=name)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_chrome_trace(self, path: str) -> str:
+        with self._lock:
+            events = list(self._events)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return path
+
+
+tracer = Tracer()
+
+
+def traced(name: str, outcome=None):
+    """
+    装饰器：把函数的每次调用记录为一个 span，同步函数和协程函数都适用。
+    outcome(result) 可以根据返回值给出结果标签，用于失败时返回占位数据而不抛异常的函数。
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name) as span:
+                    result = await func(*args, **kwargs)
+                    if outcome is not None:
+                        span.set(outcome(result))
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name) as span:
+                result = func(*args, **kwargs)
+                if outcome is not None:
+                    span.set(outcome(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes):
+    """给当前 span 添加属性 (不在 span 内时忽略)。"""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def record_llm_usage(response):
+    """从 LangChain AIMessage 中取出 token 用量，记到当前 span 上。"""
+    metadata = getattr(response, 'response_metadata', None) or {}
+    usage = metadata.get('token_usage') or getattr(response, 'usage_metadata', None) or {}
+    annotate(prompt_tokens=usage.get('prompt_tokens', usage.get('input_tokens', 0)) or 0,
+             completion_tokens=usage.get('completion_tokens', usage.get('output_tokens', 0)) or 0,
+             cache_hit_tokens=usage.get('prompt_cache_hit_tokens', 0) or 0)
+
+
+def record_agent_history(span: Span, history):
+    """把智能体运行的步数和 token 用量记到 span 上。"""
+    if history is None:
+        return
+    span.set(steps=history.number_of_steps())
+    total_input_tokens = getattr(history, 'total_input_tokens', None)
+    if callable(total_input_tokens):
+        span.set(prompt_tokens=total_input_tokens())
+
+
+# --- 暴露指标 ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = tracer.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_metrics_server = None
+
+
+def _metrics_port_from_env() -> int:
+    """PIPELINE_METRICS_PORT > 0 时流水线进程在该端口提供 /metrics；未设置或不是整数时不启动。"""
+    value = os.getenv('PIPELINE_METRICS_PORT', '').strip()
+    if not value:
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        print(f"警告: PIPELINE_METRICS_PORT={value!r} 不是有效端口，不提供 /metrics")
+        return 0
+
+
+def start_metrics_server(port: int = None, host: str = '127.0.0.1'):
+    """在后台线程中提供 /metrics；port 默认读取 PIPELINE_METRICS_PORT，为 0 时不启动。同一进程只启动一次。"""
+    global _metrics_server
+    if port is None:
+        port = _metrics_port_from_env()
+    if port <= 0 or _metrics_server is not None:
+        return _metrics_server
+    _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, name='metrics-server', daemon=True).start()
+    print(f"流水线指标: http://{host}:{port}/metrics")
+    return _metrics_server
+
+
+def finish_run(run_name: str, trace_dir: str = TRACE_DIR):
+    """运行结束时调用：打印各阶段耗时，配置了 PIPELINE_TRACE_DIR 时写出 Chrome trace。"""
+    print(f"各阶段耗时 (秒): {json.dumps(tracer.stage_summary(), ensure_ascii=False)}")
+    if trace_dir:
+        path = os.path.join(trace_dir, f"trace_{run_name}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json")
+        print(f"Chrome trace 已保存到 {tracer.write_chrome_trace(path)}")
@@ -0,0 +1,221 @@
+# 自适应视觉模式：智能体先以纯文本/DOM 模式运行，出现停滞、连续失败或缺少成功标记时，
+# 才用支持视觉的模型开启截图 (use_vision=True)，在同一个浏览器页面上继续完成剩余步数。
+# langchain_openai 和 browser_use 在用到时才导入，停滞检测和历史诊断等纯逻辑可以单独测试。
+import json, os
+from collections import Counter
+from profiling import profiled
+from tracing import record_agent_history, tracer
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, '')
+    try:
+        return int(value) if value.strip() else default
+    except ValueError:
+        print(f"警告: 环境变量 {name}={value!r} 不是整数，使用默认值 {default}")
+        return default
+
+
+# --- 配置 ---
+# 支持视觉的模型 (OpenAI 兼容接口)。deepseek 模型不支持截图输入，未配置时不会升级到视觉模式。
+VISION_LLM_MODEL = os.getenv('VISION_LLM_MODEL', '')  # 例如 'gpt-4o'
+VISION_LLM_BASE_URL = os.getenv('VISION_LLM_BASE_URL', 'https://api.openai.com/v1')
+VISION_LLM_API_KEY = os.getenv('VISION_LLM_API_KEY', '')
+# 文本模式 + 视觉模式的总步数预算；默认与 browser_use Agent.run 的默认值 (100 步) 相同
+MAX_STEPS = _env_int('AGENT_MAX_STEPS', 100)
+MIN_VISION_STEPS = 5  # 升级后至少保留的步数
+STALL_STEPS = 3  # 连续多少步重复完全相同的动作视为停滞
+MAX_CONSECUTIVE_FAILURES = 3  # 连续失败多少次视为失败
+
+
+def create_vision_llm():
+    """根据环境变量创建视觉模型客户端，未配置时返回 None。"""
+    if not VISION_LLM_MODEL or not VISION_LLM_API_KEY:
+        return None
+    from langchain_openai import ChatOpenAI
+    from pydantic import SecretStr
+    return ChatOpenAI(
+        base_url=VISION_LLM_BASE_URL,
+        model=VISION_LLM_MODEL,
+        api_key=SecretStr(VISION_LLM_API_KEY),
+    )
+
+
+_vision_llm = None
+
+
+def get_vision_llm():
+    """进程内共享的视觉模型客户端。"""
+    global _vision_llm
+    if _vision_llm is None:
+        _vision_llm = create_vision_llm()
+    return _vision_llm
+
+
+class EscalationStats:
+    """统计一次运行中的视觉升级情况。"""
+
+    def __init__(self):
+        self.runs = 0
+        self.escalated = 0
+        self.reasons = Counter()
+        self.succeeded_text_only = 0
+        self.succeeded_after_escalation = 0
+        self.escalation_unavailable = 0
+        self.escalation_refused = 0  # 第一次运行可能已提交表单，不升级
+
+    def summary(self) -> dict:
+        return {
+            'runs': self.runs,
+            'escalated': self.escalated,
+            'escalation_rate': self.escalated / self.runs if self.runs else 0.0,
+            'reasons': dict(self.reasons),
+            'succeeded_text_only': self.succeeded_text_only,
+            'succeeded_after_escalation': self.succeeded_after_escalation,
+            'escalation_unavailable': self.escalation_unavailable,
+            'escalation_refused': self.escalation_refused,
+        }
+
+
+escalation_stats = EscalationStats()  # 默认的进程级统计
+
+
+class _StallDetector:
+    """步骤回调：连续 STALL_STEPS 步执行完全相同的动作时提前停止智能体，避免把步数耗尽。"""
+
+    def __init__(self, stall_steps: int = STALL_STEPS):
+        self.stall_steps = stall_steps
+        self.agent = None
+        self.stalled = False
+        self._last_action = None
+        self._repeats = 0
+
+    def __call__(self, state, model_output, step_number):
+        actions = getattr(model_output, 'action', None) or []
+        signature = json.dumps(
+            [a.model_dump(exclude_unset=True) if hasattr(a, 'model_dump') else str(a) for a in actions],
+            sort_keys=True, default=str
+        )
+        self._repeats = self._repeats + 1 if signature == self._last_action else 1
+        self._last_action = signature
+        if self._repeats >= self.stall_steps and self.agent is not None:
+            self.stalled = True
+            self.agent.stop()
+
+
+def diagnose_history(history, success_marker: str, stalled: bool = False,
+                     max_consecutive_failures: int = MAX_CONSECUTIVE_FAILURES):
+    """判断一次文本模式运行是否需要升级；返回升级原因，不需要升级时返回 None。"""
+    if stalled:
+        return 'stalled'
+    errors = history.errors() if hasattr(history, 'errors') else []
+    consecutive = 0
+    for error in reversed(errors):
+        if not error:
+            break
+        consecutive += 1
+    if consecutive >= max_consecutive_failures:
+        return 'repeated_failures'
+    if not history.is_done():
+        return 'not_done'
+    if success_marker and success_marker not in str(history.final_result() or ''):
+        return 'missing_success_marker'
+    return None
+
+
+def may_have_submitted(history) -> bool:
+    """
+    第一次运行是否可能已经提交过表单：点击过按钮 (表单只有一个提交按钮) 或 type=submit 的元素，
+    或在输入框中按过回车。无法读取动作记录时按已提交处理，宁可不升级也不重复插入数据。
+    """
+    try:
+        actions = history.model_actions()
+    except Exception:
+        return True
+    for action in actions:
+        element = action.get('interacted_element')
+        if 'click_element' in action or 'click_element_by_index' in action:
+            if element is None:
+                return True
+            attributes = getattr(element, 'attributes', None) or {}
+            if getattr(element, 'tag_name', '').lower() == 'button' or attributes.get('type') == 'submit':
+                return True
+        if 'send_keys' in action and 'Enter' in str(action['send_keys']):
+            return True
+    return False
+
+
+async def run_agent_with_escalation(task: str, llm, vision_llm=None, browser=None, success_marker: str = '提交成功',
+                                    max_steps: int = MAX_STEPS, stats: EscalationStats = None):
+    """
+    先用 use_vision=False 运行智能体；需要升级时用 vision_llm 以 use_vision=True 继续剩余步数。
+    两个智能体共用同一个浏览器上下文，视觉智能体从文本模式停下时的页面 (已填写的字段等) 继续，
+    而不是重新打开页面从头开始；未传入 browser 时在这里启动一个浏览器，两次运行共用后关闭。
+    第一次运行可能已经点击过提交按钮时不升级 (见 may_have_submitted)，避免重复提交插入重复记录。
+    返回 (最后一次运行的 AgentHistoryList, 升级原因或 None)。
+    """
+    from browser_use import Agent, Browser
+
+    stats = stats if stats is not None else escalation_stats
+    stats.runs += 1
+
+    own_browser = browser is None
+    if own_browser:
+        browser = Browser()
+    browser_context = await browser.new_context()
+    try:
+        detector = _StallDetector()
+        agent = Agent(
+            task=task,
+            llm=llm,
+            browser=browser,
+            browser_context=browser_context,
+            use_vision=False,
+            max_failures=MAX_CONSECUTIVE_FAILURES,
+            register_new_step_callback=detector,
+        )
+        detector.agent = agent
+        with tracer.span('agent.run', mode='dom') as span:
+            history = await profiled('agent_run', agent.run(max_steps=max_steps))
+            reason = diagnose_history(history, success_marker, stalled=detector.stalled)
+            record_agent_history(span, history)
+            span.set(reason or 'ok')
+        if reason is None:
+            stats.succeeded_text_only += 1
+            return history, None
+
+        stats.reasons[reason] += 1
+        if vision_llm is None:
+            stats.escalation_unavailable += 1
+            print(f"文本模式未完成任务 ({reason})，但未配置视觉模型 (VISION_LLM_MODEL)，不进行升级。")
+            return history, reason
+        if may_have_submitted(history):
+            stats.escalation_refused += 1
+            print(f"文本模式未完成任务 ({reason})，但可能已经提交过表单，不升级视觉模式以免重复提交。")
+            return history, reason
+
+        stats.escalated += 1
+        remaining_steps = max(max_steps - history.number_of_steps(), MIN_VISION_STEPS)
+        print(f"文本模式未完成任务 ({reason})，升级为视觉模式在当前页面继续，剩余 {remaining_steps} 步...")
+        vision_agent = Agent(
+            task=task + "\nNote: a previous attempt without screenshots did not finish and the form was not submitted. "
+                        "Continue from the current page state; do not reload the page or re-enter fields that are "
+                        "already filled correctly.",
+            llm=vision_llm,
+            browser=browser,
+            browser_context=browser_context,
+            use_vision=True,
+            max_failures=MAX_CONSECUTIVE_FAILURES,
+        )
+        with tracer.span('agent.run', mode='vision', escalation_reason=reason) as span:
+            vision_history = await profiled('agent_run', vision_agent.run(max_steps=remaining_steps))
+            vision_reason = diagnose_history(vision_history, success_marker)
+            record_agent_history(span, vision_history)
+            span.set(vision_reason or 'ok')
+        if vision_reason is None:
+            stats.succeeded_after_escalation += 1
+        return vision_history, reason
+    finally:
+        await browser_context.close()
+        if own_browser:
+            await browser.close()
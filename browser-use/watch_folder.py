@@ -0,0 +1,226 @@
+# 常驻服务模式：监听 PDF 存储目录，新放入或被修改的 PDF 写入完成后立即送入处理流程。
+# Linux 下优先使用 watchdog (inotify) 接收文件事件，未安装 watchdog 时退化为定时轮询。
+# browser_use 和处理流程在 watch_and_process 中才导入，PdfFolderWatcher 本身只依赖标准库。
+import asyncio, json, math, os, time
+from tracing import finish_run, start_metrics_server
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # 没有 watchdog 时使用轮询
+    Observer = None
+    FileSystemEventHandler = object
+
+# --- 配置 ---
+DEBOUNCE_SECONDS = 2.0  # 文件大小和修改时间持续不变这么久，才认为文件已写完
+CHECK_INTERVAL = 0.5  # 检查待定文件是否写完的间隔
+POLL_INTERVAL = 2.0  # 轮询模式下重新扫描目录的间隔
+MAX_CONCURRENT_PAPERS = 2  # 同时处理的 PDF 数量
+STATE_FILE = os.path.join('saved', 'watch_state.json')  # 记录处理成功的文件签名，重启后不重复处理
+STORAGE_DIR = os.getenv('PAPER_STORAGE_DIR', './storage/en')
+RETRY_BASE_SECONDS = 30.0  # 处理失败后第一次重试的等待时间，之后每次翻倍
+RETRY_MAX_SECONDS = 600.0  # 重试等待时间的上限
+MAX_ATTEMPTS = 5  # 同一版本的文件最多处理的次数；用尽后等文件被修改或服务重启再处理
+
+
+def file_signature(path: str):
+    """文件签名：(大小, 修改时间纳秒)，任一变化即视为文件被修改。"""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class _PdfEventHandler(FileSystemEventHandler):
+    """把 watchdog 线程里的文件事件转交给事件循环。"""
+
+    def __init__(self, watcher, loop):
+        self.watcher = watcher
+        self.loop = loop
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        path = getattr(event, 'dest_path', '') or event.src_path  # 重命名事件取目标路径
+        if path.endswith('.pdf'):
+            self.loop.call_soon_threadsafe(self.watcher.notify, path)
+
+
+class PdfFolderWatcher:
+    """
+    监听目录中的 PDF 文件，对写入中的文件做去抖处理，只把新增或变化的文件放入 queue。
+    """
+
+    def __init__(self, directory: str, state_file: str = STATE_FILE,
+                 debounce_seconds: float = DEBOUNCE_SECONDS, poll_interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.state_file = state_file
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.queue = asyncio.Queue()
+        self.processed = self._load_state()  # 文件名 -> 已处理时的签名
+        self._pending = {}  # 路径 -> (最近一次签名, 签名最近一次变化的时间)
+        self._in_flight = set()  # 已入队或正在处理的路径
+        self._dirty = set()  # 处理期间又收到变化通知的路径，处理结束后重新检查
+        self._failed = {}  # 路径 -> (失败时的签名, 已尝试次数, 下次重试时间；None 表示已重新放入待定列表)
+        self.use_inotify = Observer is not None
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"警告: 读取监听状态文件 '{self.state_file}' 失败，将重新处理所有文件: {e}")
+            return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.processed, f, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def mark_done(self, path: str, signature, success: bool):
+        """
+        一个文件处理结束。只有成功时才记录签名；失败时按指数退避安排重试。
+        处理期间文件又被修改 (收到通知或签名已变化) 时，重新放入待定列表。
+        """
+        self._in_flight.discard(path)
+        name = os.path.basename(path)
+        try:
+            changed = path in self._dirty or file_signature(path) != signature
+        except FileNotFoundError:
+            changed = False
+        self._dirty.discard(path)
+        if success:
+            self._failed.pop(path, None)
+            self.processed[name] = signature
+            self._save_state()
+        else:
+            attempts = self._failed.get(path, (None, 0, None))[1] + 1
+            if attempts >= MAX_ATTEMPTS:
+                retry_at = math.inf
+                print(f"'{name}' 已连续处理失败 {attempts} 次，文件被修改或服务重启后再处理。")
+            else:
+                retry_at = time.monotonic() + min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+            self._failed[path] = (signature, attempts, retry_at)
+        if changed:
+            self._failed.pop(path, None)  # 新版本的文件重新计算尝试次数
+            self.notify(path)
+
+    def notify(self, path: str):
+        """收到文件变化通知：放入待定列表，等待写入稳定。处理中的文件先标记，处理结束后再检查。"""
+        if path in self._in_flight:
+            self._dirty.add(path)
+            return
+        if path not in self._pending:
+            self._pending[path] = (None, time.monotonic())
+
+    def scan(self):
+        """全量扫描一次目录（启动时以及轮询模式下使用）。"""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                st = entry.stat()
+                if self.processed.get(entry.name) != [st.st_size, st.st_mtime_ns]:
+                    self.notify(entry.path)
+
+    def _check_pending(self):
+        """签名在 debounce_seconds 内保持不变的文件才真正入队。"""
+        now = time.monotonic()
+        for path, (signature, attempts, retry_at) in list(self._failed.items()):
+            if retry_at is not None and now >= retry_at:
+                self._failed[path] = (signature, attempts, None)
+                self.notify(path)
+        for path, (last_signature, last_change) in list(self._pending.items()):
+            try:
+                signature = file_signature(path)
+            except FileNotFoundError:  # 文件被删除或移走
+                del self._pending[path]
+                self._failed.pop(path, None)
+                continue
+            if signature != last_signature:
+                self._pending[path] = (signature, now)
+            elif now - last_change >= self.debounce_seconds:
+                del self._pending[path]
+                failed = self._failed.get(path)
+                if failed is not None and failed[0] == signature and failed[2] is not None:
+                    continue  # 同一版本的文件还在退避等待中 (或已用尽尝试次数)
+                if self.processed.get(os.path.basename(path)) != signature:
+                    self._in_flight.add(path)
+                    self.queue.put_nowait((path, signature))
+
+    async def run(self):
+        """持续产生待处理文件，直到任务被取消。"""
+        observer = None
+        if self.use_inotify:
+            observer = Observer()
+            observer.schedule(_PdfEventHandler(self, asyncio.get_running_loop()), self.directory, recursive=False)
+            observer.start()
+            print(f"使用 inotify 监听目录: {self.directory}")
+        else:
+            print(f"未安装 watchdog，使用轮询模式监听目录: {self.directory} (间隔 {self.poll_interval}s)")
+
+        self.scan()  # 服务停止期间放入的文件
+        last_scan = time.monotonic()
+        try:
+            while True:
+                if not self.use_inotify and time.monotonic() - last_scan >= self.poll_interval:
+                    self.scan()
+                    last_scan = time.monotonic()
+                self._check_pending()
+                await asyncio.sleep(CHECK_INTERVAL)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+async def _paper_worker(watcher: PdfFolderWatcher, process):
+    """从队列中取出文件处理；process(pdf_path) 返回带 success 字段的结果。"""
+    while True:
+        pdf_path, signature = await watcher.queue.get()
+        success = False
+        try:
+            result = await process(pdf_path)
+            success = bool(result and result.get('success'))
+        except Exception as e:
+            print(f"处理 '{os.path.basename(pdf_path)}' 时发生未预期错误: {e}")
+        finally:
+            watcher.mark_done(pdf_path, signature, success)
+            watcher.queue.task_done()
+
+
+async def watch_and_process(directory: str = STORAGE_DIR, max_concurrent: int = MAX_CONCURRENT_PAPERS):
+    """常驻服务入口：LLM 客户端和浏览器在文件之间保持存活。"""
+    from browser_use import Browser, BrowserConfig
+    from papers2web_form_asyncio_gather import TARGET_WEB_FORM_URL, create_llm, process_single_pdf
+
+    llm_model = create_llm('deepseek-chat')
+    browser = Browser(config=BrowserConfig(headless=True))
+    start_metrics_server()  # 常驻服务建议设置 PIPELINE_METRICS_PORT 以便抓取指标
+    watcher = PdfFolderWatcher(directory)
+
+    def process(pdf_path: str):
+        return process_single_pdf(pdf_path, llm_model, TARGET_WEB_FORM_URL, browser=browser)
+
+    tasks = [asyncio.create_task(watcher.run())]
+    tasks += [asyncio.create_task(_paper_worker(watcher, process)) for _ in range(max_concurrent)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await browser.close()
+        finish_run('watch_folder')
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    from papers2web_form_asyncio_gather import FLASK_SERVER_URL
+    print(f"请确保你的 Flask 服务器在 {FLASK_SERVER_URL} 运行。")
+    print(f"开始监听 '{STORAGE_DIR}'，将 PDF 文件放入该目录即可自动处理 (Ctrl+C 退出)...")
+    try:
+        asyncio.run(watch_and_process())
+    except KeyboardInterrupt:
+        print("监听服务已停止。")
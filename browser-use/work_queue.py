@@ -0,0 +1,150 @@
+# 基于 SQLite 的本地工作队列：多个工作进程通过租约 (lease) 领取 PDF，进程崩溃后租约过期即可被重新领取。
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+
+def shard_for(path: str, num_shards: int) -> int:
+    """按文件名哈希分片，同一文件在多次运行中总是落在同一个分片。"""
+    return zlib.crc32(os.path.basename(path).encode('utf-8')) % num_shards
+
+
+class WorkQueue:
+    """
+    jobs 表中每一行是一个待处理的 PDF：
+    pending -> leased -> done / failed；leased 状态的租约过期后视同 pending，
+    若过期时已用完 max_attempts 次尝试（进程在最后一次尝试中崩溃），则直接记为 failed。
+    每个进程应创建自己的 WorkQueue 实例（SQLite 连接不能跨进程共享）。
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 600, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    path TEXT PRIMARY KEY,
+                    shard INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    updated_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_shard_status ON jobs (shard, status)')
+
+    def _connect(self):
+        # isolation_level=None: 手动控制事务，领取任务时使用 BEGIN IMMEDIATE 加写锁。
+        # sqlite3 连接的 with 语句只管理事务、不会关闭连接，调用方用 contextlib.closing 关闭。
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _fail_exhausted_leases(self, conn, now: float) -> int:
+        """租约已过期且尝试次数已用完的任务不会再被领取，记为 failed，避免永远停留在 leased。"""
+        rows = conn.execute(
+            "SELECT path, attempts FROM jobs WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, self.max_attempts)
+        ).fetchall()
+        conn.executemany('''
+            UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, result = ?, updated_at = ?
+            WHERE path = ? AND status = 'leased' AND lease_expires < ?
+        ''', [(json.dumps({'pdf_path': path, 'success': False, 'error': f'lease expired after {attempts} attempt(s)'},
+                         ensure_ascii=False), now, path, now)
+              for path, attempts in rows])
+        return len(rows)
+
+    def enqueue(self, paths: list, num_shards: int) -> int:
+        """加入新任务（已存在的路径保持原状态），返回新加入的数量。"""
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn:
+            before = conn.total_changes
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT OR IGNORE INTO jobs (path, shard, updated_at) VALUES (?, ?, ?)',
+                [(path, shard_for(path, num_shards), now) for path in paths]
+            )
+            conn.execute('COMMIT')
+            return conn.total_changes - before
+
+    def claim(self, worker_id: str, shard: int = None):
+        """
+        领取一个任务并加租约。优先领取本分片的任务；shard 为 None 时可领取任意分片（用于空闲进程帮忙）。
+        没有可领取的任务时返回 None。
+        """
+        now = time.time()
+        shard_clause = '' if shard is None else 'AND shard = ?'
+        params = [now, self.max_attempts] + ([] if shard is None else [shard])
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._fail_exhausted_leases(conn, now)
+            row = conn.execute(f'''
+                SELECT path FROM jobs
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                  AND attempts < ? {shard_clause}
+                LIMIT 1
+            ''', params).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('''
+                UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                attempts = attempts + 1, updated_at = ?
+                WHERE path = ?
+            ''', (worker_id, now + self.lease_seconds, now, row[0]))
+            conn.execute('COMMIT')
+            return row[0]
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def renew(self, path: str, worker_id: str) -> bool:
+        """续租；租约已被其他进程接管时返回 False。"""
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn:
+            cursor = conn.execute('''
+                UPDATE jobs SET lease_expires = ?, updated_at = ?
+                WHERE path = ? AND lease_owner = ? AND status = 'leased'
+            ''', (now + self.lease_seconds, now, path, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, path: str, worker_id: str, result: dict, success: bool = True):
+        """记录任务结果。失败且未超过最大尝试次数的任务会回到 pending。"""
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute('''
+                UPDATE jobs
+                SET status = CASE WHEN ? THEN 'done'
+                                  WHEN attempts >= ? THEN 'failed'
+                                  ELSE 'pending' END,
+                    lease_owner = NULL, lease_expires = NULL, result = ?, updated_at = ?
+                WHERE path = ? AND lease_owner = ?
+            ''', (success, self.max_attempts, json.dumps(result, ensure_ascii=False), now, path, worker_id))
+
+    def counts(self) -> dict:
+        with contextlib.closing(self._connect()) as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def results(self) -> list:
+        """
+        返回所有任务的结果，用于主进程汇总。先把已过期且用完尝试次数的租约记为 failed；
+        其余仍为 pending / leased 的任务（所有工作进程退出后仍未结束，即卡住的任务）也会返回，
+        其 status 保持原值、result 为 None，调用方不会把它们漏掉。
+        """
+        with contextlib.closing(self._connect()) as conn:
+            self._fail_exhausted_leases(conn, time.time())
+            rows = conn.execute('SELECT path, shard, status, attempts, result FROM jobs').fetchall()
+        return [
+            {'pdf_path': path, 'shard': shard, 'status': status, 'attempts': attempts,
+             'result': json.loads(result) if result else None}
+            for path, shard, status, attempts, result in rows
+        ]
@@ -1,4 +1,2 @@
-from .planner_agent import PlannerAgent
 from .writer_agent import WriterAgent
 from .examiner_agent import ExaminerAgent
-from .base_agent import BaseAgent
\ No newline at end of file
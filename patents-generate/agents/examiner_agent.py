@@ -1,39 +1,62 @@
 # agents/examiner_agent.py
+import json
+import time
 
-# 假设 PatentDB 稍后会定义，这里先做一个前向声明或简单模拟
-# from database.patent_db import PatentDB
+# patent_db_handler 通常是 database.patent_db.PatentDB，任何提供 search_patents(query, top_k) 的对象都可以
+from utils.content_hash import is_unchanged_since_review, mark_reviewed
+from utils.key_phrases import extract_key_phrases
+from utils.pg_tree import iter_dict_tree
 
 class ExaminerAgent:
-    def __init__(self, patent_db_handler=None):
+    def __init__(self, patent_db_handler=None, max_queries_per_node: int = 3, llm=None, token_tracker=None,
+                 model: str = "deepseek-chat"):
         """
         审查智能体 (Examiner Agent)
         负责审查专利草稿，并利用 RRAG (检索增强生成) 机制提供反馈。
+
+        Args:
+            patent_db_handler: 提供 search_patents(query, top_k) 的检索对象。
+            max_queries_per_node (int): 每个节点最多发出的检索查询数。
+            llm (callable): 可选，prompt -> 文本 的 LLM 调用，用于批量审查 (review_nodes_batch)；为空时使用模拟规则。
+            token_tracker: 可选的 utils.token_tracker.TokenTracker；审查的用量与 WriterAgent 计入同一专利 / 节点的预算。
+            model (str): 生成审查意见使用的模型。
         """
         self.patent_db = patent_db_handler  # 依赖注入 PatentDB 的处理器
+        self.max_queries_per_node = max_queries_per_node
+        self.llm = llm
+        self.token_tracker = token_tracker
+        self.model = model
+        self.review_stats = {"reviewed": 0, "skipped_unchanged": 0}  # 最近一次 review_entire_patent_draft 的统计
         print(f"ExaminerAgent initialized. PatentDB handler: {'Provided' if patent_db_handler else 'Not Provided'}")
 
+    def _select_model(self, patent_id: str = None, node_id: str = None) -> str:
+        """专利或节点超出软预算时改用更便宜的模型。"""
+        return self.token_tracker.select_model(self.model, patent_id, node_id) if self.token_tracker else self.model
+
+    def _record_usage(self, model: str, prompt_tokens: int, completion_tokens: int, start: float,
+                      patent_id: str = None, node_id: str = None):
+        if self.token_tracker:
+            self.token_tracker.record("examiner", model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                      latency=time.perf_counter() - start, patent_id=patent_id, node_id=node_id)
+
     def _identify_key_claims_or_statements(self, pg_tree_node: dict) -> list:
         """
-        (模拟) 从 PGTree 节点的生成内容中识别需要 RRAG 验证的关键声明或技术点。
+        从 PGTree 节点的生成内容中识别需要 RRAG 验证的关键技术特征。
+        权利要求和技术方案按中英文标点切分为技术特征要素，去掉套话和重复要素后按显著性排序，
+        每个节点只取 max_queries_per_node 个短语作为检索查询。
         """
         node_title = pg_tree_node.get("title", "Unknown Node")
         content = pg_tree_node.get("generated_content", "")
         if not content:
             return []
+        # 只对权利要求和技术方案部分做现有技术比对
+        if not ("权利要求" in node_title or "claim" in node_title.lower() or "技术方案" in node_title):
+            return []
 
         print(f"ExaminerAgent: Identifying key statements in '{node_title}' for RRAG.")
-        # 实际应用中，这里可能使用 NLP 技术 (如实体识别、关系抽取) 或 LLM 来提取关键信息。
-        # 简化模拟：假设我们提取内容中的某些关键词或短语作为检索查询。
-        # 例如，如果内容包含“一种新颖的算法”，则可能将其作为检索点。
-
-        # 模拟提取到的需要检索的查询点
-        key_statements_for_retrieval = []
-        if "权利要求" in node_title or "claim" in node_title.lower():  # 对权利要求部分特别关注
-            # 假设权利要求内容中每句话都是一个关键点
-            sentences = [s.strip() for s in content.split('.') if s.strip()]
-            key_statements_for_retrieval.extend(sentences[:2])  # 取前两个句子作为模拟
-        elif "技术方案" in node_title:
-            key_statements_for_retrieval.append(f"现有技术中关于'{content[:30]}...'的方案")
+        # 有检索库时用语料的 idf 衡量词项的区分度，稀有的技术术语排在前面
+        idf = getattr(self.patent_db, "idf", None) if self.patent_db else None
+        key_statements_for_retrieval = extract_key_phrases(content, max_phrases=self.max_queries_per_node, idf=idf)
 
         if key_statements_for_retrieval:
             print(f"ExaminerAgent: Identified for RRAG in '{node_title}': {key_statements_for_retrieval}")
@@ -41,8 +64,8 @@ class ExaminerAgent:
 
     def _perform_retrieval(self, queries: list) -> dict:
         """
-        (模拟) 执行检索操作。
-        实际应用中，会调用 patent_db 的高级搜索功能。
+        执行检索操作：调用 patent_db 的混合检索 (BM25 + 向量)。
+        处理器支持 search_patents_batch 时，所有查询在一次批量检索中完成。
         """
         if not self.patent_db:
             print("ExaminerAgent: PatentDB handler not available. Skipping retrieval.")
@@ -50,17 +73,13 @@ class ExaminerAgent:
 
         retrieval_results = {}
         print(f"ExaminerAgent: Performing retrieval for queries: {queries}")
-        for query in queries:
-            # 模拟调用 patent_db 的搜索方法
-            # search_results = self.patent_db.search_patents(query, top_k=3)
-            # 模拟返回结果
-            search_results = [
-                {"id": "patent_xyz", "title": "相关的现有技术专利XYZ", "similarity": 0.85,
-                 "snippet": "一种类似的现有技术..."},
-                {"id": "paper_abc", "title": "相关的技术论文ABC", "similarity": 0.79, "snippet": "研究表明该领域..."},
-            ]
+        if hasattr(self.patent_db, "search_patents_batch"):
+            batch_results = self.patent_db.search_patents_batch(queries, top_k=3)
+        else:
+            batch_results = [self.patent_db.search_patents(query, top_k=3) for query in queries]
+        for query, search_results in zip(queries, batch_results):
             retrieval_results[query] = search_results
-            print(f"ExaminerAgent: Retrieval for query '{query}' returned {len(search_results)} results (simulated).")
+            print(f"ExaminerAgent: Retrieval for query '{query}' returned {len(search_results)} results.")
         return {"queries_ran": queries, "results": retrieval_results}
 
     def _generate_feedback_with_rag(self, pg_tree_node: dict, retrieval_info: dict) -> str:
@@ -91,7 +110,9 @@ class ExaminerAgent:
         # llm_refined_feedback = llm_call(prompt=f"Original content: {original_content}\nRetrieved_info: {retrieval_info}\nReview and provide feedback.")
 
         # 简单规则：如果检索到信息，标记为需要修改
-        if retrieval_info and retrieval_info.get("results") and any(retrieval_info["results"].values()):
+        # 未配置检索库时 results 是说明文字而不是 {查询: 结果} 字典，按无检索结果处理
+        results = retrieval_info.get("results") if retrieval_info else None
+        if isinstance(results, dict) and any(results.values()):
             pg_tree_node["status"] = "needs_revision"
             feedback += "\n状态更新：此节点标记为 'needs_revision'。\n"
         else:
@@ -102,10 +123,13 @@ class ExaminerAgent:
             f"ExaminerAgent: Feedback for '{node_title}': {feedback.splitlines()[0]}... Status: {pg_tree_node['status']}")
         return feedback
 
-    def review_pg_tree_node(self, pg_tree_node: dict, full_pg_tree: dict):
+    def review_pg_tree_node(self, pg_tree_node: dict, full_pg_tree: dict, force: bool = False, stats: dict = None):
         """
         审查 PGTree 中的单个节点。
+        节点内容的哈希与上次审查时相同时直接沿用上次的结论；force=True 时总是重新审查。
+        stats 为空时计入 self.review_stats；多篇专利共享同一个审查智能体时，由调用方为每次运行传入各自的统计字典。
         """
+        stats = self.review_stats if stats is None else stats
         node_title = pg_tree_node.get("title", "Unknown Node")
         node_status = pg_tree_node.get("status", "unknown")
 
@@ -113,8 +137,19 @@ class ExaminerAgent:
             # print(f"ExaminerAgent: Skipping review for node '{node_title}' with status '{node_status}'.")
             return
 
+        # 内容自上次审查以来没有变化：沿用上次的审查结论和反馈，不再检索和生成反馈
+        if not force and is_unchanged_since_review(pg_tree_node):
+            pg_tree_node["status"] = pg_tree_node["examination_verdict"]
+            stats["skipped_unchanged"] += 1
+            print(f"ExaminerAgent: Node '{node_title}' unchanged since last review. "
+                  f"Keeping verdict '{pg_tree_node['status']}'.")
+            return
+
         print(f"\nExaminerAgent: Reviewing node '{node_title}' (Status: {node_status}).")
         pg_tree_node["status"] = "under_examination"
+        patent_id = (full_pg_tree.get("patent_id") or full_pg_tree.get("id")) if full_pg_tree else None
+        start = time.perf_counter()
+        model = self._select_model(patent_id, pg_tree_node.get("id"))
 
         # 1. 识别关键声明以进行 RRAG
         key_statements = self._identify_key_claims_or_statements(pg_tree_node)
@@ -129,28 +164,211 @@ class ExaminerAgent:
 
         # 3. 生成反馈 (RRAG 的 G部分，结合检索结果)
         feedback = self._generate_feedback_with_rag(pg_tree_node, retrieval_info)
+        # 追踪 token 消耗 (模拟：按字符数估算，提示包括节点内容和检索结果；接入 LLM 后改为响应中的 usage)
+        prompt_chars = len(pg_tree_node.get("generated_content", "")) + len(str((retrieval_info or {}).get("results", "")))
+        self._record_usage(model, prompt_chars, len(feedback), start, patent_id, pg_tree_node.get("id"))
 
         # 存储反馈到节点中 (可以定义一个新字段，如 'examination_feedback')
         pg_tree_node["examination_feedback"] = feedback
+        mark_reviewed(pg_tree_node)  # 记录内容哈希和审查结论，下一轮内容未变时跳过
+        stats["reviewed"] += 1
 
         # print(f"ExaminerAgent: Node '{node_title}' review complete. New status: {pg_tree_node['status']}")
 
-    def review_entire_patent_draft(self, pg_tree_root: dict):
+    # --- 批量审查 ---
+    @staticmethod
+    def _group_by_retrieval_overlap(node_hits: list, max_group_size: int, min_overlap: float) -> list:
         """
-        递归审查整个 PGTree 草稿。
+        按检索命中的文档集合贪心分组：与某组已有命中集合的 Jaccard 相似度达到 min_overlap 的节点加入该组，
+        组内的现有技术片段只需要发送一次。没有命中的节点单独成组 (同样按 max_group_size 合并)。
         """
-        # 审查当前节点 (如果其内容已生成)
-        if pg_tree_root.get("generated_content") and pg_tree_root.get("status") == "completed":
-            self.review_pg_tree_node(pg_tree_root, pg_tree_root)  # 简化：full_pg_tree 传入自身
-
-        # 递归审查子节点
-        for child_node in pg_tree_root.get("children", []):
-            self.review_entire_patent_draft(child_node)
-
+        groups = []  # [(命中文档 id 集合, [节点, ...])]
+        no_hits = []
+        for node, hits in node_hits:
+            if not hits:
+                no_hits.append(node)
+                continue
+            best, best_overlap = None, min_overlap
+            for group in groups:
+                if len(group[1]) >= max_group_size:
+                    continue
+                overlap = len(hits & group[0]) / len(hits | group[0])
+                if overlap >= best_overlap:
+                    best, best_overlap = group, overlap
+            if best is None:
+                groups.append((set(hits), [node]))
+            else:
+                best[0].update(hits)
+                best[1].append(node)
+        grouped = [nodes for _, nodes in groups]
+        grouped += [no_hits[i:i + max_group_size] for i in range(0, len(no_hits), max_group_size)]
+        return grouped
+
+    def _build_batch_prompt(self, group: list, shared_snippets: dict, node_queries: dict) -> str:
+        """一组节点共用一个提示：现有技术片段按文档 id 列出一次，各节点只引用文档 id。"""
+        lines = ["你是专利审查员。请对照下列现有技术，逐个审查专利草稿节点的新颖性和创造性。", "", "## 现有技术"]
+        for doc_id, result in shared_snippets.items():
+            lines.append(f"[{doc_id}] {result['title']}: {result['snippet']}")
+        if not shared_snippets:
+            lines.append("(未检索到相关现有技术)")
+        lines += ["", "## 待审查节点"]
+        for node in group:
+            cited = ", ".join(node_queries[node["id"]][1]) or "无"
+            lines.append(f"### 节点 {node['id']} — {node.get('title', '')} (相关现有技术: {cited})")
+            lines.append(node.get("generated_content", ""))
+        lines += ["", "请只输出 JSON：{\"<节点 id>\": {\"status\": \"needs_revision\" 或 \"approved_by_examiner\", "
+                      "\"feedback\": \"审查意见\"}, ...}，每个节点一项。"]
+        return "\n".join(lines)
+
+    def _simulated_verdict(self, node: dict, cited: list, shared_snippets: dict) -> dict:
+        """(模拟) 与 _generate_feedback_with_rag 相同的规则：有相关现有技术时要求修改。"""
+        feedback = f"对节点 '{node.get('title', 'Unknown Node')}' 的审查意见：\n"
+        if cited:
+            feedback += "相关现有技术：\n"
+            for doc_id in cited:
+                result = shared_snippets[doc_id]
+                feedback += f"    - [{doc_id}] {result['title']} (相似度: {result['similarity']:.2f})\n"
+            feedback += "建议：请确认技术方案相对上述现有技术的新颖性和创造性，补充差异化特征。\n"
+            return {"status": "needs_revision", "feedback": feedback}
+        feedback += "未检索到强相关的现有技术。请常规检查内容的清晰度和完整性。\n"
+        return {"status": "approved_by_examiner", "feedback": feedback}
+
+    def _generate_batch_verdicts(self, group: list, shared_snippets: dict, node_queries: dict,
+                                 patent_id: str = None) -> dict:
+        """
+        一次 LLM 调用生成一组节点的结构化结论；LLM 不可用或输出无法解析的节点回退到模拟规则。
+        一次调用的 token 用量按节点平均分摊，计入各节点和所属专利的预算。
+        """
+        verdicts = {}
+        if self.llm is not None:
+            prompt = self._build_batch_prompt(group, shared_snippets, node_queries)
+            start = time.perf_counter()
+            model = self._select_model(patent_id)
+            response = None
+            try:
+                response = self.llm(prompt)
+                text = getattr(response, "content", response)
+                parsed = json.loads(text[text.index("{"):text.rindex("}") + 1])
+                verdicts = {node_id: verdict for node_id, verdict in parsed.items()
+                            if isinstance(verdict, dict) and verdict.get("status") in ("needs_revision", "approved_by_examiner")}
+            except Exception as e:
+                print(f"ExaminerAgent: Batch verdict generation failed ({type(e).__name__}: {e}). Using fallback rules.")
+            # 响应带 usage_metadata (LangChain) 时使用实际用量，否则按字符数估算
+            usage = getattr(response, "usage_metadata", None) or {}
+            prompt_tokens = usage.get("input_tokens", len(prompt))
+            completion_tokens = usage.get("output_tokens", len(str(getattr(response, "content", response) or "")))
+            for node in group:
+                self._record_usage(model, prompt_tokens // len(group), completion_tokens // len(group), start,
+                                   patent_id, node["id"])
+        for node in group:
+            if node["id"] not in verdicts:
+                start = time.perf_counter()
+                verdicts[node["id"]] = self._simulated_verdict(node, node_queries[node["id"]][1], shared_snippets)
+                if self.llm is None:  # (模拟) 与 review_pg_tree_node 相同，按字符数估算用量
+                    self._record_usage(self._select_model(patent_id, node["id"]), len(node.get("generated_content", "")),
+                                       len(verdicts[node["id"]]["feedback"]), start, patent_id, node["id"])
+        return verdicts
+
+    def review_nodes_batch(self, nodes: list, force: bool = False, max_group_size: int = 4,
+                           min_overlap: float = 0.3, patent_id: str = None) -> dict:
+        """
+        批量审查多个节点：
+        1. 所有节点的检索查询合并为一次批量检索；
+        2. 按检索命中的重叠程度把节点分组，每组只调用一次 LLM，组内共享的现有技术片段只发送一次；
+        3. 返回并写回每个节点的结构化结论。内容未变化的节点与 review_pg_tree_node 一样沿用上次结论。
+
+        Args:
+            nodes (list): 待审查的 PGTree 节点 (只处理状态为 completed / needs_review 的节点)。
+            force (bool): 为 True 时忽略内容哈希，总是重新审查。
+            max_group_size (int): 每次 LLM 调用最多审查的节点数。
+            min_overlap (float): 分组时命中文档集合的最小 Jaccard 相似度。
+            patent_id (str): 节点所属的专利，LLM 用量计入它的 token 预算。
+
+        Returns:
+            dict: 节点 id -> {"status", "feedback"}。
+        """
+        pending = []
+        for node in nodes:
+            if node.get("status") not in ("completed", "needs_review"):
+                continue
+            if not force and is_unchanged_since_review(node):
+                node["status"] = node["examination_verdict"]
+                self.review_stats["skipped_unchanged"] += 1
+                continue
+            node["status"] = "under_examination"
+            pending.append(node)
+        if not pending:
+            return {}
+
+        # 1. 一次批量检索
+        node_statements = {node["id"]: self._identify_key_claims_or_statements(node) for node in pending}
+        all_queries = list(dict.fromkeys(query for queries in node_statements.values() for query in queries))
+        retrieval = self._perform_retrieval(all_queries) if all_queries else {"results": {}}
+        results_by_query = retrieval["results"] if isinstance(retrieval.get("results"), dict) else {}
+
+        # 2. 每个节点命中的文档，以及按文档 id 去重的片段
+        snippets, node_queries, node_hits = {}, {}, []
+        for node in pending:
+            cited = []
+            for query in node_statements[node["id"]]:
+                for result in results_by_query.get(query, []):
+                    snippets.setdefault(result["id"], result)
+                    if result["id"] not in cited:
+                        cited.append(result["id"])
+            node_queries[node["id"]] = (node_statements[node["id"]], cited)
+            node_hits.append((node, set(cited)))
+
+        # 3. 分组生成结论并写回节点
+        verdicts = {}
+        groups = self._group_by_retrieval_overlap(node_hits, max_group_size, min_overlap)
+        for group in groups:
+            shared = {doc_id: snippets[doc_id] for node in group for doc_id in node_queries[node["id"]][1]}
+            group_verdicts = self._generate_batch_verdicts(group, shared, node_queries, patent_id)
+            for node in group:
+                verdict = group_verdicts[node["id"]]
+                node["status"] = verdict["status"]
+                node["examination_feedback"] = verdict["feedback"]
+                mark_reviewed(node)
+                self.review_stats["reviewed"] += 1
+                verdicts[node["id"]] = {"status": verdict["status"], "feedback": verdict["feedback"]}
+        self.review_stats["batch_groups"] = self.review_stats.get("batch_groups", 0) + len(groups)
+        print(f"ExaminerAgent: Batch-reviewed {len(pending)} node(s) in {len(groups)} group(s), "
+              f"{len(snippets)} distinct prior-art document(s).")
+        return verdicts
+
+    def review_entire_patent_draft(self, pg_tree_root: dict, force: bool = False, batch: bool = False):
+        """
+        审查整个 PGTree 草稿。自上次审查以来内容未变化的节点沿用上次的结论，
+        因此修订轮次的开销只与实际被修改的节点数量相关。统计结果见 self.review_stats。
+        batch=True 时使用 review_nodes_batch，按检索结果的重叠把节点分组审查。
+        """
+        self.review_stats = {"reviewed": 0, "skipped_unchanged": 0}
+        cached_db = hasattr(self.patent_db, "reset_stats")  # database.retrieval_cache.CachedPatentDB
+        if cached_db:
+            self.patent_db.reset_stats()
+        if batch:
+            self.review_nodes_batch([node for node in iter_dict_tree(pg_tree_root) if node.get("generated_content")],
+                                    force=force, patent_id=pg_tree_root.get("patent_id") or pg_tree_root.get("id"))
+        else:
+            self._review_subtree(pg_tree_root, force)
+        print(f"ExaminerAgent: Review pass finished. Reviewed {self.review_stats['reviewed']} node(s), "
+              f"skipped {self.review_stats['skipped_unchanged']} unchanged node(s).")
+        if cached_db:
+            self.review_stats["retrieval_cache"] = dict(self.patent_db.stats, hit_ratio=self.patent_db.hit_ratio())
+            print(f"ExaminerAgent: Retrieval cache hit ratio {self.patent_db.hit_ratio():.1%} "
+                  f"({self.patent_db.stats}).")
         return pg_tree_root
 
+    def _review_subtree(self, pg_tree_root: dict, force: bool):
+        """按先序迭代审查子树中内容已生成的节点。"""
+        for node in iter_dict_tree(pg_tree_root):
+            if node.get("generated_content") and node.get("status") in ("completed", "needs_review"):
+                self.review_pg_tree_node(node, pg_tree_root, force=force)
+
 
 # 示例用法 (用于测试)
+# 在 patents-generate 目录下以模块方式运行，使 utils 等包可以导入：python -m agents.examiner_agent
+# (需要 agents/planner_agent.py 提供 PlannerAgent)
 if __name__ == '__main__':
     # 模拟 PatentDB 处理器
     class MockPatentDB:
@@ -161,8 +379,8 @@ if __name__ == '__main__':
 
 
     # 先创建 Planner 和 Writer 来生成草稿
-    from planner_agent import PlannerAgent
-    from writer_agent import WriterAgent
+    from agents.planner_agent import PlannerAgent
+    from agents.writer_agent import WriterAgent
 
     planner = PlannerAgent()
     writer = WriterAgent()
@@ -185,13 +403,12 @@ if __name__ == '__main__':
 
     # print(json.dumps(examined_draft, indent=2, ensure_ascii=False))
 
-    def print_pg_tree_examination_status(node, indent_level=0):
-        print("  " * indent_level + f"- {node['title']} (ID: {node['id']}, Status: {node['status']})")
-        if node.get('examination_feedback'):
-            feedback_summary = node['examination_feedback'].splitlines()
-            print("  " * (indent_level + 1) + f"  Feedback: {feedback_summary[0]}...")
-        for child in node.get('children', []):
-            print_pg_tree_examination_status(child, indent_level + 1)
+    def print_pg_tree_examination_status(root):
+        for node, indent_level in iter_dict_tree(root, with_depth=True):
+            print("  " * indent_level + f"- {node['title']} (ID: {node['id']}, Status: {node['status']})")
+            if node.get('examination_feedback'):
+                feedback_summary = node['examination_feedback'].splitlines()
+                print("  " * (indent_level + 1) + f"  Feedback: {feedback_summary[0]}...")
 
 
     print("\nPGTree Structure with Examination Status:")
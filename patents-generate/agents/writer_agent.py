@@ -1,14 +1,37 @@
 # agents/writer_agent.py
+import asyncio
+import time
+
+from utils.content_hash import mark_written
+from utils.pg_tree import iter_dict_tree
+
+# 按章节标题声明的内容依赖：标题包含键的节点，要等标题包含任一值的节点写完后再写
+# 例如权利要求需要以技术方案为基础。节点也可以用 "depends_on": [节点 id, ...] 显式声明依赖。
+DEFAULT_SECTION_DEPENDENCIES = {
+    "权利要求": ["技术方案"],
+}
+
 
 class WriterAgent:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 4, section_dependencies: dict = None, token_tracker=None,
+                 model: str = "deepseek-chat"):
         """
         编写智能体 (Writer Agent)
         负责根据 PGTree 结构撰写专利的具体内容。
+
+        Args:
+            max_concurrency (int): 异步填充 (apopulate_pg_tree) 时同时生成的节点数上限。
+            section_dependencies (dict): 按标题关键字声明的章节依赖，默认为 DEFAULT_SECTION_DEPENDENCIES。
+            token_tracker: 可选的 utils.token_tracker.TokenTracker，记录用量并在超出软预算时降级模型。
+            model (str): 生成内容使用的模型。
         """
+        self.max_concurrency = max_concurrency
+        self.section_dependencies = DEFAULT_SECTION_DEPENDENCIES if section_dependencies is None else section_dependencies
+        self.token_tracker = token_tracker
+        self.model = model
         print("WriterAgent initialized.")
 
-    def _write_node_content(self, pg_tree_node: dict, full_pg_tree: dict) -> str:
+    def _write_node_content(self, pg_tree_node: dict, full_pg_tree: dict, context: dict = None) -> str:
         """
         (模拟)为 PGTree 中的单个节点生成内容。
         在实际应用中，这里会调用 LLM 或其他内容生成逻辑。
@@ -16,6 +39,8 @@ class WriterAgent:
         Args:
             pg_tree_node (dict): 当前需要填充内容的 PGTree 节点。
             full_pg_tree (dict): 完整的 PGTree，可能用于获取上下文信息。
+            context (dict): 已生成的上下文，包含 parent (父节点内容)、siblings 和 dependencies
+                            (兄弟节点 / 依赖节点的 {标题: 内容})；修订时还包含 examination_feedback (审查意见)。
 
         Returns:
             str: 为该节点生成的内容。
@@ -23,6 +48,10 @@ class WriterAgent:
         node_id = pg_tree_node["id"]
         node_title = pg_tree_node["title"]
         guideline = pg_tree_node["content_guideline"]
+        patent_id = (full_pg_tree.get("patent_id") or full_pg_tree.get("id")) if full_pg_tree else None
+        start = time.perf_counter()
+        # 专利或节点超出软预算时改用更便宜的模型
+        model = self.token_tracker.select_model(self.model, patent_id, node_id) if self.token_tracker else self.model
 
         # 模拟内容生成
         print(f"WriterAgent: Writing content for node '{node_title}' (ID: {node_id}) based on guideline: '{guideline}'")
@@ -36,15 +65,18 @@ class WriterAgent:
         # 模拟LLM返回的内容
         generated_text = f"[这是为 '{node_title}' (ID: {node_id}) 生成的模拟内容。遵循指南：'{guideline}。']"
 
-        # 模拟token消耗的追踪 (如果TokenTracker集成在此处)
-        # self.token_tracker.add_tokens("writer_agent_generation", len(generated_text))
+        # 追踪 token 消耗 (模拟：按字符数估算；接入 LLM 后改为响应中的 usage)
+        if self.token_tracker:
+            prompt_chars = len(guideline) + sum(len(str(value)) for value in (context or {}).values())
+            self.token_tracker.record("writer", model, prompt_tokens=prompt_chars, completion_tokens=len(generated_text),
+                                      latency=time.perf_counter() - start, patent_id=patent_id, node_id=node_id)
 
         return generated_text
 
     def populate_pg_tree(self, pg_tree_root: dict) -> dict:
         """
-        遍历 PGTree 并为每个需要填充的节点生成内容。
-        这是一个递归函数。
+        按先序遍历 PGTree 并为每个需要填充的节点生成内容。
+        遍历是迭代实现的 (utils.pg_tree.iter_dict_tree)，深层树不会触发递归深度限制。
 
         Args:
             pg_tree_root (dict): PGTree 的根节点或当前处理的子树的根节点。
@@ -52,29 +84,153 @@ class WriterAgent:
         Returns:
             dict: 更新了 generated_content 和 status 的 PGTree。
         """
-        if pg_tree_root["status"] == "pending":  # 只处理待处理的节点
-            # 检查是否有 content_guideline，表明这是一个需要填充内容的叶节点或父节点本身也需要内容
-            if pg_tree_root.get("content_guideline"):
-                pg_tree_root["status"] = "in_progress"
-                # print(f"WriterAgent: Processing node '{pg_tree_root['title']}' for content generation.")
-
-                # 调用内部方法生成内容
-                generated_content = self._write_node_content(pg_tree_root, pg_tree_root)  # 简化：这里 full_pg_tree 传入自身
-                pg_tree_root["generated_content"] = generated_content
-                pg_tree_root["status"] = "completed"  # 假设一次性完成，实际可能需要更复杂的状态管理
-                print(f"WriterAgent: Node '{pg_tree_root['title']}' content generated and status set to 'completed'.")
-
-        # 递归处理子节点
-        for child_node in pg_tree_root.get("children", []):
-            self.populate_pg_tree(child_node)  # 递归调用
+        for node in iter_dict_tree(pg_tree_root):
+            # 只处理待处理、且有 content_guideline (表明需要填充内容) 的节点
+            if node["status"] != "pending" or not node.get("content_guideline"):
+                continue
+            node["status"] = "in_progress"
+            # print(f"WriterAgent: Processing node '{node['title']}' for content generation.")
+
+            # 调用内部方法生成内容
+            node["generated_content"] = self._write_node_content(node, pg_tree_root)
+            mark_written(node)
+            node["status"] = "completed"  # 假设一次性完成，实际可能需要更复杂的状态管理
+            print(f"WriterAgent: Node '{node['title']}' content generated and status set to 'completed'.")
+
+        return pg_tree_root
+
+    async def _awrite_node_content(self, pg_tree_node: dict, full_pg_tree: dict, context: dict) -> str:
+        """
+        异步生成单个节点的内容。默认在线程池中执行 _write_node_content；
+        接入支持异步调用的 LLM 客户端时可以直接重写此方法。
+        """
+        return await asyncio.to_thread(self._write_node_content, pg_tree_node, full_pg_tree, context)
+
+    def _collect_writable_nodes(self, pg_tree_root: dict) -> tuple:
+        """迭代遍历 PGTree，返回 (id -> 节点, id -> 父节点) 以及待写节点 id 列表 (保持树的先序顺序)。"""
+        nodes, parents, writable = {}, {}, []
+        for node in iter_dict_tree(pg_tree_root):
+            nodes[node["id"]] = node
+            parents.setdefault(node["id"], None)
+            for child in node.get("children", []):
+                parents[child["id"]] = node
+            if node["status"] == "pending" and node.get("content_guideline"):
+                writable.append(node["id"])
+        return nodes, parents, writable
+
+    def _resolve_dependencies(self, nodes: dict, parents: dict, writable: list) -> dict:
+        """
+        每个待写节点需要等待的节点 id：
+        1. 父节点本身也在待写列表中时，先写父节点 (子节点以父节点内容为上下文)；
+        2. 节点的 "depends_on" 显式声明；
+        3. section_dependencies 中按标题关键字声明的章节依赖。
+        """
+        writable_set = set(writable)
+        dependencies = {}
+        for node_id in writable:
+            node = nodes[node_id]
+            deps = set()
+            parent = parents[node_id]
+            if parent is not None and parent["id"] in writable_set:
+                deps.add(parent["id"])
+            for dep_id in node.get("depends_on", []):
+                if dep_id not in nodes:
+                    raise ValueError(f"Node '{node_id}' depends on unknown node '{dep_id}'")
+                if dep_id in writable_set:
+                    deps.add(dep_id)
+            for keyword, required in self.section_dependencies.items():
+                if keyword in node.get("title", ""):
+                    deps.update(other for other in writable
+                                if other != node_id and any(r in nodes[other].get("title", "") for r in required))
+            dependencies[node_id] = deps
+
+        # 检测循环依赖 (Kahn 算法)
+        remaining = {node_id: set(deps) for node_id, deps in dependencies.items()}
+        ready = [node_id for node_id, deps in remaining.items() if not deps]
+        resolved = 0
+        while ready:
+            done = ready.pop()
+            resolved += 1
+            for node_id, deps in remaining.items():
+                if done in deps:
+                    deps.discard(done)
+                    if not deps:
+                        ready.append(node_id)
+        if resolved != len(remaining):
+            cycle = sorted(node_id for node_id, deps in remaining.items() if deps)
+            raise ValueError(f"Circular content dependencies between nodes: {cycle}")
+        return dependencies
+
+    def _build_context(self, node_id: str, nodes: dict, parents: dict, dependencies: set) -> dict:
+        """收集已生成的父节点、兄弟节点和依赖节点内容，作为生成当前节点的上下文。"""
+        parent = parents[node_id]
+        siblings = {}
+        if parent is not None:
+            siblings = {child["title"]: child["generated_content"] for child in parent.get("children", [])
+                        if child["id"] != node_id and child.get("generated_content")}
+        return {
+            "parent": parent.get("generated_content", "") if parent is not None else "",
+            "siblings": siblings,
+            "dependencies": {nodes[dep_id]["title"]: nodes[dep_id]["generated_content"] for dep_id in dependencies
+                             if nodes[dep_id].get("generated_content") and nodes[dep_id] is not parent},
+        }
+
+    async def apopulate_pg_tree(self, pg_tree_root: dict, max_concurrency: int = None) -> dict:
+        """
+        异步填充 PGTree：互不依赖的节点 (如不同章节的子树) 并发生成，最多同时生成 max_concurrency 个；
+        有依赖的节点在其依赖写完后才开始，并以已生成的父节点、兄弟节点和依赖节点内容为上下文。
+        某个节点生成失败时，该节点恢复为 pending 并记录 write_error，依赖它的节点跳过本轮 (保持 pending)。
+
+        Args:
+            pg_tree_root (dict): PGTree 的根节点。
+            max_concurrency (int): 并发上限，默认使用初始化时的 max_concurrency。
+
+        Returns:
+            dict: 更新了 generated_content 和 status 的 PGTree。
+        """
+        nodes, parents, writable = self._collect_writable_nodes(pg_tree_root)
+        dependencies = self._resolve_dependencies(nodes, parents, writable)
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        finished = {node_id: asyncio.Event() for node_id in writable}
+        succeeded = set()
+
+        async def write(node_id: str):
+            node = nodes[node_id]
+            try:
+                for dep_id in dependencies[node_id]:
+                    await finished[dep_id].wait()
+                failed_deps = [dep_id for dep_id in dependencies[node_id] if dep_id not in succeeded]
+                if failed_deps:
+                    print(f"WriterAgent: Skipping node '{node['title']}' because dependencies failed: {failed_deps}")
+                    return
+                async with semaphore:
+                    node["status"] = "in_progress"
+                    context = self._build_context(node_id, nodes, parents, dependencies[node_id])
+                    try:
+                        node["generated_content"] = await self._awrite_node_content(node, pg_tree_root, context)
+                    except Exception as e:
+                        node["status"] = "pending"
+                        node["write_error"] = f"{type(e).__name__}: {e}"
+                        print(f"WriterAgent: Failed to write node '{node['title']}': {node['write_error']}")
+                        return
+                    mark_written(node)
+                    node.pop("write_error", None)
+                    node["status"] = "completed"
+                    succeeded.add(node_id)
+                    print(f"WriterAgent: Node '{node['title']}' content generated and status set to 'completed'.")
+            finally:
+                finished[node_id].set()
 
+        await asyncio.gather(*(write(node_id) for node_id in writable))
         return pg_tree_root
 
 
 # 示例用法 (用于测试)
+# 在 patents-generate 目录下以模块方式运行，使 utils 等包可以导入：python -m agents.writer_agent
+# (需要 agents/planner_agent.py 提供 PlannerAgent)
 if __name__ == '__main__':
     # 先创建一个 PlannerAgent 来生成计划
-    from planner_agent import PlannerAgent
+    from agents.planner_agent import PlannerAgent
 
     planner = PlannerAgent()
     idea = "一种可折叠的便携式太阳能充电器"
@@ -88,18 +244,18 @@ if __name__ == '__main__':
     # 创建 WriterAgent 并填充 PGTree
     writer = WriterAgent()
     populated_tree = writer.populate_pg_tree(patent_plan_tree)
+    # 或者并发填充：populated_tree = asyncio.run(writer.apopulate_pg_tree(patent_plan_tree))
 
     print("\n--- Populated PGTree (after writing) ---")
 
 
     # print(json.dumps(populated_tree, indent=2, ensure_ascii=False))
 
-    def print_pg_tree_content_status(node, indent_level=0):
-        print("  " * indent_level + f"- {node['title']} (ID: {node['id']}, Status: {node['status']})")
-        if node['generated_content']:
-            print("  " * (indent_level + 1) + f"  Content: {node['generated_content'][:100]}...")  # 打印部分内容
-        for child in node.get('children', []):
-            print_pg_tree_content_status(child, indent_level + 1)
+    def print_pg_tree_content_status(root):
+        for node, indent_level in iter_dict_tree(root, with_depth=True):
+            print("  " * indent_level + f"- {node['title']} (ID: {node['id']}, Status: {node['status']})")
+            if node['generated_content']:
+                print("  " * (indent_level + 1) + f"  Content: {node['generated_content'][:100]}...")  # 打印部分内容
 
 
     print("\nPGTree Structure with Content Status:")
@@ -0,0 +1,2 @@
+from .coordinator import Coordinator
+from .batch_runner import BatchRunner, FairScheduler
\ No newline at end of file
@@ -0,0 +1,177 @@
+# coordinator/batch_runner.py
+import asyncio
+import collections
+import contextlib
+import time
+
+from coordinator.coordinator import Coordinator
+
+
+class FairScheduler:
+    def __init__(self, max_concurrency: int = 8):
+        """
+        多篇专利共享的 LLM 调用槽位。槽位空闲时按平滑加权轮询 (smooth weighted round-robin)
+        在 "有等待请求的专利" 之间分配：权重为 w 的专利大约获得 w / 总权重 的槽位，
+        节点很多的大树只是排队更长，不会挤占其他专利的份额。
+        """
+        self.max_concurrency = max_concurrency
+        self._free = max_concurrency
+        self._weights = {}
+        self._current = {}  # 平滑加权轮询的当前值
+        self._waiters = {}  # 专利 -> deque[Future]
+        self.grants = collections.Counter()  # 每篇专利获得的槽位次数
+
+    def register(self, patent_id: str, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError(f"Scheduling weight for '{patent_id}' must be positive, got {weight}")
+        self._weights[patent_id] = weight
+        self._current.setdefault(patent_id, 0.0)
+        self._waiters.setdefault(patent_id, collections.deque())
+
+    def _next_patent(self):
+        candidates = [patent_id for patent_id, waiters in self._waiters.items() if waiters]
+        if not candidates:
+            return None
+        total = sum(self._weights[patent_id] for patent_id in candidates)
+        for patent_id in candidates:
+            self._current[patent_id] += self._weights[patent_id]
+        chosen = max(candidates, key=lambda patent_id: self._current[patent_id])
+        self._current[chosen] -= total
+        return chosen
+
+    def _dispatch(self):
+        while self._free > 0:
+            patent_id = self._next_patent()
+            if patent_id is None:
+                return
+            future = self._waiters[patent_id].popleft()
+            if future.done():  # 等待者已被取消
+                continue
+            self._free -= 1
+            self.grants[patent_id] += 1
+            future.set_result(None)
+
+    async def acquire(self, patent_id: str):
+        if self._free > 0 and not any(self._waiters.values()):
+            self._free -= 1
+            self.grants[patent_id] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[patent_id].append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():  # 已分到槽位后才被取消，归还槽位
+                self.release()
+            raise
+
+    def release(self):
+        self._free += 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, patent_id: str):
+        await self.acquire(patent_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class BatchRunner:
+    def __init__(self, planner_agent, writer_agent, examiner_agent, max_concurrency: int = 8,
+                 max_rounds: int = 3, draft_store=None, token_tracker=None):
+        """
+        多篇专利的批量生成：每个发明构思依次经过规划、写作和审查 (Coordinator 的流水线)，
+        所有专利并发推进，共享同一组智能体 (LLM 客户端、PatentDB 检索缓存等) 和 FairScheduler 的槽位。
+
+        Args:
+            planner_agent: 提供 generate_patent_plan(idea) -> PGTree 的规划智能体。
+            writer_agent: WriterAgent 实例。
+            examiner_agent: ExaminerAgent 实例。
+            max_concurrency (int): 所有专利合计同时进行的规划、写作和审查调用数。
+            max_rounds (int): 每个节点的最大写作轮数。
+            draft_store: 可选的 DraftStore，每篇专利以 patent_id 作为草稿标识保存检查点。
+            token_tracker: 可选的 TokenTracker，按 patent_id 统计用量和执行预算。
+        """
+        self.planner = planner_agent
+        self.writer = writer_agent
+        self.examiner = examiner_agent
+        self.max_concurrency = max_concurrency
+        self.max_rounds = max_rounds
+        self.draft_store = draft_store
+        self.token_tracker = token_tracker
+        self.report = {}
+        print(f"BatchRunner initialized. max_concurrency={max_concurrency}")
+
+    @staticmethod
+    def _normalize_ideas(ideas: list) -> list:
+        """接受字符串或 {"idea", "patent_id", "weight"} 字典，返回统一的字典列表。"""
+        jobs = []
+        for i, item in enumerate(ideas):
+            job = {"idea": item} if isinstance(item, str) else dict(item)
+            job.setdefault("patent_id", f"patent_{i + 1:03d}")
+            job.setdefault("weight", 1.0)
+            jobs.append(job)
+        if len({job["patent_id"] for job in jobs}) != len(jobs):
+            raise ValueError("Duplicate patent_id in batch")
+        return jobs
+
+    async def _run_one(self, job: dict, scheduler: FairScheduler, batch_start: float) -> dict:
+        patent_id = job["patent_id"]
+        result = {"patent_id": patent_id, "idea": job["idea"], "status": "failed", "tree": None, "error": None}
+        try:
+            async with scheduler.slot(patent_id):
+                pg_tree = await asyncio.to_thread(self.planner.generate_patent_plan, job["idea"])
+            pg_tree["patent_id"] = patent_id  # 预算和用量按专利统计，避免不同规划树的根节点 id 相同
+            coordinator = Coordinator(self.writer, self.examiner, max_rounds=self.max_rounds,
+                                      draft_store=self.draft_store, token_tracker=self.token_tracker)
+            result["tree"] = await coordinator.run(pg_tree, draft_id=patent_id,
+                                                   slot=lambda: scheduler.slot(patent_id))
+            result["stats"] = coordinator.stats
+            result["status"] = "completed"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            print(f"BatchRunner: Patent '{patent_id}' failed: {result['error']}")
+        result["latency"] = round(time.perf_counter() - batch_start, 3)
+        return result
+
+    async def run(self, ideas: list) -> list:
+        """
+        并发生成一批专利草稿。
+
+        Args:
+            ideas (list): 发明构思字符串，或 {"idea", "patent_id", "weight"} 字典 (weight 越大分到的槽位越多)。
+
+        Returns:
+            list: 每篇专利的 {"patent_id", "idea", "status", "tree", "latency", "stats", "error"}，与 ideas 顺序一致。
+                  批次汇总 (吞吐量、延迟分位数、各专利获得的槽位数) 见 self.report。
+        """
+        jobs = self._normalize_ideas(ideas)
+        scheduler = FairScheduler(self.max_concurrency)
+        for job in jobs:
+            scheduler.register(job["patent_id"], job["weight"])
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._run_one(job, scheduler, start) for job in jobs))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(result["latency"] for result in results)
+        completed = [result for result in results if result["status"] == "completed"]
+        nodes_written = sum(result.get("stats", {}).get("writes", 0) for result in completed)
+        self.report = {
+            "patents": len(results),
+            "completed": len(completed),
+            "elapsed": round(elapsed, 3),
+            "patents_per_hour": round(len(completed) / elapsed * 3600, 1) if elapsed > 0 else 0.0,
+            "node_writes_per_second": round(nodes_written / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_max": latencies[-1] if latencies else 0.0,
+            "slot_grants": dict(scheduler.grants),
+        }
+        print(f"BatchRunner: {self.report['completed']}/{self.report['patents']} patent(s) in {self.report['elapsed']}s "
+              f"({self.report['patents_per_hour']} patents/hour). Latency p50 {self.report['latency_p50']}s, "
+              f"max {self.report['latency_max']}s.")
+        for result in results:
+            print(f"  - {result['patent_id']}: {result['status']}, {result['latency']}s")
+        return results
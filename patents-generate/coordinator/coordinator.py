@@ -0,0 +1,162 @@
+# coordinator/coordinator.py
+import asyncio
+import time
+
+from utils.content_hash import mark_written
+
+# 协调器可以直接接手的节点状态：pending 需要先写，completed / needs_review 需要先审查，needs_revision 需要按反馈重写
+_SCHEDULABLE_STATUSES = ("pending", "completed", "needs_review", "needs_revision")
+
+
+class Coordinator:
+    def __init__(self, writer_agent, examiner_agent, max_concurrency: int = 4, max_rounds: int = 3,
+                 draft_store=None, checkpoint_interval: float = 30.0, token_tracker=None):
+        """
+        协调器 (Coordinator)
+        以流水线方式编排写作和审查：WriterAgent 写完一个节点后立即交给 ExaminerAgent 审查，
+        被标记为 needs_revision 的节点带着审查意见回到写作阶段，其他节点的写作和审查同时进行。
+        整篇专利的耗时由依赖关系上的关键路径决定，而不是 "轮数 x 树的大小"。
+
+        Args:
+            writer_agent: WriterAgent 实例 (使用其依赖解析、上下文构建和 _awrite_node_content)。
+            examiner_agent: ExaminerAgent 实例。
+            max_concurrency (int): 同时进行的写作和审查调用总数上限。
+            max_rounds (int): 每个节点最多写作 (含修订) 的次数，达到上限后保留 needs_revision 状态。
+            draft_store: 可选的 database.draft_store.DraftStore，用于周期性保存检查点。
+            checkpoint_interval (float): 两次检查点之间的最短间隔 (秒)。
+            token_tracker: 可选的 TokenTracker (默认使用 writer_agent.token_tracker)；
+                           专利或节点超出硬预算时不再开始新的写作或修订。
+        """
+        self.writer = writer_agent
+        self.examiner = examiner_agent
+        self.max_concurrency = max_concurrency
+        self.max_rounds = max_rounds
+        self.draft_store = draft_store
+        self.checkpoint_interval = checkpoint_interval
+        self.token_tracker = token_tracker or getattr(writer_agent, "token_tracker", None)
+        self.stats = {}
+        print(f"Coordinator initialized. max_concurrency={max_concurrency}, max_rounds={max_rounds}")
+
+    def _checkpoint(self, draft_id: str, pg_tree_root: dict, force: bool = False):
+        if self.draft_store is None or draft_id is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_checkpoint >= self.checkpoint_interval:
+            self.draft_store.save_revision(draft_id, pg_tree_root)
+            self._last_checkpoint = now
+
+    async def run(self, pg_tree_root: dict, draft_id: str = None, slot=None) -> dict:
+        """
+        生成并审查整棵 PGTree，直到所有节点通过审查、达到修订上限或写作失败。
+
+        Args:
+            pg_tree_root (dict): PlannerAgent 生成的 PGTree (也可以是从 DraftStore 恢复的部分完成的草稿)。
+                                 根节点的 patent_id (批量运行时设置，缺省为根节点 id) 用于 token 预算。
+            draft_id (str): 配置了 draft_store 时用于保存检查点的草稿标识。
+            slot (callable): 可选，返回异步上下文管理器的函数，每次写作或审查调用前进入。
+                             多篇专利共享 LLM 时由批量运行器传入 (见 batch_runner.FairScheduler)，
+                             默认使用本次运行自己的 max_concurrency 信号量。
+
+        Returns:
+            dict: 更新后的 PGTree。统计信息见 self.stats (审查智能体的统计在 self.stats["review"] 中)。
+        """
+        start = time.perf_counter()
+        nodes, parents, writable = self.writer._collect_writable_nodes(pg_tree_root)
+        dependencies = self.writer._resolve_dependencies(nodes, parents, writable)
+        scheduled = [node_id for node_id, node in nodes.items()
+                     if node.get("content_guideline") and node.get("status") in _SCHEDULABLE_STATUSES]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        slot = slot or (lambda: semaphore)
+        first_draft = {node_id: asyncio.Event() for node_id in writable}  # 依赖节点只需等待首稿完成
+        written = set()
+        # 审查统计按本次运行单独记录：BatchRunner 的多篇专利共享同一个审查智能体，不能重置它的 review_stats
+        review_stats = {"reviewed": 0, "skipped_unchanged": 0}
+        self.stats = {"writes": 0, "reviews": 0, "revisions": 0, "write_failures": 0,
+                      "rounds_exhausted": [], "budget_stopped": [], "review": review_stats, "elapsed": 0.0}
+        patent_id = pg_tree_root.get("patent_id") or pg_tree_root.get("id")
+        self._last_checkpoint = time.monotonic()
+
+        async def write(node: dict, rounds: int) -> bool:
+            context = self.writer._build_context(node["id"], nodes, parents, dependencies.get(node["id"], set()))
+            if node.get("status") == "needs_revision" and node.get("examination_feedback"):
+                context["examination_feedback"] = node["examination_feedback"]
+            node["status"] = "in_progress"
+            try:
+                async with slot():
+                    content = await self.writer._awrite_node_content(node, pg_tree_root, context)
+            except Exception as e:
+                node["status"] = "pending"
+                node["write_error"] = f"{type(e).__name__}: {e}"
+                self.stats["write_failures"] += 1
+                print(f"Coordinator: Failed to write node '{node['title']}' (round {rounds}): {node['write_error']}")
+                return False
+            node["generated_content"] = content
+            mark_written(node)
+            node.pop("write_error", None)
+            node["status"] = "completed"
+            self.stats["writes"] += 1
+            self.stats["revisions"] += rounds > 1
+            return True
+
+        async def examine(node: dict):
+            async with slot():
+                await asyncio.to_thread(self.examiner.review_pg_tree_node, node, pg_tree_root, stats=review_stats)
+            self.stats["reviews"] += 1
+
+        def within_budget(node: dict) -> bool:
+            if self.token_tracker is None or self.token_tracker.allow_revision(patent_id, node["id"]):
+                return True
+            self.stats["budget_stopped"].append(node["id"])
+            print(f"Coordinator: Token budget exhausted, stopping work on node '{node['title']}'.")
+            return False
+
+        async def process(node_id: str):
+            node = nodes[node_id]
+            rounds = 0
+            try:
+                if node["status"] == "pending":
+                    for dep_id in dependencies.get(node_id, ()):
+                        await first_draft[dep_id].wait()
+                    failed_deps = [dep_id for dep_id in dependencies.get(node_id, ()) if dep_id not in written]
+                    if failed_deps:
+                        print(f"Coordinator: Skipping node '{node['title']}' because dependencies failed: {failed_deps}")
+                        return
+                    if not within_budget(node):
+                        return
+                    rounds += 1
+                    if not await write(node, rounds):
+                        return
+                    written.add(node_id)
+                if node_id in first_draft:
+                    first_draft[node_id].set()
+
+                while True:
+                    if node["status"] in ("completed", "needs_review"):
+                        await examine(node)
+                        self._checkpoint(draft_id, pg_tree_root)
+                    if node["status"] != "needs_revision":
+                        return
+                    if rounds >= self.max_rounds:
+                        self.stats["rounds_exhausted"].append(node_id)
+                        print(f"Coordinator: Node '{node['title']}' still needs revision after {rounds} round(s).")
+                        return
+                    if not within_budget(node):
+                        return
+                    rounds += 1
+                    print(f"Coordinator: Revising node '{node['title']}' (round {rounds}).")
+                    if not await write(node, rounds):
+                        return
+            finally:
+                if node_id in first_draft:
+                    first_draft[node_id].set()
+
+        await asyncio.gather(*(process(node_id) for node_id in scheduled))
+        self._checkpoint(draft_id, pg_tree_root, force=True)
+        self.stats["elapsed"] = round(time.perf_counter() - start, 3)
+        print(f"Coordinator: Finished in {self.stats['elapsed']}s. {self.stats['writes']} write(s), "
+              f"{self.stats['reviews']} review(s), {self.stats['revisions']} revision(s), "
+              f"{len(self.stats['rounds_exhausted'])} node(s) hit max_rounds.")
+        if self.token_tracker is not None:
+            self.token_tracker.print_summary()
+        return pg_tree_root
+
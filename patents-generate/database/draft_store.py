@@ -0,0 +1,223 @@
+# database/draft_store.py
+import json
+import sqlite3
+import threading
+import time
+
+from utils.pg_tree import iter_dict_tree
+
+# 每轮修订中可能变化的字段；其余字段 (标题、内容指南、依赖等) 和父子关系视为树结构，只在发生变化的轮次写入
+REVISION_FIELDS = ("status", "generated_content", "examination_feedback")
+STATE_FIELDS = ("content_hash", "last_reviewed_hash", "examination_verdict", "write_error")  # 存为 JSON
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    draft_id TEXT PRIMARY KEY,
+    root_id TEXT NOT NULL,
+    latest_round INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS node_structures (
+    draft_id TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    parent_id TEXT,
+    position INTEGER NOT NULL,
+    structure TEXT,
+    PRIMARY KEY (draft_id, node_id, round)
+);
+CREATE TABLE IF NOT EXISTS node_revisions (
+    draft_id TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    status TEXT,
+    generated_content TEXT,
+    examination_feedback TEXT,
+    state TEXT,
+    PRIMARY KEY (draft_id, node_id, round)
+);
+CREATE TABLE IF NOT EXISTS draft_rounds (
+    draft_id TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    changed_nodes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (draft_id, round)
+);
+"""
+
+
+def _revision_row(node: dict) -> tuple:
+    state = {field: node[field] for field in STATE_FIELDS if node.get(field) is not None}
+    return (node.get("status"), node.get("generated_content"), node.get("examination_feedback"),
+            json.dumps(state, ensure_ascii=False, sort_keys=True) if state else None)
+
+
+def _latest_rows_sql(table: str, columns: str) -> str:
+    """每个节点在 round <= ? 的轮次中最新的一行。"""
+    return f"""SELECT t.node_id, {columns} FROM {table} t
+               JOIN (SELECT node_id, MAX(round) AS round FROM {table}
+                     WHERE draft_id = ? AND round <= ? GROUP BY node_id) m
+                 ON t.node_id = m.node_id AND t.round = m.round
+               WHERE t.draft_id = ?"""
+
+
+_REVISION_COLUMNS = "t.status, t.generated_content, t.examination_feedback, t.state"
+_STRUCTURE_COLUMNS = "t.parent_id, t.position, t.structure"
+_LATEST = 2 ** 62  # 不限制轮次
+
+
+def _structure(node: dict) -> str:
+    skip = set(REVISION_FIELDS) | set(STATE_FIELDS) | {"id", "children"}
+    return json.dumps({key: value for key, value in node.items() if key not in skip}, ensure_ascii=False)
+
+
+class DraftStore:
+    def __init__(self, db_path: str = "patent_drafts.db"):
+        """
+        专利草稿的增量持久化 (SQLite)。
+        每轮只追加发生变化的节点：内容、状态或审查意见变化时写入修订行，标题等结构字段、父节点或兄弟顺序变化时
+        写入结构行，节点被删除时写入 structure 为 NULL 的结构行。检查点的开销与本轮修改的节点数成正比，
+        而不是与整棵树的大小成正比。
+        可以加载最新状态或任意历史轮次，用于崩溃后恢复长时间的生成任务。
+
+        Args:
+            db_path (str): SQLite 数据库文件路径 (":memory:" 表示仅在内存中)。
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._last_rows = {}  # draft_id -> {node_id: 最近一次写入的修订行}，用于比较变化
+        self._last_structures = {}  # draft_id -> {node_id: (父节点 id, 兄弟下标, 结构 JSON 或 None)}
+        print(f"DraftStore initialized. Database: {db_path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- 写入 ---
+    def _load_last_rows(self, draft_id: str):
+        """首次在本进程中写入某个草稿时，从数据库取回各节点最新的修订行和结构行，用于后续比较。"""
+        if draft_id in self._last_rows:
+            return
+        params = (draft_id, _LATEST, draft_id)
+        self._last_rows[draft_id] = {row[0]: tuple(row[1:]) for row in self._conn.execute(
+            _latest_rows_sql("node_revisions", _REVISION_COLUMNS), params)}
+        self._last_structures[draft_id] = {row[0]: tuple(row[1:]) for row in self._conn.execute(
+            _latest_rows_sql("node_structures", _STRUCTURE_COLUMNS), params)}
+
+    def save_revision(self, draft_id: str, pg_tree_root: dict) -> tuple:
+        """
+        保存一个检查点：草稿不存在时写入完整的树作为第 0 轮，否则只追加变化的节点作为新的一轮。
+        没有任何节点变化时不创建新轮次。
+
+        Args:
+            draft_id (str): 草稿标识 (例如发明构思的 id)。
+            pg_tree_root (dict): 当前的 PGTree。
+
+        Returns:
+            tuple: (轮次, 本轮写入的节点数)。
+        """
+        with self._lock, self._conn:
+            existing = self._conn.execute("SELECT latest_round FROM drafts WHERE draft_id = ?", (draft_id,)).fetchone()
+            if existing is None:
+                round_number = 0
+                self._conn.execute("INSERT INTO drafts VALUES (?, ?, ?, ?)",
+                                   (draft_id, pg_tree_root["id"], 0, time.time()))
+                self._last_rows[draft_id] = {}
+                self._last_structures[draft_id] = {}
+            else:
+                round_number = existing[0] + 1
+                self._load_last_rows(draft_id)
+            last_rows, last_structures = self._last_rows[draft_id], self._last_structures[draft_id]
+
+            changed, structures, seen = [], [], set()
+            placement = {pg_tree_root["id"]: (None, 0)}  # 节点 id -> (父节点 id, 兄弟下标)
+            for node in iter_dict_tree(pg_tree_root):
+                node_id = node["id"]
+                seen.add(node_id)
+                for index, child in enumerate(node.get("children", [])):
+                    placement[child["id"]] = (node_id, index)
+                structure = placement[node_id] + (_structure(node),)
+                if last_structures.get(node_id) != structure:
+                    structures.append((node_id, structure))
+                row = _revision_row(node)
+                if last_rows.get(node_id) != row:
+                    changed.append((node_id, row))
+            # 上一轮还在树中、这一轮已被删除的节点
+            structures += [(node_id, (structure[0], structure[1], None)) for node_id, structure in last_structures.items()
+                           if structure[2] is not None and node_id not in seen]
+            changed_nodes = len({node_id for node_id, _ in changed} | {node_id for node_id, _ in structures})
+            if not changed_nodes:
+                return existing[0], 0
+
+            self._conn.executemany(
+                "INSERT INTO node_structures VALUES (?, ?, ?, ?, ?, ?)",
+                [(draft_id, node_id, round_number) + structure for node_id, structure in structures])
+            self._conn.executemany(
+                "INSERT INTO node_revisions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(draft_id, node_id, round_number) + row for node_id, row in changed])
+            self._conn.execute("INSERT INTO draft_rounds VALUES (?, ?, ?, ?)",
+                               (draft_id, round_number, changed_nodes, time.time()))
+            self._conn.execute("UPDATE drafts SET latest_round = ? WHERE draft_id = ?", (round_number, draft_id))
+            last_structures.update(structures)
+            last_rows.update(changed)
+        print(f"DraftStore: Saved draft '{draft_id}' round {round_number} ({changed_nodes} changed node(s)).")
+        return round_number, changed_nodes
+
+    # --- 读取 ---
+    def load(self, draft_id: str, round_number: int = None) -> dict:
+        """
+        重建某一轮结束时的 PGTree (默认最新一轮)：每个节点取轮次不超过 round_number 的最新修订和最新结构，
+        到这一轮已被删除的节点不出现在结果中。
+
+        Returns:
+            dict: 嵌套字典形式的 PGTree；草稿不存在时返回 None。
+        """
+        with self._lock:
+            draft = self._conn.execute("SELECT root_id, latest_round FROM drafts WHERE draft_id = ?",
+                                       (draft_id,)).fetchone()
+            if draft is None:
+                return None
+            root_id, latest_round = draft
+            round_number = latest_round if round_number is None else round_number
+            params = (draft_id, round_number, draft_id)
+            structure_rows = self._conn.execute(_latest_rows_sql("node_structures", _STRUCTURE_COLUMNS),
+                                                params).fetchall()
+            revision_rows = self._conn.execute(_latest_rows_sql("node_revisions", _REVISION_COLUMNS),
+                                               params).fetchall()
+
+        revisions = {row[0]: row[1:] for row in revision_rows}
+        nodes, placements = {}, []
+        for node_id, parent_id, position, structure in structure_rows:
+            # 在更晚的轮次才加入树中、或到这一轮已被删除的节点
+            if structure is None or node_id not in revisions:
+                continue
+            status, content, feedback, state = revisions[node_id]
+            node = {"id": node_id, **json.loads(structure), "status": status, "generated_content": content}
+            if feedback is not None:
+                node["examination_feedback"] = feedback
+            if state:
+                node.update(json.loads(state))
+            node["children"] = []
+            nodes[node_id] = node
+            placements.append((parent_id, position, node_id))
+        for parent_id, _, node_id in sorted(placements, key=lambda item: (item[0] or "", item[1])):
+            if parent_id is not None and parent_id in nodes:  # 父节点已删除的子树不会挂到树上
+                nodes[parent_id]["children"].append(nodes[node_id])
+        return nodes.get(root_id)
+
+    def latest_round(self, draft_id: str) -> int:
+        """草稿的最新轮次，草稿不存在时返回 -1。"""
+        with self._lock:
+            row = self._conn.execute("SELECT latest_round FROM drafts WHERE draft_id = ?", (draft_id,)).fetchone()
+        return row[0] if row else -1
+
+    def list_rounds(self, draft_id: str) -> list:
+        """[(轮次, 变化的节点数, 时间戳), ...]"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT round, changed_nodes, created_at FROM draft_rounds WHERE draft_id = ? ORDER BY round",
+                (draft_id,)).fetchall()
@@ -0,0 +1,150 @@
+# database/embedding_store.py
+import os
+import struct
+
+import numpy as np
+
+# 文件布局：64 字节的定长头 + count x dim 的行优先向量矩阵；id 表保存在同名 .ids 旁路文件中 (每行一个 id)。
+# 头部：magic(8s) 格式版本(I) dtype 代码(I) 维度(I) 向量数(Q) 语料 index_version(Q)，其余补零。
+MAGIC = b"PDBVEC\x00\x01"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sIIIQQ")
+_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+SIMILARITY_CHUNK_ROWS = 65536  # float16 等非 float32 矩阵分块转换后再计算，避免整个矩阵的临时副本
+
+
+def _ids_path(path: str) -> str:
+    return path + ".ids"
+
+
+class EmbeddingStore:
+    def __init__(self, path: str, writable: bool = False):
+        """
+        用 numpy.memmap 打开的定长向量文件。打开时只读取 64 字节的文件头，向量页由操作系统按需载入，
+        因此启动耗时与语料规模无关；多个工作进程打开同一文件时共享操作系统的页缓存，不会各自复制一份。
+
+        Args:
+            path (str): 向量文件路径 (由 EmbeddingStore.write 创建)。
+            writable (bool): 为 True 时可以用 append 追加向量。
+        """
+        self.path = path
+        self.writable = writable
+        self._ids = None
+        self._load_header()
+        print(f"EmbeddingStore opened: {path} ({self.count} x {self.dim}, {self.dtype.name})")
+
+    def _load_header(self):
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"Embedding store '{self.path}' is truncated")
+        magic, version, dtype_code, dim, count, index_version = _HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(f"'{self.path}' is not an embedding store file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported embedding store version {version} in '{self.path}'")
+        if dtype_code not in _DTYPES:
+            raise ValueError(f"Unknown dtype code {dtype_code} in '{self.path}'")
+        self.dtype = _DTYPES[dtype_code]
+        self.dim = dim
+        self.count = count
+        self.index_version = index_version
+        expected = HEADER_SIZE + count * dim * self.dtype.itemsize
+        if os.path.getsize(self.path) < expected:
+            raise ValueError(f"Embedding store '{self.path}' is smaller than its header declares")
+        if count:
+            self.vectors = np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count, dim))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=self.dtype)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def ids(self) -> list:
+        """向量对应的文档 id (首次访问时才读取旁路文件)。"""
+        if self._ids is None:
+            with open(_ids_path(self.path), "r", encoding="utf-8") as f:
+                self._ids = f.read().split("\n")[:self.count]
+        return self._ids
+
+    # --- 写入 ---
+    @staticmethod
+    def _header(dtype: np.dtype, dim: int, count: int, index_version: int) -> bytes:
+        return _HEADER.pack(MAGIC, FORMAT_VERSION, _DTYPE_CODES[dtype], dim, count, index_version).ljust(
+            HEADER_SIZE, b"\x00")
+
+    @classmethod
+    def write(cls, path: str, ids: list, vectors: np.ndarray, dtype: str = "float32",
+              index_version: int = 0) -> "EmbeddingStore":
+        """
+        写出完整的向量文件和 id 表 (先写临时文件再替换，读者不会看到写了一半的文件)。
+
+        Args:
+            path (str): 向量文件路径。
+            ids (list): 与 vectors 各行对应的文档 id (不能包含换行符)。
+            vectors (np.ndarray): (n, dim) 的向量矩阵。
+            dtype (str): "float32" 或 "float16" (文件大小减半，检索时分块转换为 float32)。
+            index_version (int): 写入时的语料版本，打开时可与 PatentDB 比对。
+        """
+        dtype = np.dtype(dtype).newbyteorder("<")
+        if dtype not in _DTYPE_CODES:
+            raise ValueError(f"Unsupported embedding dtype '{dtype}', expected float32 or float16")
+        vectors = np.asarray(vectors)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"Expected {len(ids)} x dim vectors, got shape {vectors.shape}")
+        if any("\n" in str(doc_id) for doc_id in ids):
+            raise ValueError("Embedding store ids must not contain newlines")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        ids_tmp, vectors_tmp = _ids_path(path) + ".tmp", path + ".tmp"
+        with open(ids_tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(map(str, ids)))
+        with open(vectors_tmp, "wb") as f:
+            f.write(cls._header(dtype, vectors.shape[1], len(ids), index_version))
+            np.ascontiguousarray(vectors, dtype=dtype).tofile(f)
+        os.replace(ids_tmp, _ids_path(path))
+        os.replace(vectors_tmp, path)
+        return cls(path)
+
+    def append(self, ids: list, vectors: np.ndarray, index_version: int = None):
+        """在文件末尾追加向量并更新文件头，然后重新映射。已打开同一文件的其他进程看到的仍是追加前的行数。"""
+        if not self.writable:
+            raise PermissionError(f"Embedding store '{self.path}' was opened read-only")
+        vectors = np.asarray(vectors)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim or len(vectors) != len(ids):
+            raise ValueError(f"Expected {len(ids)} x {self.dim} vectors, got shape {vectors.shape}")
+        ids_list = self.ids
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + self.count * self.dim * self.dtype.itemsize)
+            np.ascontiguousarray(vectors, dtype=self.dtype).tofile(f)
+            f.truncate()
+            f.seek(0)
+            version = self.index_version if index_version is None else index_version
+            f.write(self._header(self.dtype, self.dim, self.count + len(ids), version))
+        with open(_ids_path(self.path), "a", encoding="utf-8") as f:
+            f.write(("\n" if self.count else "") + "\n".join(map(str, ids)))
+        ids_list = ids_list + [str(doc_id) for doc_id in ids]
+        self._load_header()
+        self._ids = ids_list
+
+    # --- 检索 ---
+    def similarities(self, query_vectors: np.ndarray) -> np.ndarray:
+        """返回 (查询数, count) 的 float32 内积矩阵；非 float32 存储按块转换，内存占用只与块大小有关。"""
+        return similarities(self.vectors, query_vectors)
+
+
+def similarities(embeddings: np.ndarray, query_vectors: np.ndarray) -> np.ndarray:
+    """
+    计算 query_vectors (q, dim) 与 embeddings (n, dim) 的内积，返回 (q, n) float32 矩阵。
+    float32 矩阵 (包括 float32 的 memmap) 直接做矩阵乘法；其他类型按 SIMILARITY_CHUNK_ROWS 行分块转换。
+    """
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+    if embeddings.dtype == np.float32:
+        return query_vectors @ embeddings.T
+    result = np.empty((len(query_vectors), len(embeddings)), dtype=np.float32)
+    for start in range(0, len(embeddings), SIMILARITY_CHUNK_ROWS):
+        block = np.asarray(embeddings[start:start + SIMILARITY_CHUNK_ROWS], dtype=np.float32)
+        result[:, start:start + len(block)] = query_vectors @ block.T
+    return result
@@ -0,0 +1,333 @@
+# database/patent_db.py
+import json
+import math
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from database.embedding_store import EmbeddingStore, similarities
+from utils.key_phrases import tokenize  # 索引与查询共用的中英文分词
+
+
+class HashingEmbedder:
+    """
+    无需模型文件的回退嵌入：词项经 crc32 哈希映射到 dim 维 (带符号，减少冲突偏差)，
+    按 log(1 + tf) 加权后做 L2 归一化。相同输入在不同进程中得到相同向量。
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _vector(self, text: str, out: np.ndarray):
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            h = zlib.crc32(token.encode("utf-8"))
+            out[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * np.log1p(tf)
+
+    def encode(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            self._vector(text, matrix[row])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class SentenceTransformerEmbedder:
+    """本地 sentence-transformers 模型 (可选依赖)，输出已归一化的向量。"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer  # 仅在使用时导入
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+def create_embedder(model_name: str = None, dim: int = 256):
+    """指定了本地模型且安装了 sentence-transformers 时使用模型，否则回退到哈希向量。"""
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            print(f"PatentDB: sentence-transformers not installed, falling back to hashing embeddings for '{model_name}'.")
+    return HashingEmbedder(dim)
+
+
+class PatentDB:
+    def __init__(self, embedder=None, k1: float = 1.5, b: float = 0.75, rrf_k: int = 60):
+        """
+        本地专利数据库 (PatentDB)
+        为 ExaminerAgent 的 RRAG 检索提供现有技术的混合检索：
+        - 倒排索引上的 BM25 关键词检索；
+        - NumPy 嵌入矩阵上的余弦相似度语义检索 (矩阵可以是 EmbeddingStore 的内存映射文件)；
+        - 两路结果按倒数排名融合 (Reciprocal Rank Fusion) 合并为一个排序。
+
+        Args:
+            embedder: 提供 encode(texts) -> (n, dim) 归一化矩阵的对象，默认为 HashingEmbedder。
+            k1 (float), b (float): BM25 参数。
+            rrf_k (int): RRF 平滑常数。
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.k1 = k1
+        self.b = b
+        self.rrf_k = rrf_k
+        self.index_version = 0  # 每次语料变化后递增，检索缓存据此失效
+        self._lock = threading.RLock()
+        self._records = []  # {"id", "title", "abstract", ...}
+        self._doc_tokens = []  # 每篇文档的词频字典，重建倒排索引时使用
+        self._embeddings = np.zeros((0, getattr(self.embedder, "dim", 0)), dtype=np.float32)
+        self._pending_texts = []  # 尚未编码的文档文本
+        self._embedding_store = None  # 已挂载的 EmbeddingStore
+        self._postings = {}  # 词项 -> (文档下标数组, BM25 词项权重数组)
+        self._idf = {}
+        self._dirty = False
+        print("PatentDB initialized.")
+
+    def __len__(self):
+        return len(self._records)
+
+    # --- 写入 ---
+    def add_patents(self, records: list) -> int:
+        """
+        添加专利记录，每条记录至少包含 id、title 和 abstract。索引在下一次检索时增量重建。
+
+        Returns:
+            int: 新的 index_version。
+        """
+        with self._lock:
+            for record in records:
+                text = f"{record.get('title', '')} {record.get('abstract', '')}"
+                counts = {}
+                for token in tokenize(text):
+                    counts[token] = counts.get(token, 0) + 1
+                self._records.append(record)
+                self._doc_tokens.append(counts)
+                self._pending_texts.append(text)
+            self._dirty = True
+            self.index_version += 1
+            return self.index_version
+
+    @classmethod
+    def from_jsonl(cls, path: str, embedding_store: str = None, embedding_dtype: str = "float32",
+                   **kwargs) -> "PatentDB":
+        """
+        从每行一条 JSON 记录的文件加载专利语料。
+        指定 embedding_store 时：文件已存在则内存映射其中的向量，不再重新编码；否则编码后写出该文件供下次启动使用。
+        """
+        db = cls(**kwargs)
+        batch = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= 10000:
+                    db.add_patents(batch)
+                    batch = []
+        if batch:
+            db.add_patents(batch)
+        if embedding_store and os.path.exists(embedding_store):
+            db.attach_embedding_store(EmbeddingStore(embedding_store))
+            db.build_index()
+        else:
+            db.build_index()
+            if embedding_store:
+                db.save_embedding_store(embedding_store, dtype=embedding_dtype)
+        return db
+
+    # --- 向量文件 ---
+    def attach_embedding_store(self, store: EmbeddingStore, verify_ids: bool = True):
+        """
+        用内存映射的向量文件作为前 len(store) 篇文档的嵌入，跳过这些文档的编码。
+        必须在编码任何文档之前 (即首次检索或 build_index 之前) 调用；之后新增的文档照常编码。
+        store 以 writable=True 打开时，新增文档的向量会追加到文件中。
+        """
+        with self._lock:
+            if len(self._embeddings):
+                raise ValueError("attach_embedding_store must be called before any documents are encoded")
+            if store.dim != self._embeddings.shape[1]:
+                raise ValueError(f"Embedding store dim {store.dim} does not match embedder dim {self._embeddings.shape[1]}")
+            if len(store) > len(self._records):
+                raise ValueError(f"Embedding store has {len(store)} vectors but only {len(self._records)} records are loaded")
+            if verify_ids:
+                record_ids = [str(record.get("id", i)) for i, record in enumerate(self._records[:len(store)])]
+                if record_ids != store.ids:
+                    raise ValueError(f"Embedding store '{store.path}' ids do not match the loaded records")
+            self._embedding_store = store
+            self._embeddings = store.vectors
+            self._pending_texts = self._pending_texts[len(store):]
+            print(f"PatentDB: Attached {len(store)} memory-mapped embeddings from '{store.path}'.")
+
+    def save_embedding_store(self, path: str, dtype: str = "float32") -> EmbeddingStore:
+        """把当前的嵌入矩阵写成向量文件 (float16 可使文件减半) 并挂载为内存映射。"""
+        with self._lock:
+            self.build_index()
+            ids = [str(record.get("id", i)) for i, record in enumerate(self._records)]
+            store = EmbeddingStore.write(path, ids, self._embeddings, dtype=dtype, index_version=self.index_version)
+            self._embedding_store = store
+            self._embeddings = store.vectors
+            return store
+
+    def build_index(self):
+        """编码新增文档并重建倒排索引 (预先计算每个 (词项, 文档) 的 BM25 权重，检索时只需累加)。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            if self._pending_texts:
+                new_embeddings = self.embedder.encode(self._pending_texts)
+                store = self._embedding_store
+                if store is not None and store.writable:
+                    first = len(self._records) - len(self._pending_texts)
+                    store.append([str(record.get("id", first + i)) for i, record in enumerate(self._records[first:])],
+                                 new_embeddings, index_version=self.index_version)
+                    self._embeddings = store.vectors
+                elif len(self._embeddings):
+                    self._embeddings = np.vstack([self._embeddings, new_embeddings])  # 内存映射的矩阵会被复制到内存中
+                else:
+                    self._embeddings = new_embeddings
+                self._pending_texts = []
+
+            n_docs = len(self._doc_tokens)
+            doc_lengths = np.fromiter((sum(c.values()) for c in self._doc_tokens), dtype=np.float32, count=n_docs)
+            avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+            length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / (avg_length or 1.0))
+
+            postings = {}
+            for doc_index, counts in enumerate(self._doc_tokens):
+                for token, tf in counts.items():
+                    postings.setdefault(token, ([], []))
+                    postings[token][0].append(doc_index)
+                    postings[token][1].append(tf)
+            self._postings, self._idf = {}, {}
+            for token, (doc_ids, tfs) in postings.items():
+                doc_ids = np.asarray(doc_ids, dtype=np.int32)
+                tfs = np.asarray(tfs, dtype=np.float32)
+                self._postings[token] = (doc_ids, tfs * (self.k1 + 1) / (tfs + length_norm[doc_ids]))
+                df = len(doc_ids)
+                self._idf[token] = float(np.log(1 + (n_docs - df + 0.5) / (df + 0.5)))
+            self._dirty = False
+
+    # --- 检索 ---
+    @staticmethod
+    def _bm25_scores(query: str, postings: dict, idf: dict, scores: np.ndarray) -> np.ndarray:
+        """把查询的 BM25 得分累加到 scores (长度为语料规模的零向量) 上。"""
+        for token in set(tokenize(query)):
+            posting = postings.get(token)
+            if posting is not None:
+                doc_ids, weights = posting
+                scores[doc_ids] += idf[token] * weights  # 同一词项的文档下标互不重复
+        return scores
+
+    def _snapshot(self) -> tuple:
+        """确保索引最新，并取出当前索引的引用；之后的计算不持有锁，多个线程可以并行检索。"""
+        with self._lock:
+            self.build_index()
+            return self._records, self._embeddings, self._postings, self._idf
+
+    def idf(self, token: str) -> float:
+        """词项的逆文档频率；语料中未出现的词项视为最稀有。供关键短语提取计算显著性。"""
+        records, _, _, idf = self._snapshot()
+        value = idf.get(token)
+        return value if value is not None else math.log(1 + (len(records) + 0.5) / 0.5)
+
+    @staticmethod
+    def _top_indices(scores: np.ndarray, n: int) -> np.ndarray:
+        """
+        argpartition 取每行得分最高的 n 个再排序，避免对整个语料做全排序。
+        scores 可以是一维 (单个查询) 或二维 (每行一个查询)。
+        """
+        n = min(n, scores.shape[-1])
+        if n <= 0:
+            return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+        top = np.argpartition(-scores, n - 1, axis=-1)[..., :n]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind="stable")
+        return np.take_along_axis(top, order, axis=-1)
+
+    def _fuse(self, records: list, bm25: np.ndarray, cosine: np.ndarray, rankings: tuple, top_k: int) -> list:
+        """对两路候选排名 (只计入得分为正的文档) 按 RRF 融合，返回结果字典列表。"""
+        fused = {}
+        for ranking, scores in zip(rankings, (bm25, cosine)):
+            rank = 0
+            for doc_index in ranking.tolist():
+                if scores[doc_index] <= 0:
+                    break  # 候选已按得分降序排列
+                fused[doc_index] = fused.get(doc_index, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                rank += 1
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        results = []
+        for doc_index, rrf_score in ranked:
+            record = records[doc_index]
+            results.append({
+                "id": record.get("id", str(doc_index)),
+                "title": record.get("title", ""),
+                "similarity": float(cosine[doc_index]),
+                "snippet": record.get("abstract", "")[:200],
+                "bm25": float(bm25[doc_index]),
+                "score": rrf_score,
+            })
+        return results
+
+    def _candidates(self, top_k: int) -> int:
+        return max(top_k * 10, 50)  # 每路参与融合的候选数
+
+    def search_patents(self, query: str, top_k: int = 3) -> list:
+        """
+        混合检索与查询最相关的现有技术。
+
+        Args:
+            query (str): 检索查询 (通常是权利要求或技术方案中的关键语句)。
+            top_k (int): 返回的结果数量。
+
+        Returns:
+            list: [{"id", "title", "similarity", "snippet", "bm25", "score"}, ...]，按融合得分降序。
+        """
+        records, embeddings, postings, idf = self._snapshot()
+        if not records:
+            return []
+        cosine = similarities(embeddings, self.embedder.encode([query]))[0]
+        bm25 = self._bm25_scores(query, postings, idf, np.zeros(len(records), dtype=np.float32))
+        candidates = self._candidates(top_k)
+        rankings = (self._top_indices(bm25, candidates), self._top_indices(cosine, candidates))
+        return self._fuse(records, bm25, cosine, rankings, top_k)
+
+    def search_patents_batch(self, queries: list, top_k: int = 3, chunk_size: int = 32) -> list:
+        """
+        批量混合检索：所有查询一次编码，按块与嵌入矩阵做一次矩阵乘法，
+        两路得分矩阵按行 argpartition 取候选，再逐个查询做 RRF 融合。
+        重复的查询只计算一次；chunk_size 限制得分矩阵的大小 (chunk_size x 语料规模)。
+
+        Args:
+            queries (list): 检索查询列表。
+            top_k (int): 每个查询返回的结果数量。
+            chunk_size (int): 每块同时计算的查询数。
+
+        Returns:
+            list: 与 queries 一一对应，每项与 search_patents 的返回值格式相同。
+        """
+        records, embeddings, postings, idf = self._snapshot()
+        if not records or not queries:
+            return [[] for _ in queries]
+        unique_queries = list(dict.fromkeys(queries))
+        query_vectors = self.embedder.encode(unique_queries)
+        candidates = self._candidates(top_k)
+        n_docs = len(records)
+
+        results_by_query = {}
+        for start in range(0, len(unique_queries), chunk_size):
+            chunk = unique_queries[start:start + chunk_size]
+            cosine = similarities(embeddings, query_vectors[start:start + chunk_size])
+            bm25 = np.zeros((len(chunk), n_docs), dtype=np.float32)
+            for row, query in enumerate(chunk):
+                self._bm25_scores(query, postings, idf, bm25[row])
+            bm25_top = self._top_indices(bm25, candidates)
+            cosine_top = self._top_indices(cosine, candidates)
+            for row, query in enumerate(chunk):
+                results_by_query[query] = self._fuse(records, bm25[row], cosine[row],
+                                                     (bm25_top[row], cosine_top[row]), top_k)
+        return [results_by_query[query] for query in queries]
@@ -0,0 +1,156 @@
+# database/retrieval_cache.py
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# 审查智能体生成查询时使用的模板片段，归一化时去掉，只保留真正的检索内容
+_TEMPLATE_NOISE = re.compile(r"^现有技术中关于|的方案$|\.\.\.|…")
+# 标点、符号和空白 (Unicode 类别 P*、S*、Z*) 不影响检索语义
+_PUNCT_CATEGORIES = ("P", "S", "Z")
+
+
+def normalize_query(query: str) -> str:
+    """
+    归一化查询文本作为缓存键：全半角统一 (NFKC)、转小写、去掉查询模板和标点空白。
+    例如 "现有技术中关于'一种传感器...'的方案" 与 "一种传感器" 得到相同的键。
+    """
+    text = _TEMPLATE_NOISE.sub("", unicodedata.normalize("NFKC", query or "").strip().lower())
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in _PUNCT_CATEGORIES)
+
+
+class CachedPatentDB:
+    def __init__(self, patent_db, max_entries: int = 1024, similarity_threshold: float = None):
+        """
+        PatentDB 检索结果的 LRU 缓存，接口与 PatentDB 相同，可直接作为 ExaminerAgent 的 patent_db_handler。
+        - 以归一化后的查询文本 (及 top_k) 为键；
+        - similarity_threshold 不为空时，与已缓存查询的嵌入余弦相似度达到阈值的查询直接复用其结果；
+        - PatentDB 的 index_version 变化 (语料更新) 时整个缓存失效。
+
+        Args:
+            patent_db: 提供 search_patents / search_patents_batch 的数据库对象。
+            max_entries (int): 最多缓存的查询数。
+            similarity_threshold (float): 近似查询复用的余弦相似度阈值，如 0.95；为空时只做精确匹配。
+        """
+        self.patent_db = patent_db
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (归一化查询, top_k) -> (查询向量或 None, 结果列表)
+        self._matrix_cache = {}  # top_k -> (键列表, 向量矩阵)，缓存内容变化时清空
+        self._index_version = getattr(patent_db, "index_version", None)
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "invalidations": 0}
+        print(f"CachedPatentDB initialized. max_entries={max_entries}, similarity_threshold={similarity_threshold}")
+
+    def __getattr__(self, name):
+        if name == "patent_db":  # 尚未初始化时避免无限递归
+            raise AttributeError(name)
+        return getattr(self.patent_db, name)  # 其余属性 (add_patents 等) 透传给底层数据库
+
+    @property
+    def index_version(self):
+        return getattr(self.patent_db, "index_version", None)
+
+    # --- 统计 ---
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "invalidations": 0}
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["near_hits"] + self.stats["misses"]
+        return (self.stats["hits"] + self.stats["near_hits"]) / lookups if lookups else 0.0
+
+    # --- 缓存维护 (调用方持有锁) ---
+    def _check_version(self):
+        version = self.index_version
+        if version != self._index_version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._matrix_cache.clear()
+            self._index_version = version
+
+    def _near_duplicate(self, vector: np.ndarray, top_k: int):
+        keys, matrix = self._matrix_cache.get(top_k, (None, None))
+        if keys is None:
+            keys = [key for key, (vec, _) in self._entries.items() if key[1] == top_k and vec is not None]
+            matrix = np.stack([self._entries[key][0] for key in keys]) if keys else None
+            self._matrix_cache[top_k] = (keys, matrix)
+        if matrix is None:
+            return None
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity_threshold else None
+
+    def _lookup(self, key: tuple, vector):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key][1]
+        if vector is not None:
+            near_key = self._near_duplicate(vector, key[1])
+            if near_key is not None:
+                self._entries.move_to_end(near_key)
+                self.stats["near_hits"] += 1
+                return self._entries[near_key][1]
+        self.stats["misses"] += 1
+        return None
+
+    def _store(self, key: tuple, vector, results: list):
+        self._entries[key] = (vector, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix_cache.clear()
+
+    def _encode(self, queries: list) -> list:
+        if self.similarity_threshold is None or not hasattr(self.patent_db, "embedder"):
+            return [None] * len(queries)
+        return list(self.patent_db.embedder.encode(queries))
+
+    # --- 检索 ---
+    def search_patents_batch(self, queries: list, top_k: int = 3) -> list:
+        """
+        批量检索：命中缓存 (精确或近似) 的查询直接返回，其余查询合并为一次底层批量检索。
+
+        Returns:
+            list: 与 queries 一一对应的结果列表。
+        """
+        keys = [(normalize_query(query), top_k) for query in queries]
+        vectors = self._encode(queries)
+        results = [None] * len(queries)
+        missing = {}  # 缓存键 -> (原始查询, 向量, 结果下标列表)
+        with self._lock:
+            self._check_version()
+            for i, (key, vector) in enumerate(zip(keys, vectors)):
+                if key in missing:  # 同一批中的重复查询
+                    missing[key][2].append(i)
+                    self.stats["hits"] += 1
+                    continue
+                cached = self._lookup(key, vector)
+                if cached is not None:
+                    results[i] = list(cached)
+                else:
+                    missing[key] = (queries[i], vector, [i])
+            version = self._index_version
+
+        if missing:
+            pending = list(missing.values())
+            miss_queries = [query for query, _, _ in pending]
+            if hasattr(self.patent_db, "search_patents_batch"):
+                fetched = self.patent_db.search_patents_batch(miss_queries, top_k=top_k)
+            else:
+                fetched = [self.patent_db.search_patents(query, top_k=top_k) for query in miss_queries]
+            with self._lock:
+                store = self.index_version == version  # 检索期间语料发生变化时不写入缓存
+                for key, (_, vector, indices), search_results in zip(missing, pending, fetched):
+                    if store:
+                        self._store(key, vector, search_results)
+                    for i in indices:
+                        results[i] = list(search_results)
+        return results
+
+    def search_patents(self, query: str, top_k: int = 3) -> list:
+        return self.search_patents_batch([query], top_k=top_k)[0]
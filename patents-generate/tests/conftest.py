@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试从任意目录运行时都以 patents-generate 为包根 (与 "from utils.content_hash import ..." 的导入方式一致)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
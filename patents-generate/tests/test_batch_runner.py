@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from agents.examiner_agent import ExaminerAgent
+from agents.writer_agent import WriterAgent
+from coordinator import BatchRunner, FairScheduler
+
+
+def test_register_rejects_non_positive_weight():
+    with pytest.raises(ValueError):
+        FairScheduler().register("p1", 0)
+
+
+def test_slots_are_shared_by_weight():
+    async def main():
+        scheduler = FairScheduler(1)
+        scheduler.register("a", 2)
+        scheduler.register("b", 1)
+        order = []
+
+        async def worker(patent_id):
+            async with scheduler.slot(patent_id):
+                order.append(patent_id)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("a")  # 先占住唯一的槽位，让所有请求排队
+        tasks = [asyncio.create_task(worker("a")) for _ in range(6)]
+        tasks += [asyncio.create_task(worker("b")) for _ in range(6)]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(main())
+    # 两篇专利都有等待请求时，a 大约获得 2/3 的槽位
+    assert order[:9].count("a") == 6 and order[:9].count("b") == 3
+    assert scheduler.grants == {"a": 7, "b": 6}
+    assert scheduler._free == 1
+
+
+def test_cancelled_waiters_do_not_leak_slots():
+    async def main():
+        scheduler = FairScheduler(1)
+        scheduler.register("a")
+        scheduler.register("b")
+        await scheduler.acquire("a")
+
+        # 排队期间被取消：槽位不分配给它
+        queued = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await queued
+
+        # 已分到槽位、但在恢复执行前被取消：槽位被归还
+        granted = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        scheduler.release()
+        granted.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await granted
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert scheduler._free == 1
+    assert not any(scheduler._waiters.values())
+
+
+class FakePlanner:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+
+    def generate_patent_plan(self, idea):
+        if idea in self.fail_on:
+            raise RuntimeError("planning failed")
+        return {"id": "root", "title": idea, "content_guideline": "", "status": "pending", "generated_content": "",
+                "children": [{"id": "n1", "title": "技术方案", "content_guideline": "撰写技术方案", "status": "pending",
+                              "generated_content": "", "children": []},
+                             {"id": "n2", "title": "背景技术", "content_guideline": "撰写背景技术", "status": "pending",
+                              "generated_content": "", "children": []}]}
+
+
+def test_batch_runner_runs_all_patents_and_isolates_failures():
+    runner = BatchRunner(FakePlanner(fail_on={"坏构思"}), WriterAgent(), ExaminerAgent(), max_concurrency=2)
+    results = asyncio.run(runner.run(["一种传感器", {"idea": "坏构思", "patent_id": "bad"},
+                                      {"idea": "一种电池", "weight": 2}]))
+    assert [result["patent_id"] for result in results] == ["patent_001", "bad", "patent_003"]
+    assert [result["status"] for result in results] == ["completed", "failed", "completed"]
+    assert "planning failed" in results[1]["error"]
+    tree = results[0]["tree"]
+    assert tree["patent_id"] == "patent_001"
+    assert [child["status"] for child in tree["children"]] == ["approved_by_examiner"] * 2
+    assert results[2]["stats"]["writes"] == 2
+    assert runner.report["patents"] == 3 and runner.report["completed"] == 2
+    # 规划 1 次 + 写作 2 次 + 审查 2 次
+    assert runner.report["slot_grants"]["patent_001"] == 5
+
+
+def test_batch_runner_rejects_duplicate_patent_ids():
+    runner = BatchRunner(FakePlanner(), WriterAgent(), ExaminerAgent())
+    with pytest.raises(ValueError):
+        asyncio.run(runner.run([{"idea": "a", "patent_id": "p"}, {"idea": "b", "patent_id": "p"}]))
+
+
+def test_review_stats_are_kept_per_patent():
+    examiner = ExaminerAgent()
+    runner = BatchRunner(FakePlanner(), WriterAgent(), examiner, max_concurrency=2)
+    results = asyncio.run(runner.run(["一种传感器", "一种电池", "一种镜头"]))
+    # 并发运行的专利共享同一个审查智能体，各自的审查统计互不覆盖
+    assert [result["stats"]["review"] for result in results] == [{"reviewed": 2, "skipped_unchanged": 0}] * 3
+    assert examiner.review_stats == {"reviewed": 0, "skipped_unchanged": 0}
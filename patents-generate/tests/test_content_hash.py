@@ -0,0 +1,81 @@
+from agents.examiner_agent import ExaminerAgent
+from agents.writer_agent import WriterAgent
+from utils.content_hash import is_unchanged_since_review, mark_reviewed, mark_written, node_content_hash
+
+
+class HitDB:
+    def __init__(self):
+        self.queries = 0
+
+    def search_patents(self, query, top_k=3):
+        self.queries += 1
+        return [{"id": "cn1", "title": "现有技术", "similarity": 0.9, "snippet": "光学传感器"}]
+
+
+def claims_node():
+    return {"id": "c1", "title": "权利要求", "content_guideline": "撰写权利要求", "status": "completed",
+            "generated_content": "1. 一种光学传感器，其特征在于，包括光源和检测器。", "children": []}
+
+
+def test_hash_covers_title_and_content_only():
+    node = claims_node()
+    digest = node_content_hash(node)
+    assert digest == node_content_hash(dict(node, status="needs_revision", examination_feedback="x"))
+    assert digest != node_content_hash(dict(node, title="摘要"))
+    assert digest != node_content_hash(dict(node, generated_content=node["generated_content"] + "。"))
+    # 字段之间有分隔符，拼接结果相同的不同字段值不会碰撞
+    assert node_content_hash({"title": "ab", "generated_content": "c"}) != \
+           node_content_hash({"title": "a", "generated_content": "bc"})
+
+
+def test_unchanged_node_keeps_verdict_without_retrieval():
+    db = HitDB()
+    examiner = ExaminerAgent(patent_db_handler=db)
+    node = claims_node()
+    examiner.review_pg_tree_node(node, node)
+    assert node["status"] == "needs_revision" and node["examination_verdict"] == "needs_revision"
+    queries = db.queries
+
+    node["status"] = "needs_review"
+    examiner.review_pg_tree_node(node, node)
+    assert node["status"] == "needs_revision"
+    assert db.queries == queries
+    assert examiner.review_stats["skipped_unchanged"] == 1
+
+    node["status"] = "needs_review"
+    examiner.review_pg_tree_node(node, node, force=True)
+    assert db.queries > queries
+
+
+def test_edited_node_is_reviewed_again():
+    examiner = ExaminerAgent(patent_db_handler=HitDB())
+    node = claims_node()
+    examiner.review_pg_tree_node(node, node)
+    node["generated_content"] += "所述光源为激光器。"
+    node["status"] = "completed"
+    assert not is_unchanged_since_review(node)
+    examiner.review_pg_tree_node(node, node)
+    assert examiner.review_stats == {"reviewed": 2, "skipped_unchanged": 0}
+
+
+def test_rewrite_with_identical_content_is_reviewed_again():
+    node = claims_node()
+    node["status"] = "needs_revision"
+    mark_reviewed(node)
+    assert is_unchanged_since_review(node)
+    # 确定性的写作结果与上一稿相同，但节点是按审查意见重写的，不能沿用 needs_revision
+    mark_written(node)
+    assert not is_unchanged_since_review(node)
+
+    writer = WriterAgent()
+    examiner = ExaminerAgent()
+    tree = {"id": "root", "title": "专利", "content_guideline": "", "status": "pending", "generated_content": "",
+            "children": [dict(claims_node(), status="pending", generated_content="")]}
+    writer.populate_pg_tree(tree)
+    examiner.review_entire_patent_draft(tree)
+    child = tree["children"][0]
+    child.update(status="pending", examination_verdict="needs_revision")  # 上一轮的结论
+    writer.populate_pg_tree(tree)
+    examiner.review_entire_patent_draft(tree)
+    assert child["status"] == "approved_by_examiner"
+    assert examiner.review_stats["reviewed"] == 1
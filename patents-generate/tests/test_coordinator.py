@@ -0,0 +1,59 @@
+import asyncio
+
+from agents.examiner_agent import ExaminerAgent
+from agents.writer_agent import WriterAgent
+from coordinator import Coordinator
+
+
+def make_tree():
+    def node(node_id, title, children=()):
+        return {"id": node_id, "title": title, "content_guideline": f"撰写{title}", "status": "pending",
+                "generated_content": "", "children": list(children)}
+
+    return {"id": "root", "title": "一种便携式光学传感器", "content_guideline": "", "status": "pending",
+            "generated_content": "", "children": [node("n1", "技术方案"), node("n2", "权利要求"), node("n3", "背景技术")]}
+
+
+class FirstHitDB:
+    """每个查询第一次检索时命中一篇现有技术，之后不再命中。"""
+
+    def __init__(self):
+        self.seen = set()
+
+    def search_patents(self, query, top_k=3):
+        if query in self.seen:
+            return []
+        self.seen.add(query)
+        return [{"id": "cn1", "title": "现有技术", "similarity": 0.9, "snippet": "光学传感器"}]
+
+
+def test_coordinator_writes_and_approves_every_node():
+    tree = make_tree()
+    coordinator = Coordinator(WriterAgent(), ExaminerAgent(), max_concurrency=2)
+    asyncio.run(coordinator.run(tree))
+    assert [child["status"] for child in tree["children"]] == ["approved_by_examiner"] * 3
+    assert coordinator.stats["writes"] == 3
+    assert coordinator.stats["rounds_exhausted"] == []
+
+
+def test_coordinator_revises_until_approved():
+    tree = make_tree()
+    coordinator = Coordinator(WriterAgent(), ExaminerAgent(patent_db_handler=FirstHitDB()), max_rounds=3)
+    asyncio.run(coordinator.run(tree))
+    statuses = {child["id"]: child["status"] for child in tree["children"]}
+    assert statuses == {"n1": "approved_by_examiner", "n2": "approved_by_examiner", "n3": "approved_by_examiner"}
+    # 技术方案和权利要求第一轮命中现有技术，重写一次后重新审查并通过
+    assert coordinator.stats["revisions"] == 2
+    assert coordinator.stats["reviews"] == 5
+
+
+def test_coordinator_stops_at_max_rounds():
+    class AlwaysHitDB(FirstHitDB):
+        def search_patents(self, query, top_k=3):
+            return [{"id": "cn1", "title": "现有技术", "similarity": 0.9, "snippet": "光学传感器"}]
+
+    tree = make_tree()
+    coordinator = Coordinator(WriterAgent(), ExaminerAgent(patent_db_handler=AlwaysHitDB()), max_rounds=2)
+    asyncio.run(coordinator.run(tree))
+    assert sorted(coordinator.stats["rounds_exhausted"]) == ["n1", "n2"]
+    assert tree["children"][2]["status"] == "approved_by_examiner"
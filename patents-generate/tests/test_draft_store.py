@@ -0,0 +1,122 @@
+import copy
+
+from database.draft_store import DraftStore
+
+
+def sample_tree():
+    return {"id": "root", "title": "专利", "content_guideline": "", "status": "pending", "generated_content": "",
+            "children": [
+                {"id": "a", "title": "权利要求", "content_guideline": "写权利要求", "status": "pending",
+                 "generated_content": "", "children": []},
+                {"id": "b", "title": "说明书", "content_guideline": "写说明书", "status": "pending",
+                 "generated_content": "", "depends_on": ["a"], "children": []},
+            ]}
+
+
+def test_first_save_writes_whole_tree_and_loads_back():
+    store = DraftStore(":memory:")
+    tree = sample_tree()
+    assert store.save_revision("d1", tree) == (0, 3)
+    assert store.load("d1") == tree
+    assert store.latest_round("d1") == 0
+    assert store.load("missing") is None and store.latest_round("missing") == -1
+
+
+def test_later_rounds_store_only_changed_nodes():
+    store = DraftStore(":memory:")
+    tree = sample_tree()
+    store.save_revision("d1", tree)
+    round_0 = copy.deepcopy(tree)
+
+    tree["children"][0].update(status="completed", generated_content="1. 一种装置", content_hash="h1")
+    assert store.save_revision("d1", tree) == (1, 1)
+    round_1 = copy.deepcopy(tree)
+
+    tree["children"][0].update(status="needs_revision", examination_feedback="补充特征",
+                               examination_verdict="needs_revision")
+    tree["children"][1].update(status="completed", generated_content="说明书正文")
+    assert store.save_revision("d1", tree) == (2, 2)
+
+    # 没有变化时不创建新轮次
+    assert store.save_revision("d1", tree) == (2, 0)
+    assert [(number, changed) for number, changed, _ in store.list_rounds("d1")] == [(0, 3), (1, 1), (2, 2)]
+
+    assert store.load("d1") == tree
+    assert store.load("d1", 0) == round_0
+    assert store.load("d1", 1) == round_1
+
+
+def test_nodes_added_in_later_rounds():
+    store = DraftStore(":memory:")
+    tree = sample_tree()
+    store.save_revision("d1", tree)
+    tree["children"][1]["children"].append({"id": "b1", "title": "附图说明", "content_guideline": "写附图说明",
+                                            "status": "pending", "generated_content": "", "children": []})
+    assert store.save_revision("d1", tree) == (1, 1)
+    assert store.load("d1") == tree
+    # 更早的轮次中还没有该节点
+    assert store.load("d1", 0) == sample_tree()
+
+
+def test_reopened_store_continues_from_database(tmp_path):
+    path = str(tmp_path / "drafts.db")
+    store = DraftStore(path)
+    tree = sample_tree()
+    store.save_revision("d1", tree)
+    store.close()
+
+    reopened = DraftStore(path)
+    assert reopened.save_revision("d1", tree) == (0, 0)
+    tree["children"][0]["generated_content"] = "1. 一种装置"
+    assert reopened.save_revision("d1", tree) == (1, 1)
+    assert reopened.load("d1") == tree
+    reopened.close()
+
+
+def test_drafts_are_independent():
+    store = DraftStore(":memory:")
+    first, second = sample_tree(), sample_tree()
+    second["children"][0]["generated_content"] = "另一份草稿"
+    store.save_revision("d1", first)
+    store.save_revision("d2", second)
+    assert store.load("d1") == first and store.load("d2") == second
+
+
+def test_structure_changes_after_round_0_survive_restore(tmp_path):
+    path = str(tmp_path / "drafts.db")
+    store = DraftStore(path)
+    tree = sample_tree()
+    store.save_revision("d1", tree)
+
+    tree["children"][0]["title"] = "权利要求书"
+    tree["children"][1]["depends_on"] = []
+    assert store.save_revision("d1", tree) == (1, 2)
+    store.close()
+
+    reopened = DraftStore(path)
+    assert reopened.load("d1") == tree
+    assert reopened.load("d1", 0)["children"][0]["title"] == "权利要求"
+    # 重新打开后比较的基准包含新的结构，不会重复写入
+    assert reopened.save_revision("d1", tree) == (1, 0)
+    reopened.close()
+
+
+def test_removed_and_moved_nodes():
+    store = DraftStore(":memory:")
+    tree = sample_tree()
+    tree["children"][1]["children"].append({"id": "b1", "title": "附图说明", "content_guideline": "写附图说明",
+                                            "status": "pending", "generated_content": "", "children": []})
+    store.save_revision("d1", tree)
+    round_0 = copy.deepcopy(tree)
+
+    # 删除 a，把 b1 移到根节点下并排在 b 之前
+    b1 = tree["children"][1]["children"].pop()
+    tree["children"] = [b1, tree["children"][1]]
+    assert store.save_revision("d1", tree) == (1, 2)  # b 的位置没有变化
+    assert store.load("d1") == tree
+    assert store.load("d1", 0) == round_0
+
+    # 被删除的节点以相同 id 重新加入
+    tree["children"].append(round_0["children"][0])
+    store.save_revision("d1", tree)
+    assert store.load("d1") == tree
@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+import pytest
+
+from database import embedding_store
+from database.embedding_store import HEADER_SIZE, EmbeddingStore, similarities
+from database.patent_db import HashingEmbedder, PatentDB
+from test_patent_db import CORPUS
+
+
+def random_vectors(n, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_write_and_open_memory_maps_vectors(tmp_path):
+    path = str(tmp_path / "vectors.bin")
+    vectors = random_vectors(5)
+    EmbeddingStore.write(path, ["a", "b", "c", "d", "e"], vectors, index_version=7)
+    store = EmbeddingStore(path)
+    assert (len(store), store.dim, store.index_version) == (5, 8, 7)
+    assert isinstance(store.vectors, np.memmap)
+    assert store.ids == ["a", "b", "c", "d", "e"]
+    np.testing.assert_array_equal(store.vectors, vectors)
+    # 写出时使用临时文件再替换，不留下 .tmp 文件
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["vectors.bin", "vectors.bin.ids"]
+
+
+def test_float16_store_halves_size_and_chunks_similarities(tmp_path, monkeypatch):
+    vectors = random_vectors(10)
+    queries = random_vectors(3, seed=1)
+    store32 = EmbeddingStore.write(str(tmp_path / "f32.bin"), list("abcdefghij"), vectors)
+    store16 = EmbeddingStore.write(str(tmp_path / "f16.bin"), list("abcdefghij"), vectors, dtype="float16")
+    assert store16.dtype == np.float16
+    assert (tmp_path / "f16.bin").stat().st_size - HEADER_SIZE == ((tmp_path / "f32.bin").stat().st_size - HEADER_SIZE) // 2
+
+    monkeypatch.setattr(embedding_store, "SIMILARITY_CHUNK_ROWS", 3)
+    result = store16.similarities(queries)
+    assert result.dtype == np.float32 and result.shape == (3, 10)
+    np.testing.assert_allclose(result, store32.similarities(queries), atol=2e-3)
+    np.testing.assert_allclose(similarities(vectors, queries), queries @ vectors.T, rtol=1e-6)
+
+
+def test_append_extends_file_and_ids(tmp_path):
+    path = str(tmp_path / "vectors.bin")
+    EmbeddingStore.write(path, ["a", "b"], random_vectors(2))
+    with pytest.raises(PermissionError):
+        EmbeddingStore(path).append(["c"], random_vectors(1))
+
+    store = EmbeddingStore(path, writable=True)
+    store.append(["c", "d"], random_vectors(2, seed=3), index_version=4)
+    assert len(store) == 4 and store.ids == ["a", "b", "c", "d"] and store.index_version == 4
+    with pytest.raises(ValueError):
+        store.append(["e"], random_vectors(1, dim=4))
+
+    reopened = EmbeddingStore(path)
+    assert reopened.ids == ["a", "b", "c", "d"]
+    np.testing.assert_array_equal(reopened.vectors[2:], random_vectors(2, seed=3))
+
+
+def test_append_to_empty_store(tmp_path):
+    path = str(tmp_path / "vectors.bin")
+    store = EmbeddingStore.write(path, [], np.zeros((0, 8), dtype=np.float32))
+    assert len(store) == 0 and store.vectors.shape == (0, 8)
+    store = EmbeddingStore(path, writable=True)
+    store.append(["a"], random_vectors(1))
+    assert EmbeddingStore(path).ids == ["a"]
+
+
+def test_invalid_files_and_arguments_are_rejected(tmp_path):
+    path = tmp_path / "vectors.bin"
+    with pytest.raises(ValueError):
+        EmbeddingStore.write(str(path), ["a\nb"], random_vectors(1))
+    with pytest.raises(ValueError):
+        EmbeddingStore.write(str(path), ["a", "b"], random_vectors(3))
+    with pytest.raises(ValueError):
+        EmbeddingStore.write(str(path), ["a"], random_vectors(1), dtype="float64")
+
+    path.write_bytes(b"short")
+    with pytest.raises(ValueError, match="truncated"):
+        EmbeddingStore(str(path))
+    path.write_bytes(b"x" * HEADER_SIZE)
+    with pytest.raises(ValueError, match="not an embedding store"):
+        EmbeddingStore(str(path))
+
+    EmbeddingStore.write(str(path), ["a", "b"], random_vectors(2))
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError, match="smaller than its header"):
+        EmbeddingStore(str(path))
+
+
+def test_patent_db_reuses_saved_store(tmp_path):
+    corpus_path = tmp_path / "corpus.jsonl"
+    corpus_path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in CORPUS), encoding="utf-8")
+    store_path = str(tmp_path / "vectors.bin")
+    built = PatentDB.from_jsonl(str(corpus_path), embedding_store=store_path)
+    loaded = PatentDB.from_jsonl(str(corpus_path), embedding_store=store_path)
+    assert isinstance(loaded._embeddings, np.memmap)
+    assert loaded.search_patents("太阳能充电器") == built.search_patents("太阳能充电器")
+
+
+def test_attach_checks_ids_dim_and_appends_new_documents(tmp_path):
+    source = PatentDB()
+    source.add_patents(CORPUS[:3])
+    store_path = str(tmp_path / "vectors.bin")
+    source.save_embedding_store(store_path)
+
+    mismatched = PatentDB()
+    mismatched.add_patents(list(reversed(CORPUS[:3])))
+    with pytest.raises(ValueError, match="ids"):
+        mismatched.attach_embedding_store(EmbeddingStore(store_path))
+    other_dim = PatentDB(embedder=HashingEmbedder(16))
+    other_dim.add_patents(CORPUS[:3])
+    with pytest.raises(ValueError, match="dim"):
+        other_dim.attach_embedding_store(EmbeddingStore(store_path))
+
+    db = PatentDB()
+    db.add_patents(CORPUS)
+    db.attach_embedding_store(EmbeddingStore(store_path, writable=True))
+    assert db.search_patents("无人机电池")[0]["id"] == "cn5"
+    assert EmbeddingStore(store_path).ids == [record["id"] for record in CORPUS]
+    with pytest.raises(ValueError):
+        db.attach_embedding_store(EmbeddingStore(store_path))
@@ -0,0 +1,97 @@
+import json
+
+from agents.examiner_agent import ExaminerAgent
+
+
+class SameDocDB:
+    """每个查询都命中同一篇现有技术；记录批量检索的调用次数。"""
+
+    def __init__(self):
+        self.batch_calls = 0
+
+    def search_patents_batch(self, queries, top_k=3):
+        self.batch_calls += 1
+        return [[{"id": "cn1", "title": "现有技术", "similarity": 0.9, "snippet": "光学传感器片段"}] for _ in queries]
+
+
+class RecordingLLM:
+    def __init__(self, response):
+        self.response = response
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.response(prompt) if callable(self.response) else self.response
+
+
+def make_nodes():
+    def node(node_id, title, content):
+        return {"id": node_id, "title": title, "status": "completed", "generated_content": content, "children": []}
+
+    return [node("c1", "权利要求", "1. 一种光学传感器，其特征在于，包括激光光源和光电检测器。"),
+            node("c2", "技术方案", "本发明的光学传感器包括激光光源、光电检测器和信号处理电路。"),
+            node("bg", "背景技术", "现有的传感器体积较大。")]
+
+
+def test_grouping_by_jaccard_overlap():
+    group = ExaminerAgent._group_by_retrieval_overlap
+    nodes = [{"id": name} for name in "abcde"]
+    node_hits = [(nodes[0], {"d1", "d2"}), (nodes[1], {"d1", "d2", "d3"}), (nodes[2], {"d9"}),
+                 (nodes[3], set()), (nodes[4], set())]
+    assert [[node["id"] for node in g] for g in group(node_hits, 4, 0.5)] == [["a", "b"], ["c"], ["d", "e"]]
+    # 重叠不足时各自成组，max_group_size 同样限制无命中节点的组
+    assert [[node["id"] for node in g] for g in group(node_hits, 1, 0.9)] == [["a"], ["b"], ["c"], ["d"], ["e"]]
+
+
+def test_batch_review_uses_one_retrieval_and_fallback_rules():
+    db = SameDocDB()
+    examiner = ExaminerAgent(patent_db_handler=db)
+    nodes = make_nodes()
+    verdicts = examiner.review_nodes_batch(nodes)
+    assert db.batch_calls == 1
+    assert {node_id: verdict["status"] for node_id, verdict in verdicts.items()} == \
+           {"c1": "needs_revision", "c2": "needs_revision", "bg": "approved_by_examiner"}
+    assert [node["status"] for node in nodes] == ["needs_revision", "needs_revision", "approved_by_examiner"]
+    assert examiner.review_stats["batch_groups"] == 2 and examiner.review_stats["reviewed"] == 3
+
+    # 内容未变化的节点沿用上次结论，不再检索
+    for node in nodes:
+        node["status"] = "needs_review"
+    assert examiner.review_nodes_batch(nodes) == {}
+    assert db.batch_calls == 1 and examiner.review_stats["skipped_unchanged"] == 3
+    assert [node["status"] for node in nodes] == ["needs_revision", "needs_revision", "approved_by_examiner"]
+
+
+def test_llm_verdicts_are_parsed_and_snippets_sent_once():
+    def respond(prompt):
+        if "c1" in prompt:
+            return "结论如下：" + json.dumps({"c1": {"status": "approved_by_examiner", "feedback": "差异明显"},
+                                          "c2": {"status": "bogus", "feedback": "无效状态"}}, ensure_ascii=False)
+        return "{}"
+
+    llm = RecordingLLM(respond)
+    examiner = ExaminerAgent(patent_db_handler=SameDocDB(), llm=llm)
+    nodes = make_nodes()
+    verdicts = examiner.review_nodes_batch(nodes)
+    assert len(llm.prompts) == 2
+    claims_prompt = next(prompt for prompt in llm.prompts if "c1" in prompt)
+    assert claims_prompt.count("光学传感器片段") == 1 and "节点 c2" in claims_prompt
+    assert verdicts["c1"] == {"status": "approved_by_examiner", "feedback": "差异明显"}
+    # 状态不合法的节点回退到模拟规则
+    assert verdicts["c2"]["status"] == "needs_revision"
+    assert verdicts["bg"]["status"] == "approved_by_examiner"
+
+
+def test_unparseable_llm_output_falls_back_for_whole_group():
+    examiner = ExaminerAgent(patent_db_handler=SameDocDB(), llm=RecordingLLM("抱歉，无法给出结论"))
+    verdicts = examiner.review_nodes_batch(make_nodes())
+    assert {node_id: verdict["status"] for node_id, verdict in verdicts.items()} == \
+           {"c1": "needs_revision", "c2": "needs_revision", "bg": "approved_by_examiner"}
+
+
+def test_batch_review_without_db_approves_nodes():
+    examiner = ExaminerAgent()
+    nodes = make_nodes()
+    verdicts = examiner.review_nodes_batch(nodes)
+    assert all(verdict["status"] == "approved_by_examiner" for verdict in verdicts.values())
+    assert all(node["status"] == "approved_by_examiner" for node in nodes)
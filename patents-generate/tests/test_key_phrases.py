@@ -0,0 +1,50 @@
+import math
+
+from utils.key_phrases import extract_key_phrases, split_claim_elements, split_sentences, tokenize
+
+
+def test_tokenize_mixes_words_and_cjk_bigrams():
+    assert tokenize("LED光源") == ["led", "光源"]
+    assert tokenize("光电检测器 v2.0") == ["v2.0", "光电", "电检", "检测", "测器"]
+    assert tokenize("灯 Wi-Fi") == ["wi-fi", "灯"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+
+def test_split_sentences_keeps_decimals():
+    assert split_sentences("厚度为0.5mm。第二项；Second claim. End") == ["厚度为0.5mm", "第二项", "Second claim", "End"]
+
+
+def test_split_claim_elements_strips_boilerplate():
+    text = "1. 一种光学传感器，其特征在于，包括激光光源(10)、光电检测器；2. 根据权利要求1所述的传感器，其中所述光源还包括滤光片。"
+    # 套话、附图标记和过短的要素 ("传感器") 被去掉
+    assert split_claim_elements(text) == [(0, "光学传感器"), (0, "激光光源"), (0, "光电检测器"),
+                                          (1, "光源还包括滤光片")]
+
+
+def test_single_character_prefixes_are_not_stripped():
+    elements = split_claim_elements("1. 一种还原反应器，包括和面机构、及时控制单元；该检测器设有透镜。")
+    assert [element for _, element in elements] == ["还原反应器", "和面机构", "及时控制单元", "该检测器设有透镜"]
+
+
+def test_long_elements_split_at_connectors():
+    text = "一种装置，包括" + "壳体" * 10 + "用于" + "容纳电池模组" * 2
+    elements = [element for _, element in split_claim_elements(text, max_chars=20)]
+    assert "容纳电池模组容纳电池模组" in elements
+    assert all(len(element) <= 20 for element in elements)
+
+
+def test_extract_key_phrases_prefers_rare_terms_and_dedupes():
+    text = "1. 一种传感器，包括石墨烯光电检测器、光电检测器、外壳；外壳。"
+    rare = {"石墨", "墨烯", "烯光"}
+    phrases = extract_key_phrases(text, max_phrases=3, idf=lambda term: 5.0 if term in rare else 0.1)
+    assert phrases[0] == "石墨烯光电检测器"
+    # 与已选短语高度重叠的 "光电检测器" 被跳过
+    assert "光电检测器" not in phrases
+    assert len(phrases) == len(set(phrases)) <= 3
+
+
+def test_extract_key_phrases_edge_cases():
+    assert extract_key_phrases("") == []
+    assert extract_key_phrases("短。") == []
+    phrases = extract_key_phrases("1. 一种还原反应器，包括和面机构。", idf=lambda term: math.log(2))
+    assert set(phrases) == {"还原反应器", "和面机构"}
@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+
+from database.patent_db import HashingEmbedder, PatentDB
+
+CORPUS = [
+    {"id": "cn1", "title": "便携式太阳能充电器", "abstract": "一种可折叠的太阳能电池板，为手机充电。"},
+    {"id": "cn2", "title": "水质检测光学传感器", "abstract": "利用光源和光电检测器测量水体浊度。"},
+    {"id": "cn3", "title": "Lithium battery thermal management", "abstract": "Cooling plates for battery packs."},
+    {"id": "cn4", "title": "光学镜头模组", "abstract": "手机摄像头的多片式镜头结构。"},
+    {"id": "cn5", "title": "无人机电池快速更换装置", "abstract": "卡扣式电池仓，实现电池快速更换。"},
+]
+
+
+def make_db(records=CORPUS):
+    db = PatentDB()
+    db.add_patents(records)
+    return db
+
+
+def test_empty_corpus_returns_no_results():
+    db = PatentDB()
+    assert db.search_patents("太阳能充电器") == []
+    assert db.search_patents_batch(["太阳能", "电池"]) == [[], []]
+    assert db.search_patents_batch([]) == []
+
+
+def test_top_k_larger_than_corpus():
+    db = make_db()
+    results = db.search_patents("电池", top_k=50)
+    assert 0 < len(results) <= len(CORPUS)
+    assert len({result["id"] for result in results}) == len(results)
+    batch = db.search_patents_batch(["电池", "光学"], top_k=50)
+    assert all(len(results) <= len(CORPUS) for results in batch)
+    assert db.search_patents("电池", top_k=0) == []
+
+
+def test_relevant_document_ranks_first_and_scores_are_sorted():
+    db = make_db()
+    results = db.search_patents("水质检测光学传感器", top_k=3)
+    assert results[0]["id"] == "cn2"
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+    assert set(results[0]) == {"id", "title", "similarity", "snippet", "bm25", "score"}
+    assert db.search_patents("battery cooling", top_k=1)[0]["id"] == "cn3"
+
+
+def test_query_without_any_match_returns_nothing():
+    db = make_db()
+    assert db.search_patents("量子纠缠通信", top_k=3) == []
+    assert db.search_patents("", top_k=3) == []
+
+
+def test_batch_matches_single_queries_including_duplicates():
+    db = make_db()
+    queries = ["太阳能充电", "电池更换", "太阳能充电", "光学镜头"]
+    batch = db.search_patents_batch(queries, top_k=2, chunk_size=2)
+    assert len(batch) == len(queries)
+    assert batch[0] == batch[2]
+    for query, results in zip(queries, batch):
+        assert [r["id"] for r in results] == [r["id"] for r in db.search_patents(query, top_k=2)]
+
+
+def test_added_documents_are_indexed_and_bump_version():
+    db = make_db()
+    version = db.index_version
+    assert db.add_patents([{"id": "cn6", "title": "石墨烯散热膜", "abstract": "用于芯片散热。"}]) == version + 1
+    assert db.search_patents("石墨烯散热膜", top_k=1)[0]["id"] == "cn6"
+    assert len(db) == len(CORPUS) + 1
+
+
+def test_idf_prefers_rare_tokens():
+    db = make_db()
+    assert db.idf("电池") < db.idf("浊度")
+    assert db.idf("从未出现") >= db.idf("浊度")
+
+
+def test_top_indices_handles_rows_and_small_n():
+    scores = np.array([[0.1, 0.9, 0.5], [0.3, 0.2, 0.7]], dtype=np.float32)
+    assert PatentDB._top_indices(scores, 2).tolist() == [[1, 2], [2, 0]]
+    assert PatentDB._top_indices(scores[0], 10).tolist() == [1, 2, 0]
+    assert PatentDB._top_indices(scores, 0).shape == (2, 0)
+
+
+def test_hashing_embedder_is_normalized_and_deterministic():
+    embedder = HashingEmbedder(dim=64)
+    vectors = embedder.encode(["光学传感器", "", "光学传感器"])
+    assert vectors.shape == (3, 64)
+    assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+    assert not vectors[1].any()
+    assert np.array_equal(vectors[0], vectors[2])
+
+
+def test_from_jsonl(tmp_path):
+    path = tmp_path / "corpus.jsonl"
+    path.write_text("\n".join(json.dumps(record, ensure_ascii=False) for record in CORPUS) + "\n\n", encoding="utf-8")
+    db = PatentDB.from_jsonl(str(path))
+    assert len(db) == len(CORPUS)
+    with pytest.raises(FileNotFoundError):
+        PatentDB.from_jsonl(str(tmp_path / "missing.jsonl"))
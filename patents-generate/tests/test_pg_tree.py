@@ -0,0 +1,114 @@
+import sys
+
+import pytest
+
+from utils.pg_tree import PGNode, PGTree, iter_dict_tree
+
+
+def sample_dict():
+    return {"id": "root", "title": "专利", "content_guideline": "", "status": "pending", "generated_content": "",
+            "patent_id": "p1",
+            "children": [
+                {"id": "a", "title": "权利要求", "content_guideline": "写权利要求", "status": "completed",
+                 "generated_content": "1. 一种装置", "content_hash": "h1", "children": [
+                     {"id": "a1", "title": "从属权利要求", "content_guideline": "写从属", "status": "needs_revision",
+                      "generated_content": "", "examination_feedback": "补充特征", "children": []}]},
+                {"id": "b", "title": "说明书", "content_guideline": "写说明书", "status": "pending",
+                 "generated_content": "", "depends_on": ["a"], "children": []},
+            ]}
+
+
+def deep_dict(depth):
+    root = {"id": "n0", "title": "n0", "children": []}
+    node = root
+    for i in range(1, depth):
+        child = {"id": f"n{i}", "title": f"n{i}", "children": []}
+        node["children"].append(child)
+        node = child
+    return root
+
+
+def test_iter_dict_tree_is_preorder_with_depth():
+    assert [node["id"] for node in iter_dict_tree(sample_dict())] == ["root", "a", "a1", "b"]
+    assert [(node["id"], depth) for node, depth in iter_dict_tree(sample_dict(), with_depth=True)] == \
+           [("root", 0), ("a", 1), ("a1", 2), ("b", 1)]
+
+
+def test_dict_round_trip_keeps_optional_and_unknown_fields():
+    data = sample_dict()
+    tree = PGTree.from_dict(data)
+    assert tree.to_dict() == data
+    assert tree.get("root").get("patent_id") == "p1"
+    assert tree.get("b").get("depends_on") == ["a"]
+    # 值为 None 的可选字段不输出
+    assert "write_error" not in tree.to_dict()["children"][1]
+    assert tree.to_dict("a") == data["children"][0]
+
+
+def test_dumps_loads_round_trip_and_version_check():
+    tree = PGTree.from_dict(sample_dict())
+    restored = PGTree.loads(tree.dumps())
+    assert restored.to_dict() == sample_dict()
+    assert restored.get("a1").parent is restored.get("a")
+
+    with pytest.raises(ValueError):
+        PGTree.loads('{"version": 99, "fields": [], "nodes": []}')
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "tree.json")
+    PGTree.from_dict(sample_dict()).save(path)
+    assert PGTree.load(path).to_dict() == sample_dict()
+
+
+def test_index_ancestors_and_status_queries():
+    tree = PGTree.from_dict(sample_dict())
+    assert len(tree) == 4 and "a1" in tree and "zz" not in tree
+    assert tree.get("zz") is None
+    assert [node.id for node in tree.ancestors("a1")] == ["a", "root"]
+    assert tree.ancestors("root") == []
+    assert [node.id for node in tree.iter_by_status("needs_revision", "completed")] == ["a", "a1"]
+    assert tree.status_counts() == {"pending": 2, "completed": 1, "needs_revision": 1}
+    assert [(node.id, depth) for node, depth in tree.walk("a", with_depth=True)] == [("a", 0), ("a1", 1)]
+
+
+def test_add_child_and_remove_maintain_index():
+    tree = PGTree.from_dict(sample_dict())
+    subtree = PGNode("c", title="附图说明")
+    grandchild = PGNode("c1", title="图1")
+    grandchild.parent = subtree
+    subtree.children.append(grandchild)
+    tree.add_child("b", subtree)
+    assert tree.get("c1") is grandchild and [node.id for node in tree.ancestors("c1")] == ["c", "b", "root"]
+
+    # 子树中任一 id 重复时整体拒绝，索引保持不变
+    duplicate = PGNode("d")
+    duplicate.children.append(PGNode("a1"))
+    with pytest.raises(ValueError):
+        tree.add_child("root", duplicate)
+    assert "d" not in tree and len(tree) == 6
+
+    removed = tree.remove("b")
+    assert removed.parent is None and removed.id == "b"
+    assert "b" not in tree and "c" not in tree and "c1" not in tree and len(tree) == 3
+    assert [node.id for node in tree] == ["root", "a", "a1"]
+    with pytest.raises(ValueError):
+        tree.remove("root")
+
+
+def test_duplicate_ids_are_rejected():
+    data = sample_dict()
+    data["children"][1]["id"] = "a1"
+    with pytest.raises(ValueError):
+        PGTree.from_dict(data)
+
+
+def test_deep_tree_does_not_hit_recursion_limit():
+    depth = sys.getrecursionlimit() * 3
+    data = deep_dict(depth)
+    assert sum(1 for _ in iter_dict_tree(data)) == depth
+    tree = PGTree.from_dict(data)
+    assert len(tree) == depth and len(tree.ancestors(f"n{depth - 1}")) == depth - 1
+    restored = PGTree.loads(tree.dumps())
+    assert len(restored) == depth
+    assert restored.to_dict()["children"][0]["id"] == "n1"
@@ -0,0 +1,94 @@
+import numpy as np
+
+from database.retrieval_cache import CachedPatentDB, normalize_query
+
+
+class CountingDB:
+    """记录底层检索次数；每个查询返回一条以查询文本为标题的结果。"""
+
+    def __init__(self):
+        self.index_version = 1
+        self.searched = []
+
+    def search_patents_batch(self, queries, top_k=3):
+        self.searched.extend(queries)
+        return [[{"id": query, "title": query, "similarity": 1.0, "snippet": ""}] for query in queries]
+
+    def add_patents(self, records):
+        self.index_version += 1
+        return self.index_version
+
+
+class FixedEmbedder:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts):
+        return np.asarray([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+def test_normalize_query_strips_template_punctuation_and_width():
+    assert normalize_query("现有技术中关于'一种传感器...'的方案") == normalize_query("一种传感器")
+    assert normalize_query("Ｌｉｇｈｔ  Source!") == "lightsource"
+    assert normalize_query(None) == ""
+
+
+def test_exact_hits_and_in_batch_duplicates():
+    db = CountingDB()
+    cache = CachedPatentDB(db)
+    first = cache.search_patents_batch(["光源", "检测器", "光源 "])
+    assert db.searched == ["光源", "检测器"]
+    assert first[0] == first[2]
+    assert cache.search_patents("光源。") == first[0]
+    assert db.searched == ["光源", "检测器"]
+    assert cache.stats == {"hits": 2, "near_hits": 0, "misses": 2, "invalidations": 0}
+    assert cache.hit_ratio() == 0.5
+
+
+def test_top_k_is_part_of_the_key():
+    db = CountingDB()
+    cache = CachedPatentDB(db)
+    cache.search_patents("光源", top_k=3)
+    cache.search_patents("光源", top_k=5)
+    assert db.searched == ["光源", "光源"]
+
+
+def test_lru_eviction():
+    db = CountingDB()
+    cache = CachedPatentDB(db, max_entries=2)
+    for query in ("a", "b", "a", "c", "b"):
+        cache.search_patents(query)
+    # 访问 a 后插入 c 淘汰的是 b，因此最后的 b 需要重新检索
+    assert db.searched == ["a", "b", "c", "b"]
+
+
+def test_index_version_change_invalidates():
+    db = CountingDB()
+    cache = CachedPatentDB(db)
+    cache.search_patents("光源")
+    cache.add_patents([{"id": "x"}])  # 透传给底层数据库
+    cache.search_patents("光源")
+    assert db.searched == ["光源", "光源"]
+    assert cache.stats["invalidations"] == 1
+
+
+def test_near_duplicate_reuse_above_threshold():
+    db = CountingDB()
+    db.embedder = FixedEmbedder({
+        "激光光源": [1.0, 0.0], "激光发射光源": [0.99, 0.141], "检测电路": [0.0, 1.0],
+    })
+    cache = CachedPatentDB(db, similarity_threshold=0.95)
+    original = cache.search_patents("激光光源")
+    assert cache.search_patents("激光发射光源") == original
+    cache.search_patents("检测电路")
+    assert db.searched == ["激光光源", "检测电路"]
+    assert cache.stats["near_hits"] == 1
+    cache.reset_stats()
+    assert cache.hit_ratio() == 0.0
+
+
+def test_returned_lists_are_copies():
+    db = CountingDB()
+    cache = CachedPatentDB(db)
+    cache.search_patents("光源").clear()
+    assert cache.search_patents("光源") != []
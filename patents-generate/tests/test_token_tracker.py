@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+from agents.examiner_agent import ExaminerAgent
+from agents.writer_agent import WriterAgent
+from coordinator import Coordinator
+from utils.token_tracker import GENERAL_NODE, UNKNOWN_PATENT, TokenTracker
+
+
+def test_record_aggregates_by_agent_model_patent_and_node():
+    tracker = TokenTracker()
+    tracker.record("writer", "m1", 100, 20, latency=0.5, patent_id="p1", node_id="n1")
+    tracker.record("writer", "m1", 50, 10, patent_id="p1", node_id="n1")
+    tracker.record("examiner", "m2", 30, 5, patent_id="p2")
+    tracker.record("planner", "m1", 7, 3)
+    summary = tracker.summary()
+    assert summary["total"]["calls"] == 4 and summary["total"]["total_tokens"] == 225
+    assert summary["by_agent"]["writer"]["total_tokens"] == 180
+    assert summary["by_model"]["m1"]["calls"] == 3
+    assert summary["by_patent"]["p1"]["prompt_tokens"] == 150
+    assert summary["by_patent"][UNKNOWN_PATENT]["total_tokens"] == 10
+    nodes = {(node["patent_id"], node["node_id"]): node for node in summary["top_nodes"]}
+    assert nodes[("p1", "n1")]["calls"] == 2 and nodes[("p2", GENERAL_NODE)]["total_tokens"] == 35
+
+
+def test_cost_uses_cached_price_for_cached_prompt_tokens():
+    tracker = TokenTracker(pricing={"m1": {"prompt": 1.0, "completion": 2.0, "cached": 0.1},
+                                    "m2": {"prompt": 1.0, "completion": 2.0}})
+    tracker.record("writer", "m1", prompt_tokens=1000, completion_tokens=500, cached_tokens=400, node_id="a")
+    tracker.record("writer", "m2", prompt_tokens=1000, cached_tokens=400, node_id="b")
+    tracker.record("writer", "unpriced", prompt_tokens=10 ** 6, node_id="c")
+    summary = tracker.summary()
+    assert summary["by_model"]["m1"]["cost"] == pytest.approx(0.6 + 0.04 + 1.0)
+    # 没有单独的缓存价格时按 prompt 价格计算
+    assert summary["by_model"]["m2"]["cost"] == pytest.approx(1.0)
+    assert summary["by_model"]["unpriced"]["cost"] == 0.0
+    # top_nodes 先按成本排序
+    assert [node["node_id"] for node in summary["top_nodes"]] == ["a", "b", "c"]
+
+
+def test_soft_budget_downgrades_model():
+    tracker = TokenTracker(patent_budget=(100, None), downgrade_models={"reasoner": "chat"})
+    assert tracker.select_model("reasoner", "p1") == "reasoner"
+    tracker.record("writer", "reasoner", 90, 10, patent_id="p1")
+    assert tracker.budget_state("p1") == "soft_exceeded"
+    assert tracker.select_model("reasoner", "p1") == "chat"
+    assert tracker.select_model("other", "p1") == "other"  # 没有配置替代模型
+    assert tracker.select_model("reasoner", "p2") == "reasoner"  # 其他专利不受影响
+    assert tracker.allow_revision("p1")
+    assert tracker.summary()["model_downgrades"] == 1
+
+
+def test_hard_budget_per_node_and_per_patent():
+    tracker = TokenTracker(patent_budget=(None, 1000), node_budget=(50, 100))
+    tracker.record("writer", "m", 80, 0, patent_id="p1", node_id="n1")
+    assert tracker.budget_state("p1", "n1") == "soft_exceeded"
+    tracker.record("writer", "m", 20, 0, patent_id="p1", node_id="n1")
+    assert not tracker.allow_revision("p1", "n1")
+    assert tracker.allow_revision("p1", "n2")
+    # 不指定节点时只检查专利预算
+    assert tracker.budget_state("p1") == "ok"
+    tracker.record("writer", "m", 900, 0, patent_id="p1", node_id="n3")
+    assert not tracker.allow_revision("p1", "n2")
+
+
+def test_add_tokens_and_write_summary(tmp_path):
+    tracker = TokenTracker()
+    tracker.add_tokens("retrieval", 5)
+    tracker.add_tokens("retrieval", 7)
+    path = tracker.write_summary(str(tmp_path / "usage.json"))
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["labels"] == {"retrieval": 12}
+
+
+def test_coordinator_stops_when_hard_budget_exhausted():
+    tree = {"id": "root", "patent_id": "p1", "title": "一种传感器", "content_guideline": "", "status": "pending",
+            "generated_content": "", "children": [
+                {"id": "n1", "title": "技术方案", "content_guideline": "撰写技术方案", "status": "pending",
+                 "generated_content": "", "children": []}]}
+    tracker = TokenTracker(patent_budget=(None, 10))
+    tracker.record("planner", "m", 10, 0, patent_id="p1")
+    coordinator = Coordinator(WriterAgent(), ExaminerAgent(), token_tracker=tracker)
+    asyncio.run(coordinator.run(tree))
+    assert coordinator.stats["budget_stopped"] == ["n1"]
+    assert coordinator.stats["writes"] == 0
+    assert tree["children"][0]["status"] == "pending"
+
+
+def examiner_tree():
+    return {"id": "root", "patent_id": "p1", "title": "一种传感器", "content_guideline": "", "status": "pending",
+            "generated_content": "", "children": [
+                {"id": "n1", "title": "技术方案", "content_guideline": "撰写技术方案", "status": "completed",
+                 "generated_content": "一种传感器，包括壳体和设置在壳体内的检测电路。", "children": []},
+                {"id": "n2", "title": "背景技术", "content_guideline": "撰写背景技术", "status": "completed",
+                 "generated_content": "现有的传感器体积较大。", "children": []}]}
+
+
+def test_examiner_review_counts_against_patent_budget():
+    tracker = TokenTracker(patent_budget=(None, 30))
+    examiner = ExaminerAgent(token_tracker=tracker)
+    tree = examiner_tree()
+    assert tracker.allow_revision("p1")
+    examiner.review_pg_tree_node(tree["children"][0], tree)
+    summary = tracker.summary()
+    assert summary["by_agent"]["examiner"]["calls"] == 1
+    assert summary["by_patent"]["p1"]["total_tokens"] > 0
+    assert {node["node_id"] for node in summary["top_nodes"]} == {"n1"}
+    # 审查本身的用量也会让专利超出硬预算
+    examiner.review_pg_tree_node(tree["children"][1], tree)
+    assert not tracker.allow_revision("p1")
+
+
+class UsageResponse:
+    def __init__(self, content, usage_metadata):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+def test_batch_review_splits_llm_usage_across_nodes():
+    tracker = TokenTracker()
+    verdicts = {"n1": {"status": "approved_by_examiner", "feedback": "通过"},
+                "n2": {"status": "needs_revision", "feedback": "补充背景"}}
+    examiner = ExaminerAgent(token_tracker=tracker, model="m",
+                             llm=lambda prompt: UsageResponse(json.dumps(verdicts, ensure_ascii=False),
+                                                              {"input_tokens": 300, "output_tokens": 60}))
+    tree = examiner_tree()
+    examiner.review_entire_patent_draft(tree, batch=True)
+    assert [child["status"] for child in tree["children"]] == ["approved_by_examiner", "needs_revision"]
+    summary = tracker.summary()
+    assert summary["by_model"]["m"]["prompt_tokens"] == 300
+    assert summary["by_model"]["m"]["completion_tokens"] == 60
+    assert summary["by_patent"]["p1"]["calls"] == 2
+    assert {node["node_id"]: node["total_tokens"] for node in summary["top_nodes"]} == {"n1": 180, "n2": 180}
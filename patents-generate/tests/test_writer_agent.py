@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from agents.writer_agent import WriterAgent
+
+
+def node(node_id, title, children=(), status="pending", guideline=None, **fields):
+    return {"id": node_id, "title": title, "content_guideline": f"撰写{title}" if guideline is None else guideline,
+            "status": status, "generated_content": "", "children": list(children), **fields}
+
+
+class RecordingWriter(WriterAgent):
+    def __init__(self, fail=(), **kwargs):
+        super().__init__(**kwargs)
+        self.fail = set(fail)
+        self.order = []
+        self.contexts = {}
+        self.active = 0
+        self.peak = 0
+
+    async def _awrite_node_content(self, pg_tree_node, full_pg_tree, context):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if pg_tree_node["id"] in self.fail:
+                raise RuntimeError("llm down")
+            self.order.append(pg_tree_node["id"])
+            self.contexts[pg_tree_node["id"]] = context
+            return f"内容 {pg_tree_node['id']}"
+        finally:
+            self.active -= 1
+
+
+def test_populate_pg_tree_is_iterative_preorder():
+    tree = node("root", "根", [node("a", "甲", [node("a1", "甲一")]), node("b", "乙")], guideline="")
+    writer = WriterAgent()
+    writer.populate_pg_tree(tree)
+    assert tree["status"] == "pending"  # 没有 content_guideline 的节点不写
+    assert [n["status"] for n in (tree["children"][0], tree["children"][0]["children"][0], tree["children"][1])] == \
+           ["completed"] * 3
+    assert tree["children"][0]["content_hash"]
+
+
+def test_parent_section_and_explicit_dependencies_are_respected():
+    tree = node("root", "专利", [
+        node("claims", "权利要求书"),
+        node("solution", "技术方案", [node("solution_detail", "技术方案细节")]),
+        node("summary", "摘要", depends_on=["claims"]),
+    ])
+    writer = RecordingWriter()
+    asyncio.run(writer.apopulate_pg_tree(tree))
+    order = writer.order
+    assert order.index("root") < order.index("solution") < order.index("solution_detail")
+    # 权利要求依赖标题含 "技术方案" 的所有节点
+    assert order.index("solution") < order.index("claims") and order.index("solution_detail") < order.index("claims")
+    assert order.index("claims") < order.index("summary")
+    assert writer.contexts["claims"]["dependencies"] == {"技术方案": "内容 solution", "技术方案细节": "内容 solution_detail"}
+    assert writer.contexts["solution_detail"]["parent"] == "内容 solution"
+
+
+def test_concurrency_limit():
+    tree = node("root", "专利", [node(f"n{i}", f"章节{i}") for i in range(8)], guideline="")
+    writer = RecordingWriter(max_concurrency=3)
+    asyncio.run(writer.apopulate_pg_tree(tree))
+    assert writer.peak == 3
+    assert len(writer.order) == 8
+
+
+def test_failed_node_skips_dependents_and_stays_pending():
+    tree = node("root", "专利", [node("solution", "技术方案"), node("claims", "权利要求"), node("other", "背景")],
+                guideline="")
+    writer = RecordingWriter(fail={"solution"})
+    asyncio.run(writer.apopulate_pg_tree(tree))
+    solution, claims, other = tree["children"]
+    assert solution["status"] == "pending" and "llm down" in solution["write_error"]
+    assert claims["status"] == "pending" and "claims" not in writer.order
+    assert other["status"] == "completed"
+
+
+def test_dependency_errors():
+    writer = WriterAgent()
+    unknown = node("root", "专利", [node("a", "甲", depends_on=["missing"])], guideline="")
+    with pytest.raises(ValueError, match="unknown node"):
+        asyncio.run(writer.apopulate_pg_tree(unknown))
+    cyclic = node("root", "专利", [node("a", "甲", depends_on=["b"]), node("b", "乙", depends_on=["a"])],
+                  guideline="")
+    with pytest.raises(ValueError, match="Circular"):
+        asyncio.run(writer.apopulate_pg_tree(cyclic))
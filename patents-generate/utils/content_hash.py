@@ -0,0 +1,43 @@
+# utils/content_hash.py
+import hashlib
+
+HASH_FIELDS = ("title", "generated_content")  # 影响审查结论的字段
+
+
+def node_content_hash(pg_tree_node: dict) -> str:
+    """
+    计算 PGTree 节点内容的哈希，用于判断节点自上次审查以来是否被修改。
+
+    Args:
+        pg_tree_node (dict): PGTree 节点。
+
+    Returns:
+        str: 32 位十六进制摘要。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for field in HASH_FIELDS:
+        digest.update(str(pg_tree_node.get(field) or "").encode("utf-8"))
+        digest.update(b"\x00")  # 字段分隔符，避免不同字段拼接后产生相同输入
+    return digest.hexdigest()
+
+
+def is_unchanged_since_review(pg_tree_node: dict) -> bool:
+    """节点已有审查结论，且内容哈希与上次审查时一致。"""
+    return bool(pg_tree_node.get("examination_verdict")) and \
+        pg_tree_node.get("last_reviewed_hash") == node_content_hash(pg_tree_node)
+
+
+def mark_reviewed(pg_tree_node: dict):
+    """审查完成后记录内容哈希和审查结论 (审查后的状态)。"""
+    pg_tree_node["content_hash"] = node_content_hash(pg_tree_node)
+    pg_tree_node["last_reviewed_hash"] = pg_tree_node["content_hash"]
+    pg_tree_node["examination_verdict"] = pg_tree_node["status"]
+
+
+def mark_written(pg_tree_node: dict):
+    """
+    写作 (含修订) 完成后记录内容哈希，并清除上次的审查结论。
+    重写后的内容即使与上一稿完全相同 (例如确定性的模拟写作)，也会重新审查，而不是一直沿用 needs_revision。
+    """
+    pg_tree_node["content_hash"] = node_content_hash(pg_tree_node)
+    pg_tree_node.pop("examination_verdict", None)
@@ -0,0 +1,124 @@
+# utils/key_phrases.py
+import math
+import re
+
+# 连续的中日韩统一表意文字 (含扩展 A)；拉丁字母 / 数字组成的单词
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿]+")
+_WORD = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+# 句子边界：中英文句末标点、分号和换行；英文句点只在其后是空白或结尾、且前面不是数字时断句 (不拆开小数和编号)
+_SENTENCE_SPLIT = re.compile(r"[。；;！!？?\n]+|(?<!\d)\.(?=\s|$)")
+# 权利要求中并列技术特征 (要素) 之间的分隔
+_ELEMENT_SPLIT = re.compile(r"[，,、：:]+")
+# 要素过长时，在这些连接词处继续切分
+_CONNECTOR_SPLIT = re.compile(r"用于|通过|以便|使得|从而|其中|并且|以及")
+# 要素开头不影响检索的套话和指代词。中文没有词边界，只去掉多字的连接词；
+# "还"、"和"、"及"、"该" 等单字可能是技术术语的首字 (还原反应器、和面机构、及时控制)，不做去除
+_LEADING_NOISE = re.compile(
+    r"^(?:\s|其特征在于|其特征是|[根如]据?权利要求\s*\d+\s*(?:或\s*\d+\s*)?所述的?|权利要求\s*\d+|"
+    r"所述的?|其中|还?(?:包括|包含|设有|具有)|以及|并且|一种|一个|上述|\d+\s*[.、)）]|"
+    r"(?i:the|an?|said|wherein|comprising|and)\s+)+"
+)
+# 附图标记和括号内的编号，例如 "光源 (10)"、"（1）"
+_REFERENCE_MARK = re.compile(r"[(（]\s*[\w.]{1,4}\s*[)）]")
+
+
+def tokenize(text: str) -> list:
+    """
+    中英文混合分词：拉丁字母和数字按单词切分并转小写；
+    连续的中文按字符二元组 (bigram) 切分，单个汉字保留为一元组，不依赖外部分词词典。
+
+    Args:
+        text (str): 待切分的文本。
+
+    Returns:
+        list: 词项列表 (可能包含重复词项)。
+    """
+    text = text or ""
+    tokens = _WORD.findall(text.lower())
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def split_sentences(text: str) -> list:
+    """按中英文标点切分句子 (权利要求通常以 。或 ；分隔各项)。"""
+    return [sentence.strip() for sentence in _SENTENCE_SPLIT.split(text or "") if sentence.strip()]
+
+
+def _clean_element(element: str) -> str:
+    element = _REFERENCE_MARK.sub("", element).strip()
+    return _LEADING_NOISE.sub("", element).strip(" \t\"'“”‘’")
+
+
+def split_claim_elements(text: str, min_chars: int = 4, max_chars: int = 30) -> list:
+    """
+    把权利要求 (或技术方案) 文本切分为技术特征要素：先分句，再按逗号、顿号、冒号切分，
+    去掉 "其特征在于"、"所述" 等套话；过长的要素在 "用于"、"通过" 等连接词处继续切分。
+
+    Returns:
+        list: [(句子序号, 要素文本), ...]，按在原文中出现的顺序。
+    """
+    elements = []
+    for sentence_index, sentence in enumerate(split_sentences(text)):
+        for piece in _ELEMENT_SPLIT.split(sentence):
+            parts = [piece] if len(piece) <= max_chars else _CONNECTOR_SPLIT.split(piece)
+            for part in parts:
+                element = _clean_element(part)
+                if len(element) >= min_chars:
+                    elements.append((sentence_index, element[:max_chars]))
+    return elements
+
+
+def _overlap(a: set, b: set) -> float:
+    return len(a & b) / min(len(a), len(b)) if a and b else 0.0
+
+
+def extract_key_phrases(text: str, max_phrases: int = 3, idf=None, min_chars: int = 4, max_chars: int = 30,
+                        max_overlap: float = 0.6) -> list:
+    """
+    从中英文混合的专利文本中提取少量高信息量的检索短语。
+
+    显著性 = 要素中各词项权重之和 / sqrt(词项数)，词项权重为 idf (由调用方提供，例如 PatentDB.idf)
+    乘以该词项在全文中的出现次数因子 (1 + log tf)；首句 (独立权利要求的前序部分) 略微加权。
+    与已选短语的词项重叠率达到 max_overlap 的候选视为重复，被跳过。
+
+    Args:
+        text (str): 节点内容。
+        max_phrases (int): 最多返回的短语数。
+        idf (callable): token -> 逆文档频率；为空时所有词项权重相同 (拉丁字母 / 数字词项略高)。
+        min_chars (int), max_chars (int): 要素长度范围。
+        max_overlap (float): 去重阈值。
+
+    Returns:
+        list: 按显著性降序排列的短语。
+    """
+    elements = split_claim_elements(text, min_chars, max_chars)
+    if not elements:
+        return []
+    doc_tf = {}
+    for token in tokenize(text):
+        doc_tf[token] = doc_tf.get(token, 0) + 1
+
+    candidates = {}
+    for sentence_index, element in elements:
+        terms = set(tokenize(element))
+        if not terms:
+            continue
+        weight = sum((idf(term) if idf else (1.5 if term.isascii() else 1.0)) * (1 + math.log(doc_tf.get(term, 1)))
+                     for term in terms)
+        score = weight / math.sqrt(len(terms)) * (1.2 if sentence_index == 0 else 1.0)
+        if element not in candidates or candidates[element][0] < score:
+            candidates[element] = (score, terms)
+
+    selected = []
+    for element, (score, terms) in sorted(candidates.items(), key=lambda item: item[1][0], reverse=True):
+        if any(_overlap(terms, chosen_terms) >= max_overlap for _, chosen_terms in selected):
+            continue
+        selected.append((element, terms))
+        if len(selected) >= max_phrases:
+            break
+    return [element for element, _ in selected]
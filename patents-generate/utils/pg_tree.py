@@ -0,0 +1,232 @@
+# utils/pg_tree.py
+import json
+
+# 节点的已知字段 (与智能体使用的字典键一致)；其他键保存在 PGNode.extra 中，转换时原样保留
+NODE_FIELDS = (
+    "id", "title", "content_guideline", "status", "generated_content", "examination_feedback",
+    "depends_on", "content_hash", "last_reviewed_hash", "examination_verdict", "write_error",
+)
+_OPTIONAL_FIELDS = NODE_FIELDS[5:]  # 字典中不存在时不输出的字段
+SERIAL_VERSION = 1
+
+
+def iter_dict_tree(pg_tree_root: dict, with_depth: bool = False):
+    """
+    迭代 (非递归) 先序遍历字典形式的 PGTree，深层树也不会触发递归深度限制。
+    with_depth=True 时产出 (节点, 深度)。
+    """
+    stack = [(pg_tree_root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield (node, depth) if with_depth else node
+        children = node.get("children", [])
+        for i in range(len(children) - 1, -1, -1):
+            stack.append((children[i], depth + 1))
+
+
+class PGNode:
+    """PGTree 节点：固定字段用 __slots__ 存储，带父节点指针。"""
+
+    __slots__ = NODE_FIELDS + ("children", "parent", "extra")
+
+    def __init__(self, id: str, title: str = "", content_guideline: str = "", status: str = "pending",
+                 generated_content: str = "", **fields):
+        self.id = id
+        self.title = title
+        self.content_guideline = content_guideline
+        self.status = status
+        self.generated_content = generated_content
+        for name in _OPTIONAL_FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        self.extra = fields  # 未知字段
+        self.children = []
+        self.parent = None
+
+    def __repr__(self):
+        return f"PGNode(id={self.id!r}, title={self.title!r}, status={self.status!r}, children={len(self.children)})"
+
+    def get(self, key: str, default=None):
+        """与字典节点相同的读取方式，便于同一段代码处理两种形式。"""
+        if key in NODE_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default)
+
+    def to_flat_dict(self) -> dict:
+        """不含 children 的字典 (只输出有值的可选字段)。"""
+        data = {"id": self.id, "title": self.title, "content_guideline": self.content_guideline,
+                "status": self.status, "generated_content": self.generated_content}
+        for name in _OPTIONAL_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        data.update(self.extra)
+        return data
+
+
+class PGTree:
+    def __init__(self, root: PGNode):
+        """
+        带索引的 PGTree：id -> 节点的索引使按 id 查找为 O(1)，遍历全部是迭代实现。
+        与智能体使用的嵌套字典形式可以相互转换 (from_dict / to_dict)。
+        """
+        self.root = root
+        self._index = {}
+        for node in self._iter_from(root):
+            self._register(node)
+
+    # --- 构建与转换 ---
+    @staticmethod
+    def _node_from_dict(data: dict) -> PGNode:
+        fields = {key: value for key, value in data.items() if key != "children"}
+        return PGNode(**fields)
+
+    @classmethod
+    def from_dict(cls, pg_tree_root: dict) -> "PGTree":
+        """从嵌套字典 (PlannerAgent 生成的 PGTree) 构建。"""
+        root = cls._node_from_dict(pg_tree_root)
+        stack = [(pg_tree_root, root)]
+        while stack:
+            data, node = stack.pop()
+            for child_data in data.get("children", []):
+                child = cls._node_from_dict(child_data)
+                child.parent = node
+                node.children.append(child)
+                stack.append((child_data, child))
+        return cls(root)
+
+    def to_dict(self, node_id: str = None) -> dict:
+        """转换为嵌套字典 (默认整棵树，也可以只转换某个子树)。"""
+        start = self._index[node_id] if node_id is not None else self.root
+        result = start.to_flat_dict()
+        stack = [(start, result)]
+        while stack:
+            node, data = stack.pop()
+            data["children"] = []
+            for child in node.children:
+                child_data = child.to_flat_dict()
+                data["children"].append(child_data)
+                stack.append((child, child_data))
+        return result
+
+    # --- 序列化 ---
+    def dumps(self) -> str:
+        """
+        序列化为扁平 JSON：节点按先序排成列表，每个节点记录父节点下标，
+        避免嵌套 JSON 在深层树上的递归编码 / 解码开销和深度限制。
+        """
+        position = {}
+        rows = []
+        for node in self:
+            position[node.id] = len(rows)
+            parent_position = position[node.parent.id] if node.parent is not None else -1
+            rows.append([parent_position] + [getattr(node, name) for name in NODE_FIELDS] + [node.extra or None])
+        return json.dumps({"version": SERIAL_VERSION, "fields": NODE_FIELDS, "nodes": rows},
+                          ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, text: str) -> "PGTree":
+        payload = json.loads(text)
+        if payload.get("version") != SERIAL_VERSION:
+            raise ValueError(f"Unsupported PGTree serialization version: {payload.get('version')}")
+        field_names = payload["fields"]
+        nodes = []
+        for row in payload["nodes"]:
+            fields = {name: value for name, value in zip(field_names, row[1:]) if value is not None}
+            fields.update(row[len(field_names) + 1] or {})
+            node = PGNode(**fields)
+            if row[0] >= 0:
+                node.parent = nodes[row[0]]
+                node.parent.children.append(node)
+            nodes.append(node)
+        if not nodes:
+            raise ValueError("Serialized PGTree has no nodes")
+        return cls(nodes[0])
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, path: str) -> "PGTree":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.loads(f.read())
+
+    # --- 索引与查询 ---
+    def _register(self, node: PGNode):
+        if node.id in self._index:
+            raise ValueError(f"Duplicate PGTree node id '{node.id}'")
+        self._index[node.id] = node
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._index
+
+    def get(self, node_id: str) -> PGNode:
+        """按 id 查找节点 (O(1))，不存在时返回 None。"""
+        return self._index.get(node_id)
+
+    def ancestors(self, node_id: str) -> list:
+        """从父节点到根节点的路径。"""
+        path = []
+        node = self._index[node_id].parent
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        return path
+
+    def add_child(self, parent_id: str, node: PGNode) -> PGNode:
+        """把节点 (及其子树) 挂到 parent_id 之下并加入索引。"""
+        parent = self._index[parent_id]
+        subtree = list(self._iter_from(node))
+        for descendant in subtree:
+            if descendant.id in self._index:
+                raise ValueError(f"Duplicate PGTree node id '{descendant.id}'")
+        for descendant in subtree:
+            self._index[descendant.id] = descendant
+        node.parent = parent
+        parent.children.append(node)
+        return node
+
+    def remove(self, node_id: str) -> PGNode:
+        """删除节点及其子树，返回被删除的节点。"""
+        node = self._index[node_id]
+        if node is self.root:
+            raise ValueError("Cannot remove the PGTree root")
+        node.parent.children.remove(node)
+        node.parent = None
+        for descendant in self._iter_from(node):
+            del self._index[descendant.id]
+        return node
+
+    # --- 遍历 ---
+    @staticmethod
+    def _iter_from(start: PGNode, with_depth: bool = False):
+        stack = [(start, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield (node, depth) if with_depth else node
+            for i in range(len(node.children) - 1, -1, -1):
+                stack.append((node.children[i], depth + 1))
+
+    def __iter__(self):
+        """先序遍历全部节点。"""
+        return self._iter_from(self.root)
+
+    def walk(self, node_id: str = None, with_depth: bool = False):
+        """先序遍历某个子树 (默认整棵树)，with_depth=True 时产出 (节点, 深度)。"""
+        start = self._index[node_id] if node_id is not None else self.root
+        return self._iter_from(start, with_depth)
+
+    def iter_by_status(self, *statuses: str):
+        """按先序产出状态属于 statuses 的节点，例如 iter_by_status("needs_revision")。"""
+        wanted = set(statuses)
+        return (node for node in self if node.status in wanted)
+
+    def status_counts(self) -> dict:
+        counts = {}
+        for node in self:
+            counts[node.status] = counts.get(node.status, 0) + 1
+        return counts
@@ -0,0 +1,179 @@
+# utils/token_tracker.py
+import json
+import threading
+import time
+
+# 未知专利 / 节点的记录归入这些键
+UNKNOWN_PATENT = "_unknown_patent"
+GENERAL_NODE = "_general"
+
+
+class _Usage:
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "latency", "cost")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.latency = 0.0
+        self.cost = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int, latency: float, cost: float):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        self.latency += latency
+        self.cost += cost
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens, "total_tokens": self.total_tokens,
+                "latency": round(self.latency, 3), "cost": round(self.cost, 6)}
+
+
+class TokenTracker:
+    def __init__(self, patent_budget: tuple = (None, None), node_budget: tuple = (None, None),
+                 pricing: dict = None, downgrade_models: dict = None):
+        """
+        Token 与成本追踪器 (TokenTracker)
+        按智能体、专利、节点和模型记录 prompt / completion / 缓存命中 token 以及调用耗时，并执行预算：
+        - 软预算 (soft)：超出后 select_model() 把模型降级为 downgrade_models 中的替代模型；
+        - 硬预算 (hard)：超出后 allow_revision() 返回 False，协调器停止该节点 (或整篇专利) 的修订循环。
+        所有方法都只在一把线程锁内做字典更新，可以在多线程和协程中共享同一个实例。
+
+        Args:
+            patent_budget (tuple): 每篇专利的 (软预算, 硬预算)，单位为 token (prompt + completion)，None 表示不限制。
+            node_budget (tuple): 每个节点的 (软预算, 硬预算)。
+            pricing (dict): 模型 -> {"prompt": 每千 token 价格, "completion": ..., "cached": ...}，用于估算成本。
+            downgrade_models (dict): 模型 -> 超出软预算后改用的模型，例如 {"deepseek-reasoner": "deepseek-chat"}。
+        """
+        self.patent_budget = patent_budget
+        self.node_budget = node_budget
+        self.pricing = pricing or {}
+        self.downgrade_models = downgrade_models or {}
+        self._lock = threading.Lock()
+        self._by_agent = {}
+        self._by_model = {}
+        self._by_patent = {}
+        self._by_node = {}  # (专利, 节点) -> _Usage
+        self._labels = {}  # add_tokens 的自由标签 -> token 数
+        self._downgrades = 0
+        self._started = time.time()
+        print("TokenTracker initialized.")
+
+    # --- 记录 ---
+    def _cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+        price = self.pricing.get(model)
+        if not price:
+            return 0.0
+        uncached = max(prompt_tokens - cached_tokens, 0)
+        return (uncached * price.get("prompt", 0.0) + cached_tokens * price.get("cached", price.get("prompt", 0.0))
+                + completion_tokens * price.get("completion", 0.0)) / 1000
+
+    def record(self, agent: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cached_tokens: int = 0, latency: float = 0.0, patent_id: str = None, node_id: str = None):
+        """
+        记录一次 LLM 调用。
+
+        Args:
+            agent (str): 调用方智能体，例如 "writer"、"examiner"。
+            model (str): 实际使用的模型。
+            prompt_tokens, completion_tokens, cached_tokens (int): token 用量 (cached 是 prompt 中命中缓存的部分)。
+            latency (float): 调用耗时 (秒)。
+            patent_id (str), node_id (str): 调用所属的专利和 PGTree 节点。
+        """
+        usage = (prompt_tokens, completion_tokens, cached_tokens, latency,
+                 self._cost(model, prompt_tokens, completion_tokens, cached_tokens))
+        node_key = (patent_id or UNKNOWN_PATENT, node_id or GENERAL_NODE)
+        with self._lock:
+            for table, key in ((self._by_agent, agent), (self._by_model, model),
+                               (self._by_patent, node_key[0]), (self._by_node, node_key)):
+                entry = table.get(key)
+                if entry is None:
+                    entry = table[key] = _Usage()
+                entry.add(*usage)
+
+    def add_tokens(self, label: str, count: int):
+        """按自由标签累计 token 数 (没有调用细节时的简化记录)。"""
+        with self._lock:
+            self._labels[label] = self._labels.get(label, 0) + count
+
+    # --- 预算 ---
+    def _used(self, table: dict, key) -> int:
+        entry = table.get(key)
+        return entry.total_tokens if entry is not None else 0
+
+    @staticmethod
+    def _over(used: int, limit) -> bool:
+        return limit is not None and used >= limit
+
+    def budget_state(self, patent_id: str = None, node_id: str = None) -> str:
+        """返回 "ok"、"soft_exceeded" 或 "hard_exceeded" (专利和节点预算中较严重的一个)。"""
+        patent_key = patent_id or UNKNOWN_PATENT
+        with self._lock:
+            patent_used = self._used(self._by_patent, patent_key)
+            node_used = self._used(self._by_node, (patent_key, node_id or GENERAL_NODE)) if node_id else 0
+        if self._over(patent_used, self.patent_budget[1]) or (node_id and self._over(node_used, self.node_budget[1])):
+            return "hard_exceeded"
+        if self._over(patent_used, self.patent_budget[0]) or (node_id and self._over(node_used, self.node_budget[0])):
+            return "soft_exceeded"
+        return "ok"
+
+    def select_model(self, model: str, patent_id: str = None, node_id: str = None) -> str:
+        """超出软预算时返回降级后的模型 (没有配置替代模型时保持不变)。"""
+        if self.budget_state(patent_id, node_id) == "ok":
+            return model
+        downgraded = self.downgrade_models.get(model, model)
+        if downgraded != model:
+            with self._lock:
+                self._downgrades += 1
+        return downgraded
+
+    def allow_revision(self, patent_id: str = None, node_id: str = None) -> bool:
+        """是否还允许为该节点继续修订 (专利或节点超出硬预算时返回 False)。"""
+        return self.budget_state(patent_id, node_id) != "hard_exceeded"
+
+    # --- 汇总 ---
+    def summary(self, top_n: int = 10) -> dict:
+        """本次运行的汇总：总量、按智能体 / 模型 / 专利的用量，以及成本最高 (其次 token 最多) 的 top_n 个节点。"""
+        with self._lock:
+            total = _Usage()
+            for usage in self._by_agent.values():
+                total.calls += usage.calls
+                total.prompt_tokens += usage.prompt_tokens
+                total.completion_tokens += usage.completion_tokens
+                total.cached_tokens += usage.cached_tokens
+                total.latency += usage.latency
+                total.cost += usage.cost
+            top_nodes = sorted(self._by_node.items(), key=lambda item: (item[1].cost, item[1].total_tokens),
+                               reverse=True)[:top_n]
+            return {
+                "elapsed": round(time.time() - self._started, 3),
+                "total": total.to_dict(),
+                "by_agent": {agent: usage.to_dict() for agent, usage in self._by_agent.items()},
+                "by_model": {model: usage.to_dict() for model, usage in self._by_model.items()},
+                "by_patent": {patent: usage.to_dict() for patent, usage in self._by_patent.items()},
+                "top_nodes": [{"patent_id": patent, "node_id": node, **usage.to_dict()}
+                              for (patent, node), usage in top_nodes],
+                "labels": dict(self._labels),
+                "model_downgrades": self._downgrades,
+            }
+
+    def write_summary(self, path: str, top_n: int = 10) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(top_n), f, ensure_ascii=False, indent=2)
+        return path
+
+    def print_summary(self, top_n: int = 5):
+        summary = self.summary(top_n)
+        total = summary["total"]
+        print(f"TokenTracker: {total['calls']} call(s), {total['total_tokens']} tokens "
+              f"({total['cached_tokens']} cached), cost {total['cost']:.4f}, {summary['model_downgrades']} downgrade(s).")
+        for node in summary["top_nodes"]:
+            print(f"  - {node['patent_id']}/{node['node_id']}: {node['total_tokens']} tokens, cost {node['cost']:.4f}")